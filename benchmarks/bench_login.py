@@ -0,0 +1,52 @@
+"""
+Đo thời gian của đường đăng nhập: giải mã mật khẩu đã lưu rồi kiểm tra bcrypt.
+So sánh cách cũ (import cryptography, đọc khóa từ môi trường và dựng Fernet ở mỗi lần gọi)
+với CryptoService dựng một lần, khi chỉ có một khóa và khi có thêm khóa cũ để xoay vòng.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_login --repeat 2000 --rounds 12
+"""
+import argparse
+import os
+import bcrypt
+from cryptography.fernet import Fernet
+from benchmarks.bench_vehicle_search import timed
+from modules.crypto import CryptoService
+
+def legacy_decrypt(encrypted_data):
+    """decrypt_data trước khi dùng CryptoService."""
+    from cryptography.fernet import Fernet
+    import os
+    FERNET_KEY = os.environ.get("FERNET_KEY").encode()
+    cipher = Fernet(FERNET_KEY)
+    return cipher.decrypt(encrypted_data.encode()).decode()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark đường đăng nhập: giải mã Fernet và kiểm tra bcrypt.")
+    parser.add_argument("--repeat", type=int, default=2000, help="Số lần lặp mỗi phép giải mã")
+    parser.add_argument("--rounds", type=int, default=12, help="Số vòng bcrypt (giống bcrypt.gensalt() mặc định)")
+    args = parser.parse_args()
+
+    key = Fernet.generate_key()
+    os.environ["FERNET_KEY"] = key.decode()
+    password = "benchmark-password"
+    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt(args.rounds)).decode()
+    single = CryptoService([key])
+    rotating = CryptoService([Fernet.generate_key(), key])  # Dữ liệu vẫn mã hóa bằng khóa cũ trong lúc xoay vòng
+    token = single.encrypt(hashed)
+
+    legacy_ms = timed(lambda: legacy_decrypt(token), args.repeat)
+    cached_ms = timed(lambda: single.decrypt(token), args.repeat)
+    rotating_ms = timed(lambda: rotating.decrypt(token), args.repeat)
+    bcrypt_ms = timed(lambda: bcrypt.checkpw(password.encode(), single.decrypt(token).encode()), 5)
+    rows = [
+        ("Giải mã kiểu cũ (dựng Fernet mỗi lần)", legacy_ms * 1000, "µs"),
+        ("CryptoService một khóa", cached_ms * 1000, "µs"),
+        ("CryptoService khi xoay vòng (khóa thứ 2)", rotating_ms * 1000, "µs"),
+        (f"Cả đường đăng nhập (bcrypt {args.rounds} vòng)", bcrypt_ms, "ms"),
+    ]
+    for label, value, unit in rows:
+        print(f"{label:<44}{value:>10.1f} {unit}")
+
+if __name__ == "__main__":
+    main()
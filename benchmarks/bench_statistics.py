@@ -0,0 +1,79 @@
+"""
+So sánh thời gian lấy số liệu trang thống kê: mười truy vấn riêng lẻ trên bookings (cách cũ)
+với bảng tổng hợp theo ngày booking_daily_stats.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_statistics --bookings 100000 --uri mongodb://localhost:27017
+
+Không truyền --uri (hoặc MONGODB_TEST_URI) thì dùng mongomock, khi đó số đo chỉ mang tính tham khảo.
+"""
+import argparse
+import datetime
+import os
+import random
+import time
+import mongomock
+import pymongo
+from benchmarks.bench_vehicle_search import synthetic_vehicles, timed
+import modules.admin as admin
+import modules.booking_stats as booking_stats
+
+# Mọi đơn giả lập đều thuộc các ngày trước "hôm nay" nên được đọc từ bảng tổng hợp
+ROLLUP_TODAY = datetime.date(2025, 1, 1)
+
+def synthetic_bookings(vehicle_ids, count, seed=42):
+    rng = random.Random(seed)
+    user_ids = [f"user-{i}" for i in range(max(1, count // 20))]
+    start = datetime.datetime(2024, 1, 1)
+    for _ in range(count):
+        yield {
+            "user_id": rng.choice(user_ids),
+            "vehicle_id": rng.choice(vehicle_ids),
+            "total_price": rng.randint(20, 2000),
+            "payment_status": rng.choice(["paid", "pending", "failed"]),
+            "created_at": start + datetime.timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+        }
+
+def rollup_statistics(query_filter):
+    created_at = query_filter["created_at"]
+    booking_stats.booking_statistics(created_at["$gte"], created_at["$lte"], today=ROLLUP_TODAY)
+    admin.vehicle_statistics()
+
+def build_rollup(db):
+    try:
+        booking_stats.refresh_booking_daily_stats(days=None, today=ROLLUP_TODAY)
+    except NotImplementedError:
+        # mongomock chưa hỗ trợ $merge: ghi trực tiếp kết quả của cùng các stage gom nhóm
+        db.booking_daily_stats.insert_many(list(db.bookings.aggregate(booking_stats._rollup_stages())))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark trang thống kê: truy vấn riêng lẻ so với bảng tổng hợp theo ngày.")
+    parser.add_argument("--vehicles", type=int, default=500, help="Số xe giả lập")
+    parser.add_argument("--bookings", type=int, default=20000, help="Số đơn đặt giả lập")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần lặp mỗi cách")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_TEST_URI"), help="MongoDB dùng để đo")
+    args = parser.parse_args()
+
+    client = pymongo.MongoClient(args.uri) if args.uri else mongomock.MongoClient()
+    client.drop_database("bench_statistics")
+    db = client["bench_statistics"]
+    db.vehicles.insert_many([{**vehicle, "status": "available"} for vehicle in synthetic_vehicles(args.vehicles)])
+    vehicle_ids = db.vehicles.distinct("_id")
+    db.bookings.insert_many(list(synthetic_bookings(vehicle_ids, args.bookings)))
+    db.bookings.create_index([("created_at", pymongo.ASCENDING)])
+    admin.db = booking_stats.db = db
+    start = time.perf_counter()
+    build_rollup(db)
+    print(f"Dựng bảng tổng hợp: {(time.perf_counter() - start) * 1000:.0f} ms ({db.booking_daily_stats.count_documents({})} dòng)")
+
+    query_filter = {"created_at": {"$gte": datetime.datetime(2024, 1, 1), "$lte": datetime.datetime(2024, 6, 30)}}
+    legacy_ms = timed(lambda: admin.legacy_statistics(query_filter), args.repeat)
+    rollup_ms = timed(lambda: rollup_statistics(query_filter), args.repeat)
+    print(f"{args.bookings} đơn, {args.vehicles} xe")
+    print(f"Cách cũ (10 lượt truy vấn): {legacy_ms:10.1f} ms")
+    print(f"Bảng tổng hợp theo ngày:    {rollup_ms:10.1f} ms")
+
+    client.drop_database("bench_statistics")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+So sánh tìm kiếm gần đúng trên chỉ mục trigram trong bộ nhớ với truy vấn regex trên MongoDB.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_vehicle_search --count 50000 --uri mongodb://localhost:27017
+
+Không truyền --uri (hoặc MONGODB_TEST_URI) thì dùng mongomock, khi đó số đo của regex chỉ mang tính tham khảo.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+import mongomock
+import pymongo
+from modules.search_index import VehicleSearchIndex
+
+BRANDS = {
+    "Toyota": ["Camry", "Vios", "Corolla", "Innova", "Fortuner"],
+    "Honda": ["Civic", "City", "Accord", "CR-V"],
+    "Mazda": ["CX-5", "Mazda3", "Mazda6"],
+    "Hyundai": ["Accent", "Tucson", "Santa Fe"],
+    "Kia": ["Morning", "Seltos", "Sorento"],
+    "Ford": ["Ranger", "Everest", "Focus"],
+    "VinFast": ["Lux A2.0", "Fadil", "VF8"],
+    "Mitsubishi": ["Xpander", "Pajero", "Outlander"],
+}
+QUERIES = ["Toyta Camri", "hond civc", "mazda", "hyundia tucson", "vinfst vf8", "51A", "2020", "ford rangr"]
+
+def synthetic_vehicles(count, seed=42):
+    rng = random.Random(seed)
+    brands = list(BRANDS)
+    for i in range(count):
+        brand = rng.choice(brands)
+        yield {
+            "brand": brand,
+            "model": rng.choice(BRANDS[brand]),
+            "license_plate": f"{rng.randint(10, 99)}{rng.choice('ABCDEFGH')}-{i:05d}",
+            "year": rng.randint(2005, 2024),
+            "price_per_day": rng.randint(20, 500),
+            "required_license_type": rng.choice(["B1", "B2", "C"]),
+        }
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tìm kiếm xe: chỉ mục trigram so với regex MongoDB.")
+    parser.add_argument("--count", type=int, default=50000, help="Số xe giả lập")
+    parser.add_argument("--repeat", type=int, default=20, help="Số lần lặp mỗi truy vấn")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_TEST_URI"), help="MongoDB dùng để đo regex")
+    args = parser.parse_args()
+
+    client = pymongo.MongoClient(args.uri) if args.uri else mongomock.MongoClient()
+    collection = client["bench_vehicle_search"]["vehicles"]
+    collection.drop()
+    collection.insert_many(list(synthetic_vehicles(args.count)))
+    collection.create_index([("brand", pymongo.ASCENDING)])
+
+    start = time.perf_counter()
+    index = VehicleSearchIndex.from_collection(collection)
+    print(f"Dựng chỉ mục cho {len(index)} xe: {(time.perf_counter() - start) * 1000:.0f} ms")
+    print(f"{'Truy vấn':<18}{'Trigram (ms)':>14}{'Regex (ms)':>12}{'Regex khớp':>12}")
+
+    for query in QUERIES:
+        regex = {"$regex": query, "$options": "i"}
+        mongo_query = {"$or": [{"brand": regex}, {"model": regex}, {"license_plate": regex}]}
+        index_ms = timed(lambda: index.search(query, limit=20), args.repeat)
+        regex_ms = timed(lambda: list(collection.find(mongo_query).limit(20)), max(1, args.repeat // 4))
+        regex_hits = len(list(collection.find(mongo_query).limit(20)))
+        print(f"{query:<18}{index_ms:>14.3f}{regex_ms:>12.3f}{regex_hits:>12}")
+
+    client.drop_database("bench_vehicle_search")
+
+if __name__ == "__main__":
+    main()
@@ -19,4 +19,47 @@ logging.basicConfig(
 )
 
 # Cấu hình secret key cho JWT
-SECRET_KEY = os.getenv("SECRET_KEY")
\ No newline at end of file
+SECRET_KEY = os.getenv("SECRET_KEY")
+
+# Số dòng mặc định trên mỗi trang của các bảng quản lý
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", 20))
+
+# Số khách hàng/xe tối đa được lấy khi tìm đơn đặt xe theo từ khóa ở trang quản lý
+BOOKING_SEARCH_MATCH_LIMIT = int(os.getenv("BOOKING_SEARCH_MATCH_LIMIT", 500))
+
+# Chu kỳ (giây) của luồng nền xử lý các đơn đặt xe đã hết hạn
+SCHEDULER_INTERVAL_SECONDS = int(os.getenv("SCHEDULER_INTERVAL_SECONDS", 3600))
+
+# Số xe tối đa giữ trong bộ nhớ đệm danh mục xe dùng chung của mỗi tiến trình
+VEHICLE_CATALOG_MAX_SIZE = int(os.getenv("VEHICLE_CATALOG_MAX_SIZE", 10000))
+
+# Số xe tối đa được tải cho ô chọn xe khi danh mục quá lớn để giữ trong bộ nhớ đệm (chọn qua ô tìm kiếm)
+VEHICLE_OPTION_LIMIT = int(os.getenv("VEHICLE_OPTION_LIMIT", 50))
+
+# Khoảng thời gian (giây) giữa hai lần kiểm tra phiên bản danh mục xe khi không dùng được change stream
+VEHICLE_CATALOG_CHECK_SECONDS = float(os.getenv("VEHICLE_CATALOG_CHECK_SECONDS", 2))
+
+# Thư mục và dung lượng tối đa (byte) của bộ nhớ đệm ảnh thu nhỏ của xe
+THUMBNAIL_CACHE_DIR = os.getenv("THUMBNAIL_CACHE_DIR", ".thumbnail_cache")
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+# Số ngày gần nhất của bảng tổng hợp booking_daily_stats được tính lại từ bookings mỗi lần chạy luồng nền
+BOOKING_STATS_REPAIR_DAYS = int(os.getenv("BOOKING_STATS_REPAIR_DAYS", 31))
+
+# Thời gian sống (giây) và số bộ lọc tối đa của bộ nhớ đệm kết quả trang thống kê
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", 300))
+STATS_CACHE_MAX_ENTRIES = int(os.getenv("STATS_CACHE_MAX_ENTRIES", 100))
+
+# Thư mục chứa snapshot Parquet của bookings (chia thư mục theo tháng tạo đơn)
+BOOKING_SNAPSHOT_DIR = os.getenv("BOOKING_SNAPSHOT_DIR", os.path.join(".snapshots", "bookings"))
+
+# Thư mục và thời gian giữ (giây) các file báo cáo Excel đã tạo, dùng lại cho cùng bộ lọc
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", ".report_cache")
+REPORT_CACHE_TTL_SECONDS = int(os.getenv("REPORT_CACHE_TTL_SECONDS", 3600))
+
+# Các khóa Fernet phân tách bằng dấu phẩy: khóa đầu tiên dùng để mã hóa, các khóa sau chỉ để giải mã dữ liệu cũ khi xoay vòng khóa.
+# Không có FERNET_KEYS thì dùng FERNET_KEY
+FERNET_KEYS = [key.strip() for key in os.getenv("FERNET_KEYS", os.getenv("FERNET_KEY") or "").split(",") if key.strip()]
+
+# Số người dùng được mã hóa lại bằng khóa mới trong mỗi lô
+REENCRYPT_BATCH_SIZE = int(os.getenv("REENCRYPT_BATCH_SIZE", 500))
@@ -0,0 +1,25 @@
+import pytest
+import mongomock
+
+# Bộ đếm phiên bản được dùng bởi nhiều module nên luôn được thay bằng cơ sở dữ liệu giả lập
+DEFAULT_MOCK_DB_MODULES = ("modules.versions",)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "mock_db(*modules): các module có db được fixture mock_db thay bằng mongomock")
+
+
+@pytest.fixture
+def mock_db(request, monkeypatch):
+    """
+    Cơ sở dữ liệu mongomock dùng chung cho các test.
+    Các module cần thay db được khai báo bằng @pytest.mark.mock_db("modules.x", ...) trên test
+    hoặc pytestmark của file (ví dụ pytestmark = pytest.mark.mock_db("modules.booking")).
+    """
+    test_db = mongomock.MongoClient()["test_database"]
+    modules = set(DEFAULT_MOCK_DB_MODULES)
+    for marker in request.node.iter_markers("mock_db"):
+        modules.update(marker.args)
+    for module in sorted(modules):
+        monkeypatch.setattr(f"{module}.db", test_db)
+    return test_db
@@ -0,0 +1,141 @@
+from config import db
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+import argparse
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Danh sách index khai báo cho mọi collection mà ứng dụng truy vấn.
+# Không đặt tên riêng: MongoDB tự đặt tên theo các trường (ví dụ "license_plate_1")
+# nên các index đã tạo trước đây được nhận ra là cùng một index.
+INDEX_SPECS = {
+    "users": [
+        # Đăng nhập, đăng ký và kiểm tra trùng email
+        IndexModel([("email", ASCENDING)], unique=True),
+        # Kiểm tra trùng số điện thoại khi đăng ký
+        IndexModel([("phone", ASCENDING)]),
+        # Tìm đơn đặt xe theo tiền tố tên/email của khách hàng ở trang quản lý
+        IndexModel([("search_keys", ASCENDING)]),
+    ],
+    "sessions": [
+        IndexModel([("token", ASCENDING)]),
+    ],
+    "vehicles": [
+        IndexModel([("license_plate", ASCENDING)], unique=True),
+        # Tìm theo tiền tố thương hiệu, lọc giá và sắp xếp đều đi trên cùng một index
+        IndexModel([("brand_normalized", ASCENDING), ("price_per_day", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("price_per_day", ASCENDING)]),
+        # Tìm đơn đặt xe theo tiền tố biển số/thương hiệu/mẫu xe ở trang quản lý
+        IndexModel([("search_keys", ASCENDING)]),
+    ],
+    "bookings": [
+        # Kiểm tra trùng lịch và tình trạng trống của xe
+        IndexModel([("vehicle_id", ASCENDING), ("status", ASCENDING), ("start_date", ASCENDING), ("end_date", ASCENDING)]),
+        # Danh sách đơn của khách hàng (lọc theo trạng thái, phân trang theo _id)
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("_id", DESCENDING)]),
+        # Tìm kiếm đơn theo trạng thái thanh toán ở trang quản lý
+        IndexModel([("payment_status", ASCENDING)]),
+        # Lọc theo khoảng thời gian ở trang thống kê
+        IndexModel([("created_at", ASCENDING)]),
+        # Luồng nền tìm các đơn đã quá ngày kết thúc
+        IndexModel([("end_date", ASCENDING)]),
+    ],
+    "vehicle_slots": [
+        # Hai đơn không thể cùng giữ một ngày của một xe
+        IndexModel([("vehicle_id", ASCENDING), ("day", ASCENDING)], unique=True),
+        IndexModel([("booking_id", ASCENDING)]),
+    ],
+    "booking_daily_stats": [
+        # Khóa của bảng tổng hợp, cần index duy nhất để $merge khớp theo các trường này
+        IndexModel([("day", ASCENDING), ("vehicle_id", ASCENDING), ("payment_status", ASCENDING)], unique=True),
+    ],
+    "payment_cards": [
+        IndexModel([("card_number", ASCENDING)], unique=True),
+    ],
+}
+
+# Các tùy chọn index được so sánh khi đối chiếu khai báo với thực tế
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+_ensured = False
+_ensure_lock = threading.Lock()
+
+def _declared(model):
+    document = model.document
+    return {
+        "name": document["name"],
+        "key": list(document["key"].items()),
+        "options": {option: document[option] for option in COMPARED_OPTIONS if document.get(option)}
+    }
+
+def diff_indexes(database=None, collections=None):
+    """
+    Đối chiếu index khai báo với index thực tế.
+    Trả về {collection: {"missing": [...], "different": [...], "extra": [...]}} chỉ cho các collection có khác biệt.
+    """
+    database = database if database is not None else db
+    report = {}
+    for name in collections or INDEX_SPECS:
+        actual = database[name].index_information()
+        declared = [_declared(model) for model in INDEX_SPECS[name]]
+        missing, different = [], []
+        for index in declared:
+            existing = actual.get(index["name"])
+            if existing is None:
+                missing.append(index["name"])
+                continue
+            existing_options = {option: existing[option] for option in COMPARED_OPTIONS if existing.get(option)}
+            if [tuple(field) for field in existing["key"]] != index["key"] or existing_options != index["options"]:
+                different.append(index["name"])
+        declared_names = {index["name"] for index in declared}
+        extra = [index_name for index_name in actual if index_name != "_id_" and index_name not in declared_names]
+        if missing or different or extra:
+            report[name] = {"missing": missing, "different": different, "extra": extra}
+    return report
+
+def ensure_collection_indexes(database, name):
+    """Tạo các index khai báo của một collection (create_indexes bỏ qua index đã có)."""
+    return database[name].create_indexes(INDEX_SPECS[name])
+
+def ensure_indexes(database=None):
+    """
+    Tạo mọi index khai báo còn thiếu, chỉ chạy một lần mỗi tiến trình.
+    Index thiếu được ghi log trước khi tạo; lỗi của một collection không chặn các collection khác.
+    """
+    global _ensured
+    with _ensure_lock:
+        if _ensured:
+            return False
+        database = database if database is not None else db
+        for name, changes in diff_indexes(database).items():
+            if changes["missing"]:
+                logger.warning(f"Collection {name} thiếu index: {', '.join(changes['missing'])}")
+            if changes["different"]:
+                logger.warning(f"Collection {name} có index khác với khai báo: {', '.join(changes['different'])}")
+        for name in INDEX_SPECS:
+            try:
+                ensure_collection_indexes(database, name)
+            except PyMongoError as e:
+                logger.error(f"Không tạo được index cho collection {name}: {e}")
+        _ensured = True
+        logger.info("Đã kiểm tra index của tất cả collection.")
+        return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đối chiếu index khai báo với index thực tế trên MongoDB.")
+    parser.add_argument("--apply", action="store_true", help="Tạo các index còn thiếu sau khi đối chiếu")
+    args = parser.parse_args()
+
+    report = diff_indexes()
+    if not report:
+        print("Tất cả index đã khớp với khai báo.")
+    for name, changes in report.items():
+        print(f"[{name}]")
+        for kind in ("missing", "different", "extra"):
+            for index_name in changes[kind]:
+                print(f"  {kind:<10} {index_name}")
+    if args.apply:
+        ensure_indexes()
+        print("Đã tạo các index còn thiếu.")
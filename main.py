@@ -2,12 +2,18 @@ import os
 import streamlit as st
 st.set_page_config(page_title="Hệ Thống Quản Lý Cho Thuê Xe", layout="wide")
 
-from modules.auth import register, login, verify_2fa, decrypt_data
+from modules.auth import register, login, verify_2fa, decrypt_data, ensure_user_search_keys
 from modules.customer import customer_dashboard
 from modules.admin import admin_dashboard
-from modules.vehicle import initialize_vehicle_data
+from modules.vehicle import initialize_vehicle_data, ensure_vehicle_indexes, with_search_fields
+from indexes import ensure_indexes, ensure_collection_indexes
+from modules.scheduler import start_scheduler
+from modules.crypto import get_crypto_service, start_reencryption
+from modules.migrate_booking_dates import start_booking_date_migration
+from modules.vehicle_catalog import invalidate_vehicle_catalog
 from local_storage import get_all_local_vehicles, clear_local_storage, is_mongodb_connected
 from config import db
+from utils import search_keys
 from dotenv import load_dotenv
 import bcrypt
 import time
@@ -56,6 +62,7 @@ def create_default_admin():
         admin_user = {
             "full_name": "Admin",
             "email": admin_email,
+            "search_keys": search_keys("Admin", admin_email),
             "password": encrypted_password,
             "phone": "123456789",
             "role": "admin",
@@ -70,7 +77,7 @@ def create_default_admin():
 def initialize_payment_cards():
     if "payment_cards" not in db.list_collection_names():
         db.create_collection("payment_cards")
-        db.payment_cards.create_index([("card_number", 1)], unique=True)
+        ensure_collection_indexes(db, "payment_cards")
         db.payment_cards.insert_many([
             {
                 "card_number": "1111222233334444",
@@ -128,7 +135,6 @@ def create_user_token(user):
 
 # Hàm đăng nhập người dùng
 def login_user(email, password):
-    from modules.auth import decrypt_data
     user = db.users.find_one({"email": email})
     if user:
         decrypted_password = decrypt_data(user['password'])
@@ -157,6 +163,13 @@ def main():
         # initialize_vehicle_data()
         # create_default_admin()
         # initialize_payment_cards() # Chạy hàm khởi tạo bảng payment_cards
+        ensure_indexes() # Tạo các index khai báo trong indexes.py, chỉ chạy một lần mỗi tiến trình
+        ensure_vehicle_indexes() # Bổ sung trường tìm kiếm cho xe cũ
+        ensure_user_search_keys() # Bổ sung khóa tìm kiếm cho người dùng cũ
+        start_booking_date_migration() # Chuyển ngày dạng chuỗi của đơn cũ sang ngày BSON ở luồng nền rồi kiểm tra lại
+        start_scheduler() # Luồng nền tự xử lý đơn hết hạn, không phụ thuộc lượt xem trang
+        get_crypto_service() # Dựng bộ mã hóa một lần từ FERNET_KEYS, báo lỗi ngay nếu thiếu khóa
+        start_reencryption() # Có khóa cũ trong FERNET_KEYS thì mã hóa lại dữ liệu người dùng ở luồng nền
 
         # Đồng bộ dữ liệu từ local storage (nếu có)
         local_vehicles = get_all_local_vehicles()
@@ -164,10 +177,11 @@ def main():
             with st.spinner("Đang đồng bộ dữ liệu từ local storage..."):
                 for vehicle in local_vehicles:
                     try:
-                        db.vehicles.insert_one(vehicle)
+                        db.vehicles.insert_one(with_search_fields(vehicle))
                     except Exception as e:
                         logger.error(f"Lỗi khi đồng bộ xe: {e}")
                 clear_local_storage()
+                invalidate_vehicle_catalog()
             st.success("Đồng bộ dữ liệu thành công!")
     else:
         st.error("Không thể kết nối đến MongoDB. Vui lòng kiểm tra file `system.log`")
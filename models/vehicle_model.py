@@ -1,23 +1,44 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, field_validator
 from typing import Optional
 
+# Các hạng bằng lái có thể yêu cầu khi thuê xe
+LICENSE_TYPES = ["A1", "A2", "B1", "B2", "C", "D", "E", "F"]
+
 class VehicleModel(BaseModel):
     brand: str
     model: str
+    license_plate: str
     price_per_day: float
     status: Optional[str] = "available"
     year: Optional[int] = None
+    image: Optional[str] = ""
     required_license_type: str
 
-    class Config:
-        schema_extra = {
-            "example": {
-                "brand": "Toyota",
-                "model": "Camry",
-                "license_plate": "ABC123",
-                "price_per_day": 50.0,
-                "status": "available",
-                "year": 2020,
-                "required_license_type": "B2"
-            }
-        }
\ No newline at end of file
+    @field_validator("license_plate")
+    @classmethod
+    def license_plate_not_blank(cls, value):
+        value = value.strip()
+        if not value:
+            raise ValueError("Biển số xe không được để trống")
+        return value
+
+    @field_validator("required_license_type")
+    @classmethod
+    def known_license_type(cls, value):
+        value = value.strip().upper()
+        if value not in LICENSE_TYPES:
+            raise ValueError(f"Hạng bằng lái phải là một trong {', '.join(LICENSE_TYPES)}")
+        return value
+
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "brand": "Toyota",
+            "model": "Camry",
+            "license_plate": "ABC123",
+            "price_per_day": 50.0,
+            "status": "available",
+            "year": 2020,
+            "image": "",
+            "required_license_type": "B2"
+        }
+    })
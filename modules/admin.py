@@ -1,19 +1,24 @@
 import streamlit as st
 from modules.vehicle import manage_vehicles
+from modules.vehicle_catalog import get_vehicle_catalog
+from modules.vehicle_import import vehicle_import_form
 from modules.booking import manage_bookings
+from modules.booking_stats import booking_statistics
+from modules.stats_cache import FLEET_VERSIONS, cached_booking_statistics, cached_fleet_utilization, get_statistics_cache, statistics_cache_key
+from modules.snapshots import snapshot_booking_statistics, snapshot_covers
+from modules.reports import build_report, cursor_source, dataframe_source, get_report_worker, report_key
+from modules.versions import get_versions
 from config import db
 import pandas as pd
 import matplotlib.pyplot as plt
 from bson import ObjectId
 import datetime
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
+import time
 from io import BytesIO
 
 def admin_dashboard(user):
     st.subheader("Quản lý hệ thống: Admin")
-    menu = ["Quản Lý Xe", "Quản Lý Đơn Đặt Hàng", "Thống Kê"]
+    menu = ["Quản Lý Xe", "Nhập Xe Hàng Loạt", "Quản Lý Đơn Đặt Hàng", "Thống Kê"]
     # Lưu lựa chọn vào session_state
     if 'selected_menu' not in st.session_state:
         st.session_state['selected_menu'] = menu[0]
@@ -24,11 +29,66 @@ def admin_dashboard(user):
 
     if choice == "Quản Lý Xe":
         manage_vehicles()  # Hàm quản lý xe
+    elif choice == "Nhập Xe Hàng Loạt":
+        vehicle_import_form()  # Nhập nhiều xe từ file CSV/Excel
     elif choice == "Quản Lý Đơn Đặt Hàng":
         manage_bookings()  # Gọi hàm quản lý đơn đặt hàng
     elif choice == "Thống Kê":
         view_statistics()  # Gọi hàm thống kê
 
+def vehicle_statistics():
+    """Tổng số xe và số xe theo trạng thái trong một lần aggregate."""
+    result = next(db.vehicles.aggregate([
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        }}
+    ]), {})
+    return {
+        "total_vehicles": (result.get("total") or [{}])[0].get("count", 0),
+        "status": result.get("status", [])
+    }
+
+def legacy_statistics(query_filter):
+    """
+    Các truy vấn riêng lẻ của trang thống kê trước khi dùng $facet và bảng tổng hợp theo ngày.
+    Chỉ giữ lại để so sánh thời gian (trang thống kê và benchmarks/bench_statistics.py).
+    """
+    total_bookings = db.bookings.count_documents(query_filter)
+    list(db.bookings.aggregate([{"$match": query_filter}, {"$group": {"_id": None, "total": {"$sum": "$total_price"}}}]))
+    len(list(db.bookings.aggregate([{"$match": query_filter}, {"$group": {"_id": "$user_id"}}])))
+    db.vehicles.count_documents({})
+    month = {"year": {"$year": "$created_at"}, "month": {"$month": "$created_at"}}
+    list(db.bookings.aggregate([{"$match": query_filter}, {"$group": {"_id": month, "total": {"$sum": "$total_price"}}}]))
+    list(db.bookings.aggregate([{"$match": query_filter}, {"$group": {"_id": "$payment_status", "count": {"$sum": 1}}}]))
+    list(db.bookings.aggregate([
+        {"$match": query_filter},
+        {"$lookup": {"from": "vehicles", "localField": "vehicle_id", "foreignField": "_id", "as": "vehicle_info"}},
+        {"$unwind": "$vehicle_info"},
+        {"$group": {"_id": "$vehicle_info.license_plate", "total_revenue": {"$sum": "$total_price"}}},
+    ]))
+    list(db.bookings.aggregate([{"$match": query_filter}, {"$group": {"_id": month, "count": {"$sum": 1}}}]))
+    list(db.bookings.aggregate([
+        {"$match": query_filter},
+        {"$group": {"_id": "$payment_status", "count": {"$sum": 1}}},
+        {"$project": {"count": 1, "percentage": {"$multiply": [{"$divide": ["$count", max(total_bookings, 1)]}, 100]}}},
+    ]))
+    list(db.vehicles.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]))
+
+def compare_statistics_timing(start_date, end_date, vehicle_ids=None):
+    """Thời gian (ms) lấy số liệu thống kê theo cách cũ và cách hiện tại (không qua bộ nhớ đệm) cho cùng bộ lọc."""
+    query_filter = {"created_at": {"$gte": start_date, "$lte": end_date}}
+    if vehicle_ids:
+        query_filter["vehicle_id"] = {"$in": vehicle_ids}
+    started = time.perf_counter()
+    legacy_statistics(query_filter)
+    legacy_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    booking_statistics(start_date, end_date, vehicle_ids)
+    vehicle_statistics()
+    current_ms = (time.perf_counter() - started) * 1000
+    return {"legacy_ms": legacy_ms, "current_ms": current_ms}
+
 def view_statistics():
     st.subheader("Thống Kê Chi Tiết")
 
@@ -44,88 +104,77 @@ def view_statistics():
     end_date = datetime.datetime.combine(end_date, datetime.datetime.max.time())
 
     # Thêm bộ lọc xe
-    vehicle_options = [f"{v['brand']} {v['model']} - {v['license_plate']}" for v in db.vehicles.find({}, {"brand": 1, "model": 1, "license_plate": 1})]
-    selected_vehicles = st.multiselect("Chọn xe", vehicle_options)
-
-    # Tạo bộ lọc chung cho các truy vấn
-    query_filter = {
-        "created_at": {"$gte": start_date, "$lte": end_date}
-    }
-
-    if selected_vehicles:
-        # Lấy danh sách biển số xe từ lựa chọn của người dùng
-        selected_license_plates = [v.split(" - ")[-1] for v in selected_vehicles]
-        vehicle_ids = [v["_id"] for v in db.vehicles.find({"license_plate": {"$in": selected_license_plates}}, {"_id": 1})]
-        query_filter["vehicle_id"] = {"$in": vehicle_ids}
+    catalog = get_vehicle_catalog()
+    vehicles = catalog.all()
+    if vehicles is None:
+        # Danh mục quá lớn để hiện hết: chỉ tải các xe khớp từ khóa và các xe đã chọn
+        search_term = st.text_input("Tìm xe (biển số, hãng hoặc mẫu xe)")
+        vehicles = catalog.search(search_term)
+        found_ids = {v["_id"] for v in vehicles}
+        for vehicle_id in st.session_state.get("statistics_vehicles", []):
+            vehicle = catalog.get(vehicle_id)
+            if vehicle is not None and vehicle_id not in found_ids:
+                vehicles.append(vehicle)
+    vehicle_labels = {v["_id"]: f"{v['brand']} {v['model']} - {v['license_plate']}" for v in vehicles}
+    selected_vehicles = st.multiselect("Chọn xe", list(vehicle_labels), format_func=vehicle_labels.get, key="statistics_vehicles")
+
+    # Khoảng ngày đã nằm trọn trong snapshot Parquet thì có thể tính trực tiếp từ snapshot thay vì MongoDB
+    use_snapshot = snapshot_covers(end_date) and st.checkbox(
+        "Tính từ snapshot Parquet",
+        help="Snapshot được cập nhật bằng lệnh python -m modules.snapshots; trạng thái thanh toán là tại thời điểm xuất."
+    )
+
+    # Số liệu đơn đặt xe đọc từ bảng tổng hợp theo ngày (riêng hôm nay tính từ bookings) qua bộ nhớ đệm theo bộ lọc,
+    # số liệu xe từ một lượt aggregate
+    started = time.perf_counter()
+    if use_snapshot:
+        booking_stats = snapshot_booking_statistics(start_date, end_date, selected_vehicles)
+    else:
+        booking_stats = cached_booking_statistics(start_date, end_date, selected_vehicles)
+    vehicle_stats = vehicle_statistics()
+    elapsed_ms = (time.perf_counter() - started) * 1000
 
     # Thống kê tổng số đơn đặt hàng
-    total_bookings = db.bookings.count_documents(query_filter)
+    total_bookings = booking_stats["total_bookings"]
     st.metric(label="Tổng số đơn đặt hàng", value=total_bookings)
 
     # Thống kê tổng doanh thu
-    total_revenue = db.bookings.aggregate([
-        {"$match": query_filter},
-        {"$group": {"_id": None, "total": {"$sum": "$total_price"}}}
-    ])
-    revenue = next(total_revenue, {}).get("total", 0)
+    revenue = booking_stats["revenue"]
     st.metric(label="Tổng doanh thu (USD)", value=f"{revenue:,.2f}") # Format số
 
-    # Thống kê số lượng khách hàng
-    # Lưu ý: Cần lọc các đơn hàng của cùng 1 khách hàng, nếu không sẽ tính trùng
-    distinct_customers = db.bookings.aggregate([
-        {"$match": query_filter},
-        {"$group": {"_id": "$user_id"}}
-    ])
-    total_customers = len(list(distinct_customers))
-    st.metric(label="Tổng số khách hàng", value=total_customers)
+    # Thống kê số lượng khách hàng (mỗi khách hàng chỉ tính một lần)
+    st.metric(label="Tổng số khách hàng", value=booking_stats["total_customers"])
 
     # Thống kê tổng số xe
-    total_vehicles = db.vehicles.count_documents({})
-    st.metric(label="Tổng số xe", value=total_vehicles)
+    st.metric(label="Tổng số xe", value=vehicle_stats["total_vehicles"])
+    st.caption(f"Thời gian truy vấn thống kê: {elapsed_ms:.0f} ms")
+    # Chạy lại cả các truy vấn riêng lẻ cũ nên chỉ đo khi admin yêu cầu
+    if st.button("So sánh với cách truy vấn cũ"):
+        timing = compare_statistics_timing(start_date, end_date, selected_vehicles)
+        st.caption(
+            f"Cách cũ (10 truy vấn riêng lẻ): {timing['legacy_ms']:.0f} ms - "
+            f"cách hiện tại không qua bộ nhớ đệm: {timing['current_ms']:.0f} ms"
+        )
+    with st.expander("Bộ nhớ đệm thống kê"):
+        st.json(get_statistics_cache().stats())
+
+    # Chuỗi doanh thu và số đơn theo tháng đã đủ mọi tháng trong khoảng lọc (tháng không có đơn bằng 0),
+    # dùng chung cho hai biểu đồ theo tháng và báo cáo Excel
+    series = booking_stats["series"]
+    months = series["bucket"].dt.strftime("%Y-%m")
+    revenue_df = pd.DataFrame({"Tháng": months, "Doanh Thu (USD)": series["revenue"]})
+    booking_count_df = pd.DataFrame({"Tháng": months, "Số Lượng Đơn": series["count"]})
 
     # Thống kê doanh thu theo tháng
     st.subheader("Doanh Thu Theo Tháng")
-    monthly_revenue = db.bookings.aggregate([
-        {"$match": query_filter},
-        {"$group": {
-            "_id": {
-                "year": {"$year": "$created_at"},
-                "month": {"$month": "$created_at"}
-            },
-            "total": {"$sum": "$total_price"}
-        }},
-        {"$sort": {"_id.year": 1, "_id.month": 1}}
-    ])
-    monthly_revenue = list(monthly_revenue)
-
-    # Tạo DataFrame từ dữ liệu truy vấn
-    revenue_data = []
-    for item in monthly_revenue:
-        month_str = f"{item['_id']['year']}-{item['_id']['month']:02}"
-        revenue_data.append({"Tháng": month_str, "Doanh Thu (USD)": item["total"]})
-    revenue_df = pd.DataFrame(revenue_data)
-
-    # Kiểm tra nếu chỉ có một điểm dữ liệu
-    if len(revenue_df) == 1:
-        # Lấy tháng hiện tại
-        current_month = datetime.datetime.strptime(revenue_df.iloc[0]["Tháng"], "%Y-%m")
-        previous_month = (current_month - datetime.timedelta(days=30)).strftime("%Y-%m")
-        revenue_df = pd.concat([pd.DataFrame([{"Tháng": previous_month, "Doanh Thu (USD)": 0}]), revenue_df], ignore_index=True)
-
-    # Hiển thị biểu đồ
-    if not revenue_df.empty:
-        revenue_df = revenue_df.sort_values(by="Tháng")
+    if total_bookings:
         st.line_chart(revenue_df.set_index("Tháng"))
     else:
         st.write("Không có dữ liệu doanh thu trong khoảng thời gian này.")
 
     # Thống kê số lượng đơn đặt hàng theo trạng thái thanh toán
     st.subheader("Số Lượng Đơn Đặt Hàng Theo Trạng Thái Thanh Toán")
-    booking_status = db.bookings.aggregate([
-        {"$match": query_filter},
-        {"$group": {"_id": "$payment_status", "count": {"$sum": 1}}}
-    ])
-    booking_status_list = list(booking_status)  # Chuyển đổi cursor thành list
+    booking_status_list = booking_stats["payment_status"]
     statuses = [item["_id"] for item in booking_status_list]
     counts = [item["count"] for item in booking_status_list]
     status_df = pd.DataFrame({"Trạng Thái": statuses, "Số Lượng": counts})
@@ -133,22 +182,7 @@ def view_statistics():
 
     # Thống kê doanh thu theo xe
     st.subheader("Doanh Thu Theo Từng Xe")
-    vehicle_revenue = db.bookings.aggregate([
-        {"$match": query_filter},
-        {"$lookup": {
-            "from": "vehicles",
-            "localField": "vehicle_id",
-            "foreignField": "_id",
-            "as": "vehicle_info"
-        }},
-        {"$unwind": "$vehicle_info"},
-        {"$group": {
-            "_id": "$vehicle_info.license_plate",
-            "total_revenue": {"$sum": "$total_price"}
-        }},
-        {"$sort": {"total_revenue": -1}}
-    ])
-    vehicle_revenue = list(vehicle_revenue)
+    vehicle_revenue = booking_stats["vehicle_revenue"]
     vehicles = [item["_id"] for item in vehicle_revenue]
     revenues_per_vehicle = [item["total_revenue"] for item in vehicle_revenue]
 
@@ -162,61 +196,22 @@ def view_statistics():
 
     # Thống kê số lượng đơn đặt hàng theo tháng
     st.subheader("Số Lượng Đơn Đặt Hàng Theo Tháng")
-    monthly_booking_count = db.bookings.aggregate([
-        {"$match": query_filter},
-        {"$addFields": {"month": {"$month": "$created_at"}}},  # Trích xuất tháng
-        {"$group": {
-            "_id": {
-                "year": {"$year": "$created_at"},
-                "month": {"$month": "$created_at"}
-            },
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"_id.year": 1, "_id.month": 1}}
-    ])
-    monthly_booking_count = list(monthly_booking_count)
-    # print("monthly_booking_count:", monthly_booking_count)
-    # Tạo DataFrame từ dữ liệu truy vấn
-    booking_count_data = []
-    for item in monthly_booking_count:
-        month_str = f"{item['_id']['year']}-{item['_id']['month']:02}"  # Định dạng tháng
-        booking_count_data.append({"Tháng": month_str, "Số Lượng Đơn": item["count"]})
-    booking_count_df = pd.DataFrame(booking_count_data)
-
-    # Thêm dữ liệu giả nếu chỉ có một tháng
-    if len(booking_count_df) == 1:
-        # Lấy tháng hiện tại
-        current_month = datetime.datetime.strptime(booking_count_df['Tháng'][0], "%Y-%m")
-        # Thêm tháng trước đó với giá trị 0
-        previous_month = current_month - datetime.timedelta(days=1)
-        previous_month_str = previous_month.strftime("%Y-%m")
-        booking_count_df = pd.concat([pd.DataFrame([{"Tháng": previous_month_str, "Số Lượng Đơn": 0}]), booking_count_df], ignore_index=True)
-
-    # Kiểm tra xem DataFrame có trống không
-    if not booking_count_df.empty:
+    if total_bookings:
         st.line_chart(booking_count_df.set_index("Tháng"))
     else:
         st.write("Không có dữ liệu đơn đặt hàng trong khoảng thời gian này.")
-    
+
     # Thống kê tỷ lệ phần trăm trạng thái thanh toán
     st.subheader("Tỷ Lệ Phần Trăm Trạng Thái Thanh Toán")
-    payment_status_stats = db.bookings.aggregate([
-        {"$match": query_filter},
-        {"$group": {"_id": "$payment_status", "count": {"$sum": 1}}},
-        {"$project": {
-            "payment_status": "$_id",
-            "count": 1,
-            "percentage": {
-                "$cond": {
-                    "if": {"$eq": [total_bookings, 0]},
-                    "then": 0,
-                    "else": {"$multiply": [{"$divide": ["$count", total_bookings]}, 100]}
-                }
-            }
-        }}
+    payment_status_stats_df = pd.DataFrame([
+        {
+            "_id": item["_id"],
+            "count": item["count"],
+            "payment_status": item["_id"],
+            "percentage": item["count"] / total_bookings * 100 if total_bookings else 0
+        }
+        for item in booking_status_list
     ])
-
-    payment_status_stats_df = pd.DataFrame(list(payment_status_stats))
     # Kiểm tra xem cột 'percentage' có tồn tại không trước khi format
     if 'percentage' in payment_status_stats_df.columns:
         payment_status_stats_df["percentage"] = payment_status_stats_df["percentage"].map("{:.2f}%".format)
@@ -224,10 +219,7 @@ def view_statistics():
     
     # Thống kê tình trạng xe
     st.subheader("Tình Trạng Xe")
-    vehicle_statuses = db.vehicles.aggregate([
-        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
-    ])
-    vehicle_statuses = list(vehicle_statuses)
+    vehicle_statuses = vehicle_stats["status"]
     statuses = [item["_id"] for item in vehicle_statuses]
     counts = [item["count"] for item in vehicle_statuses]
     status_vehicle_df = pd.DataFrame({"Trạng Thái": statuses, "Số Lượng": counts})
@@ -235,114 +227,144 @@ def view_statistics():
     # Vẽ biểu đồ cột
     st.bar_chart(status_vehicle_df.set_index("Trạng Thái"))
 
-    # Xuất báo cáo
-    if st.button("Xuất Báo Cáo (Excel)"):
-        output = export_to_excel(
+    # Mức độ sử dụng xe: số ngày có đơn trên tổng số ngày của khoảng lọc
+    st.subheader("Mức Độ Sử Dụng Xe")
+    utilization = cached_fleet_utilization(start_date, end_date, selected_vehicles)
+    utilization_df = utilization["vehicles"].rename(columns=UTILIZATION_VEHICLE_COLUMNS)
+    brand_utilization_df = utilization["brands"].rename(columns=UTILIZATION_BRAND_COLUMNS)
+    if not utilization_df.empty:
+        st.bar_chart(utilization_df.set_index("Biển Số")["Tỷ Lệ Sử Dụng (%)"])
+        st.dataframe(utilization_df.round(2), hide_index=True)
+        st.write("Theo thương hiệu")
+        st.dataframe(brand_utilization_df.round(2), hide_index=True)
+        peak_days = utilization["peak_days"]
+        if not peak_days.empty:
+            st.caption("Ngày cao điểm: " + ", ".join(f"{row.day:%d/%m/%Y} ({row.in_use} xe)" for row in peak_days.itertuples()))
+    else:
+        st.write("Không có dữ liệu xe trong khoảng thời gian này.")
+
+    # Xuất báo cáo: file được tạo ở luồng nền và dùng lại cho cùng bộ lọc và cùng phiên bản dữ liệu.
+    # Báo cáo có trạng thái đơn, trạng thái xe và mức độ sử dụng xe nên khóa gồm mọi bộ đếm của FLEET_VERSIONS.
+    worker = get_report_worker()
+    key = report_key(statistics_cache_key(start_date, end_date, selected_vehicles), use_snapshot, get_versions(FLEET_VERSIONS))
+    booking_filter = {"created_at": {"$gte": start_date, "$lte": end_date}}
+    if selected_vehicles:
+        booking_filter["vehicle_id"] = {"$in": selected_vehicles}
+
+    def build_statistics_report(path):
+        return export_to_excel(
             revenue_df,
             status_df,
             vehicle_df,
             booking_count_df,
             payment_status_stats_df,
-            status_vehicle_df
-        )
-        st.download_button(
-            label="Tải xuống",
-            data=output,
-            file_name="thong_ke.xlsx",
-            mime="application/vnd.ms-excel"
+            status_vehicle_df,
+            utilization_df=utilization_df,
+            brand_utilization_df=brand_utilization_df,
+            path=path,
+            booking_filter=booking_filter
         )
 
-def export_to_excel(revenue_df, status_df, vehicle_df, booking_count_df, payment_status_stats_df, status_vehicle_df):
-    output = BytesIO()
-    workbook = Workbook()
-
-    # Định dạng chung
-    bold_font = Font(bold=True)
-    center_alignment = Alignment(horizontal="center")
-    border = Border(left=Side(style='thin'), 
-                    right=Side(style='thin'), 
-                    top=Side(style='thin'), 
-                    bottom=Side(style='thin'))
-
-    # Sheet Doanh Thu Theo Tháng
-    sheet_revenue = workbook.active
-    sheet_revenue.title = "Doanh Thu Theo Tháng"
-    for r in dataframe_to_rows(revenue_df, index=True, header=True):
-        sheet_revenue.append(r)
-    # Format header
-    for cell in sheet_revenue["1:1"]:
-        cell.font = bold_font
-        cell.alignment = center_alignment
-        cell.border = border
-    # Căn giữa cột index
-    for row in sheet_revenue.iter_rows():
-        row[0].alignment = center_alignment
-        for cell in row:
-            cell.border = border
-
-    # Sheet Số Lượng Đơn Đặt Hàng Theo Trạng Thái Thanh Toán
-    sheet_status = workbook.create_sheet("SL Đơn Hàng Theo Trạng Thái")
-    for r in dataframe_to_rows(status_df, index=True, header=True):
-        sheet_status.append(r)
-    for cell in sheet_status["1:1"]:
-        cell.font = bold_font
-        cell.alignment = center_alignment
-        cell.border = border
-    for row in sheet_status.iter_rows():
-        row[0].alignment = center_alignment
-        for cell in row:
-            cell.border = border
-
-    # Sheet Doanh Thu Theo Từng Xe
-    sheet_vehicle = workbook.create_sheet("Doanh Thu Theo Từng Xe")
-    for r in dataframe_to_rows(vehicle_df, index=True, header=True):
-        sheet_vehicle.append(r)
-    for cell in sheet_vehicle["1:1"]:
-        cell.font = bold_font
-        cell.alignment = center_alignment
-        cell.border = border
-    for row in sheet_vehicle.iter_rows():
-        row[0].alignment = center_alignment
-        for cell in row:
-            cell.border = border
-
-    # Sheet Số Lượng Đơn Đặt Hàng Theo Tháng
-    sheet_booking_count = workbook.create_sheet("SL Đơn Hàng Theo Tháng")
-    for r in dataframe_to_rows(booking_count_df, index=True, header=True):
-        sheet_booking_count.append(r)
-    for cell in sheet_booking_count["1:1"]:
-        cell.font = bold_font
-        cell.alignment = center_alignment
-        cell.border = border
-    for row in sheet_booking_count.iter_rows():
-        row[0].alignment = center_alignment
-        for cell in row:
-            cell.border = border
-
-    # Sheet Tỷ Lệ Phần Trăm Trạng Thái Thanh Toán
-    sheet_payment_status = workbook.create_sheet("Tỷ Lệ Trạng Thái TT")
-    for r in dataframe_to_rows(payment_status_stats_df, index=False, header=True):
-        sheet_payment_status.append(r)
-    for cell in sheet_payment_status["1:1"]:
-        cell.font = bold_font
-        cell.alignment = center_alignment
-        cell.border = border
-    for row in sheet_payment_status.iter_rows():
-        for cell in row:
-            cell.border = border
-            
-    # Sheet Tình Trạng Xe
-    sheet_vehicle_status = workbook.create_sheet("Tình Trạng Xe")
-    for r in dataframe_to_rows(status_vehicle_df, index=True, header=True):
-        sheet_vehicle_status.append(r)
-    for cell in sheet_vehicle_status["1:1"]:
-        cell.font = bold_font
-        cell.alignment = center_alignment
-        cell.border = border
-    for row in sheet_vehicle_status.iter_rows():
-        row[0].alignment = center_alignment
-        for cell in row:
-            cell.border = border
-
-    workbook.save(output)
-    return output
\ No newline at end of file
+    if st.button("Xuất Báo Cáo (Excel)"):
+        worker.submit(key, build_statistics_report)
+
+    report_status = worker.status(key)
+    if report_status == "ready":
+        try:
+            with open(worker.path(key), "rb") as report_file:
+                report_data = report_file.read()
+        except FileNotFoundError:
+            # File vừa bị xóa khi dọn các báo cáo hết hạn: tạo lại
+            worker.submit(key, build_statistics_report)
+            report_status = worker.status(key)
+        else:
+            st.download_button(
+                label="Tải xuống",
+                data=report_data,
+                file_name="thong_ke.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+    if report_status == "running":
+        _wait_for_report(worker, key)
+    elif report_status == "failed":
+        st.error("Không tạo được báo cáo. Vui lòng thử lại.")
+
+# Các sheet của báo cáo thống kê: (tên sheet, tên bảng số liệu, có ghi cột index hay không)
+STATISTICS_REPORT_SHEETS = [
+    ("Doanh Thu Theo Tháng", "revenue_df", True),
+    ("SL Đơn Hàng Theo Trạng Thái", "status_df", True),
+    ("Doanh Thu Theo Từng Xe", "vehicle_df", True),
+    ("SL Đơn Hàng Theo Tháng", "booking_count_df", True),
+    ("Tỷ Lệ Trạng Thái TT", "payment_status_stats_df", False),
+    ("Tình Trạng Xe", "status_vehicle_df", True),
+    ("Mức Sử Dụng Theo Xe", "utilization_df", False),
+    ("Mức Sử Dụng Theo Thương Hiệu", "brand_utilization_df", False),
+]
+# Tiêu đề hiển thị của các cột trong kết quả fleet_utilization
+UTILIZATION_VEHICLE_COLUMNS = {
+    "license_plate": "Biển Số",
+    "brand": "Thương Hiệu",
+    "busy_days": "Số Ngày Có Đơn",
+    "utilization": "Tỷ Lệ Sử Dụng (%)",
+    "longest_idle": "Chuỗi Ngày Trống Dài Nhất",
+    "trailing_idle": "Số Ngày Trống Đến Cuối Kỳ",
+}
+UTILIZATION_BRAND_COLUMNS = {
+    "brand": "Thương Hiệu",
+    "vehicles": "Số Xe",
+    "busy_days": "Số Ngày Có Đơn",
+    "utilization": "Tỷ Lệ Sử Dụng (%)",
+    "peak_day": "Ngày Cao Điểm",
+    "peak_in_use": "Số Xe Thuê Ngày Cao Điểm",
+}
+# Sheet chi tiết đơn đặt xe đọc dần từ cursor: (tiêu đề cột, tên trường)
+BOOKING_DETAIL_COLUMNS = [
+    ("Mã Đơn", "_id"),
+    ("Mã Khách Hàng", "user_id"),
+    ("Mã Xe", "vehicle_id"),
+    ("Ngày Tạo", "created_at"),
+    ("Ngày Bắt Đầu", "start_date"),
+    ("Ngày Kết Thúc", "end_date"),
+    ("Tổng Giá (USD)", "total_price"),
+    ("Trạng Thái Thanh Toán", "payment_status"),
+    ("Trạng Thái Đơn Hàng", "status"),
+]
+
+def export_to_excel(revenue_df, status_df, vehicle_df, booking_count_df, payment_status_stats_df, status_vehicle_df,
+                    utilization_df=None, brand_utilization_df=None, path=None, booking_filter=None):
+    """
+    Ghi báo cáo thống kê ra file path (hoặc trả về BytesIO nếu không có path).
+    Các bảng mức độ sử dụng xe không được truyền vào thì bỏ qua sheet tương ứng.
+    Nếu có booking_filter, thêm sheet chi tiết các đơn đặt xe khớp bộ lọc.
+    """
+    frames = {
+        "revenue_df": revenue_df,
+        "status_df": status_df,
+        "vehicle_df": vehicle_df,
+        "booking_count_df": booking_count_df,
+        "payment_status_stats_df": payment_status_stats_df,
+        "status_vehicle_df": status_vehicle_df,
+        "utilization_df": utilization_df,
+        "brand_utilization_df": brand_utilization_df
+    }
+    sheets = [
+        (title, dataframe_source(frames[name], index), index)
+        for title, name, index in STATISTICS_REPORT_SHEETS
+        if frames[name] is not None
+    ]
+    if booking_filter is not None:
+        projection = {field: 1 for _, field in BOOKING_DETAIL_COLUMNS}
+        cursor = db.bookings.find(booking_filter, projection).sort("created_at", 1).batch_size(1000)
+        sheets.append(("Chi Tiết Đơn Hàng", cursor_source(cursor, BOOKING_DETAIL_COLUMNS), False))
+
+    output = path or BytesIO()
+    build_report(output, sheets)
+    return output
+
+@st.fragment(run_every=1)
+def _wait_for_report(worker, key):
+    """Kiểm tra mỗi giây cho tới khi báo cáo tạo xong rồi tải lại trang để hiện nút tải xuống."""
+    if worker.status(key) == "running":
+        st.info("Đang tạo báo cáo ở nền, bạn có thể tiếp tục xem thống kê...")
+    else:
+        st.rerun(scope="app")
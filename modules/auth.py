@@ -1,31 +1,26 @@
 import streamlit as st
 from config import db
 import bcrypt
-from utils import sanitize_input
+from utils import sanitize_input, search_keys
+from pymongo import UpdateOne
+import logging
 import datetime
 import time
 import pyotp
 import qrcode
 import io
 from PIL import Image
+from modules.crypto import decrypt, encrypt
+
+logger = logging.getLogger(__name__)
 
 def encrypt_data(data):
-    """Mã hóa dữ liệu sử dụng Fernet."""
-    from cryptography.fernet import Fernet
-    import os
-    FERNET_KEY = os.environ.get("FERNET_KEY").encode()
-    cipher = Fernet(FERNET_KEY)
-    encrypted_data = cipher.encrypt(data.encode())
-    return encrypted_data.decode()
+    """Mã hóa dữ liệu sử dụng Fernet (khóa chính trong FERNET_KEYS)."""
+    return encrypt(data)
 
 def decrypt_data(encrypted_data):
-    """Giải mã dữ liệu đã mã hóa bằng Fernet."""
-    from cryptography.fernet import Fernet
-    import os
-    FERNET_KEY = os.environ.get("FERNET_KEY").encode()
-    cipher = Fernet(FERNET_KEY)
-    decrypted_data = cipher.decrypt(encrypted_data.encode())
-    return decrypted_data.decode()
+    """Giải mã dữ liệu đã mã hóa bằng Fernet với bất kỳ khóa nào trong FERNET_KEYS."""
+    return decrypt(encrypted_data)
 
 def register():
     st.subheader("Đăng Ký")
@@ -59,6 +54,7 @@ def register():
             user = {
                 "full_name": full_name,
                 "email": email,
+                "search_keys": search_keys(full_name, email),
                 "password": encrypted_password,
                 "phone": phone,
                 "address": address,
@@ -81,6 +77,23 @@ def register():
         else:
             st.error("Vui lòng điền đầy đủ thông tin!")
 
+def backfill_user_search_keys():
+    """Điền search_keys (tìm theo tiền tố tên/email ở trang quản lý đơn) cho các người dùng cũ chưa có trường này."""
+    operations = [
+        UpdateOne({"_id": user["_id"]}, {"$set": {"search_keys": search_keys(user.get("full_name"), user.get("email"))}})
+        for user in db.users.find({"search_keys": {"$exists": False}}, {"full_name": 1, "email": 1})
+    ]
+    if operations:
+        db.users.bulk_write(operations, ordered=False)
+        logger.info(f"Đã bổ sung search_keys cho {len(operations)} người dùng.")
+    return len(operations)
+
+@st.cache_resource
+def ensure_user_search_keys():
+    """backfill_user_search_keys, chỉ chạy một lần mỗi tiến trình."""
+    backfill_user_search_keys()
+    return True
+
 def generate_2fa_secret():
     """Tạo secret key cho 2FA."""
     return pyotp.random_base32()
@@ -172,6 +185,7 @@ def update_user_info(user):
             updated_data = {
                 "full_name": full_name,
                 "email": email,
+                "search_keys": search_keys(full_name, email),
                 "phone": phone,
                 "address": address,
                 "driver_license": {
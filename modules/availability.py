@@ -0,0 +1,136 @@
+from config import db
+import numpy as np
+import datetime
+import logging
+from utils import to_db_date, from_db_date
+
+logger = logging.getLogger(__name__)
+
+# Các trạng thái đơn không còn giữ xe
+INACTIVE_BOOKING_STATUSES = ["cancelled", "completed"]
+# Phép so sánh tương ứng trên chuỗi ISO (có thể kèm giờ, ví dụ "2024-01-05T10:00"): (toán tử, số ngày cộng thêm vào mốc)
+STRING_DATE_OPERATORS = {"$lte": ("$lt", 1), "$lt": ("$lt", 0), "$gte": ("$gte", 0), "$gt": ("$gte", 1)}
+
+# True cho tới khi đã xác nhận không còn đơn lưu ngày dạng chuỗi (xem migrate_booking_dates.ensure_booking_dates)
+_match_string_dates = True
+
+def match_string_dates(enabled):
+    """Bật/tắt nhánh so khớp ngày dạng chuỗi ISO của dữ liệu cũ trong các điều kiện lọc theo ngày."""
+    global _match_string_dates
+    _match_string_dates = enabled
+
+def date_condition(field, operator, day):
+    """
+    Điều kiện so sánh field của bookings với ngày day ($lte, $lt, $gte hoặc $gt).
+    MongoDB không so sánh chuỗi với ngày BSON nên khi còn đơn cũ lưu ngày dạng chuỗi ISO,
+    điều kiện có thêm một nhánh so sánh chuỗi để các đơn đó không bị bỏ sót.
+    """
+    condition = {field: {operator: to_db_date(day)}}
+    if not _match_string_dates:
+        return condition
+    string_operator, offset = STRING_DATE_OPERATORS[operator]
+    bound = to_db_date(day).date() + datetime.timedelta(days=offset)
+    return {"$or": [condition, {field: {string_operator: bound.isoformat()}}]}
+
+def _overlap_conditions(start_date, end_date):
+    # Hai khoảng [a, b] và [c, d] giao nhau khi a <= d và b >= c.
+    return [date_condition("start_date", "$lte", end_date), date_condition("end_date", "$gte", start_date)]
+
+def find_conflicting_booking(vehicle_id, start_date, end_date, exclude_booking_id=None):
+    """Trả về đơn đặt đầu tiên trùng lịch với khoảng thời gian đã cho, hoặc None."""
+    query = {
+        "vehicle_id": vehicle_id,
+        "status": {"$nin": INACTIVE_BOOKING_STATUSES},
+        "$and": _overlap_conditions(start_date, end_date)
+    }
+    if exclude_booking_id is not None:
+        query["_id"] = {"$ne": exclude_booking_id}
+    return db.bookings.find_one(query, {"start_date": 1, "end_date": 1, "status": 1})
+
+def _to_day_offsets(values, window_start):
+    """Chuyển danh sách ngày (ngày BSON, date hoặc chuỗi ISO) thành số ngày tính từ window_start."""
+    days = np.array([from_db_date(value) for value in values], dtype="datetime64[D]")
+    return (days - np.datetime64(window_start, "D")).astype(np.int64)
+
+def build_occupancy(vehicle_ids, intervals, window_start, num_days):
+    """
+    Dựng ma trận chiếm dụng xe × ngày (kiểu bool) từ danh sách khoảng thuê.
+    intervals là danh sách (vehicle_id, start_date, end_date), ngày kết thúc được tính cả.
+    """
+    occupancy = np.zeros((len(vehicle_ids), num_days), dtype=bool)
+    if not intervals or num_days <= 0:
+        return occupancy
+
+    row_of = {vehicle_id: row for row, vehicle_id in enumerate(vehicle_ids)}
+    known = [interval for interval in intervals if interval[0] in row_of]
+    if not known:
+        return occupancy
+
+    rows = np.fromiter((row_of[interval[0]] for interval in known), dtype=np.int64, count=len(known))
+    starts = np.clip(_to_day_offsets([interval[1] for interval in known], window_start), 0, num_days)
+    ends = np.clip(_to_day_offsets([interval[2] for interval in known], window_start) + 1, 0, num_days)
+
+    # Cộng +1 tại ngày bắt đầu, -1 sau ngày kết thúc rồi cộng dồn theo hàng
+    diff = np.zeros((len(vehicle_ids), num_days + 1), dtype=np.int32)
+    np.add.at(diff, (rows, starts), 1)
+    np.add.at(diff, (rows, ends), -1)
+    return np.cumsum(diff[:, :-1], axis=1) > 0
+
+def _overlap_filter(start_date, end_date):
+    """Điều kiện lọc các đơn còn hiệu lực giao với [start_date, end_date]."""
+    return {
+        "status": {"$nin": INACTIVE_BOOKING_STATUSES},
+        "$and": _overlap_conditions(start_date, end_date)
+    }
+
+def get_busy_vehicle_ids(start_date, end_date):
+    """Danh sách _id các xe đã có đơn trong khoảng [start_date, end_date]."""
+    return db.bookings.distinct("vehicle_id", _overlap_filter(start_date, end_date))
+
+def load_booking_intervals(start_date, end_date, vehicle_ids=None):
+    """Lấy các khoảng thuê giao với [start_date, end_date] bằng một truy vấn aggregate."""
+    match = _overlap_filter(start_date, end_date)
+    if vehicle_ids is not None:
+        match["vehicle_id"] = {"$in": list(vehicle_ids)}
+
+    grouped = db.bookings.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": "$vehicle_id",
+            "intervals": {"$push": {"start": "$start_date", "end": "$end_date"}}
+        }}
+    ])
+    return [
+        (item["_id"], interval["start"], interval["end"])
+        for item in grouped
+        for interval in item["intervals"]
+    ]
+
+def get_fleet_availability(start_date, end_date, vehicle_ids=None):
+    """
+    Tính tình trạng trống của toàn bộ đội xe trong khoảng [start_date, end_date].
+    Trả về danh sách xe trống cả khoảng và ngày trống đầu tiên của từng xe (None nếu kín lịch).
+    """
+    if vehicle_ids is None:
+        vehicle_ids = [v["_id"] for v in db.vehicles.find({}, {"_id": 1})]
+    vehicle_ids = list(vehicle_ids)
+    num_days = (end_date - start_date).days + 1
+
+    intervals = load_booking_intervals(start_date, end_date, vehicle_ids)
+    occupancy = build_occupancy(vehicle_ids, intervals, start_date, num_days)
+
+    free_mask = ~occupancy.any(axis=1)
+    has_free_day = ~occupancy.all(axis=1) if num_days > 0 else np.zeros(len(vehicle_ids), dtype=bool)
+    first_free_offset = np.argmin(occupancy, axis=1) if num_days > 0 else np.zeros(len(vehicle_ids), dtype=np.int64)
+
+    first_free_date = {
+        vehicle_id: start_date + datetime.timedelta(days=int(first_free_offset[row])) if has_free_day[row] else None
+        for row, vehicle_id in enumerate(vehicle_ids)
+    }
+    logger.info(f"Tính tình trạng trống cho {len(vehicle_ids)} xe trong {num_days} ngày.")
+    return {
+        "vehicle_ids": vehicle_ids,
+        "occupancy": occupancy,
+        "free_vehicle_ids": [vehicle_id for row, vehicle_id in enumerate(vehicle_ids) if free_mask[row]],
+        "first_free_date": first_free_date
+    }
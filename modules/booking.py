@@ -1,34 +1,31 @@
 import time
 import streamlit as st
-from config import db
+from config import db, ADMIN_PAGE_SIZE, BOOKING_SEARCH_MATCH_LIMIT, VEHICLE_OPTION_LIMIT
 import hashlib
 import urllib.parse
 from bson.objectid import ObjectId
 import datetime
 import logging
 import os
+import re
+from utils import to_db_date, from_db_date, normalize_search_term
+from modules.booking_stats import record_booking_change, record_status_change, update_booking
+from modules.booking_export import EXPORT_FORMATS, export_file_name, export_to_temp_file
+from modules.availability import INACTIVE_BOOKING_STATUSES, find_conflicting_booking, get_fleet_availability
+from modules.reservation import held_slot_days, reserve_slots, release_slots, resize_slots, restore_slots
+from modules.paginated_table import paginated_table
+from modules.vehicle_catalog import get_vehicle_catalog
+from modules.thumbnails import thumbnail_path
 
 logger = logging.getLogger(__name__)
 
+# Các trạng thái thanh toán của một đơn đặt xe
+PAYMENT_STATUSES = ["pending", "paid", "failed", "refunded"]
+
 # Hàm kiểm tra tình trạng xe (đã thuê hay chưa)
 def check_vehicle_availability(vehicle_id, start_date, end_date):
     """Kiểm tra xem xe có sẵn sàng trong khoảng thời gian đã cho hay không."""
-    # Lấy danh sách các booking hiện có của xe.
-    # Không tính các đơn có trạng thái đã hủy (cancelled) hoặc đã hoàn thành (completed).
-    existing_bookings = db.bookings.find({
-        "vehicle_id": vehicle_id,
-        "status": {"$nin": ["cancelled", "completed"]}
-    })
-
-    for booking in existing_bookings:
-        booking_start = datetime.datetime.strptime(booking["start_date"], "%Y-%m-%d").date()
-        booking_end = datetime.datetime.strptime(booking["end_date"], "%Y-%m-%d").date()
-
-        # Kiểm tra xem khoảng thời gian mới có trùng với booking hiện có hay không
-        if start_date <= booking_end and end_date >= booking_start:
-            return False  # Xe không khả dụng
-
-    return True  # Xe khả dụng
+    return find_conflicting_booking(vehicle_id, start_date, end_date) is None
 
 # Hàm xử lý thanh toán giả lập (Mock Payment)
 def process_mock_payment(user, total_amount, booking_id):
@@ -52,7 +49,7 @@ def process_mock_payment(user, total_amount, booking_id):
                 # Cập nhật trạng thái xe khi đã thanh toán
                 booking = db.bookings.find_one({"_id": booking_id})
                 if booking:
-                    db.vehicles.update_one({"_id": booking["vehicle_id"]}, {"$set": {"status": "rented"}})
+                    update_vehicle_status(booking["vehicle_id"], "rented")
 
                 time.sleep(2)
                 # Ẩn form thanh toán sau khi thanh toán thành công
@@ -70,11 +67,32 @@ def bookings(user):
     list_user_bookings(user)  # Hiển thị danh sách xe đã thuê
     create_booking(user)  # Tạo đơn đặt xe mới
 
-def _get_vehicle_details(selected_vehicle):
-    """Lấy thông tin chi tiết của xe được chọn."""
-    vehicles_list = list(db.vehicles.find())
-    vehicle = next((v for v in vehicles_list if f"{v['brand']} {v['model']} - Biển số: {v['license_plate']} - Giá: {v['price_per_day']} USD/ngày - Năm: {v['year']} - Yêu cầu hạng bằng lái: {v['required_license_type']}" == selected_vehicle), None)
-    return vehicle
+def _get_vehicle_details(vehicle_id):
+    """Lấy thông tin của xe được chọn từ danh mục xe dùng chung."""
+    return get_vehicle_catalog().get(vehicle_id)
+
+def _current_price_per_day(vehicle_id):
+    """Giá thuê hiện tại của xe đọc thẳng từ MongoDB khi lưu đơn (danh mục xe dùng chung có thể chưa kịp làm mới), hoặc None."""
+    vehicle = db.vehicles.find_one({"_id": vehicle_id}, {"price_per_day": 1})
+    return vehicle.get("price_per_day") if vehicle else None
+
+def _update_booking_keeping_slots(vehicle_id, booking_id, previous_days, changes):
+    """
+    Cập nhật đơn sau khi đã đổi khoảng giữ xe. Nếu không cập nhật được (không có đơn hoặc lỗi),
+    các ngày giữ được trả về như trước (previous_days) để không giữ xe cho một đơn không đổi.
+    """
+    try:
+        updated = update_booking(booking_id, changes)
+    except Exception:
+        restore_slots(vehicle_id, booking_id, previous_days)
+        raise
+    if updated is None:
+        restore_slots(vehicle_id, booking_id, previous_days)
+    return updated
+
+def _format_vehicle_option(vehicle):
+    """Chuỗi hiển thị của một xe trong ô chọn xe."""
+    return f"{vehicle['brand']} {vehicle['model']} - Biển số: {vehicle['license_plate']} - Giá: {vehicle['price_per_day']} USD/ngày - Năm: {vehicle['year']} - Yêu cầu hạng bằng lái: {vehicle['required_license_type']}"
 
 def _calculate_total_price(start_date, end_date, price_per_day):
     """Tính tổng giá tiền thuê xe."""
@@ -82,19 +100,21 @@ def _calculate_total_price(start_date, end_date, price_per_day):
     total_price = total_days * price_per_day
     return total_price
 
-def _save_booking_to_db(user, vehicle_id, start_date, end_date, total_price):
+def _save_booking_to_db(user, vehicle_id, start_date, end_date, total_price, booking_id=None):
     """Lưu thông tin booking vào MongoDB."""
     booking_data = {
+        "_id": booking_id or ObjectId(),
         "user_id": user["_id"],
         "vehicle_id": vehicle_id,
-        "start_date": start_date.isoformat(),
-        "end_date": end_date.isoformat(),
+        "start_date": to_db_date(start_date),
+        "end_date": to_db_date(end_date),
         "total_price": total_price,
         "payment_status": "pending",
         "status": "pending",
         "created_at": datetime.datetime.now()
     }
     booking_id = db.bookings.insert_one(booking_data).inserted_id
+    record_booking_change(None, booking_data)
     return booking_id
 
 # Define a mapping of license types to numerical values for comparison
@@ -114,21 +134,38 @@ def create_booking(user):
     st.header("Đặt Xe")
     # Lấy danh sách xe từ db, xử lý lỗi nếu không kết nối được mongodb
     try:
-        vehicles_list = list(db.vehicles.find())
+        catalog = get_vehicle_catalog()
+        vehicles_list = catalog.all()
+        if vehicles_list is None:
+            # Danh mục quá lớn để hiện hết: chỉ tải các xe khớp từ khóa, tối đa VEHICLE_OPTION_LIMIT xe
+            search_term = st.text_input("Tìm xe (biển số, hãng hoặc mẫu xe)")
+            vehicles_list = catalog.search(search_term)
+            if len(vehicles_list) >= VEHICLE_OPTION_LIMIT:
+                st.caption(f"Chỉ hiển thị {VEHICLE_OPTION_LIMIT} xe đầu tiên, hãy nhập từ khóa để thu hẹp danh sách.")
     except Exception as e:
         st.error("Không thể kết nối tới cơ sở dữ liệu. Vui lòng thử lại sau!")
         logger.error(f"Lỗi khi kết nối tới cơ sở dữ liệu: {e}")
         return
     
-    vehicles = [
-        f"{vehicle['brand']} {vehicle['model']} - Biển số: {vehicle['license_plate']} - Giá: {vehicle['price_per_day']} USD/ngày - Năm: {vehicle['year']} - Yêu cầu hạng bằng lái: {vehicle['required_license_type']}"
-        for vehicle in vehicles_list
-    ]
+    # Chọn ngày trước để danh sách xe chỉ gồm các xe còn trống trong khoảng này
+    start_date = st.date_input("Ngày Bắt Đầu", datetime.date.today())
+    end_date = st.date_input("Ngày Kết Thúc", datetime.date.today())
+
+    if start_date <= end_date:
+        availability = get_fleet_availability(start_date, end_date, [v["_id"] for v in vehicles_list])
+        free_vehicle_ids = set(availability["free_vehicle_ids"])
+        hidden_count = len(vehicles_list) - len(free_vehicle_ids)
+        vehicles_list = [v for v in vehicles_list if v["_id"] in free_vehicle_ids]
+        if hidden_count:
+            st.caption(f"Đã ẩn {hidden_count} xe đã được đặt trong khoảng thời gian này.")
+        if not vehicles_list:
+            st.info("Không còn xe trống trong khoảng thời gian này. Vui lòng chọn thời gian khác.")
+
+    # Ô chọn xe lưu _id của xe, chuỗi hiển thị chỉ dùng cho giao diện
+    vehicle_labels = {vehicle["_id"]: _format_vehicle_option(vehicle) for vehicle in vehicles_list}
 
     with st.form(key="booking_form"):
-        selected_vehicle = st.selectbox("Chọn Xe", vehicles)
-        start_date = st.date_input("Ngày Bắt Đầu", datetime.date.today())
-        end_date = st.date_input("Ngày Kết Thúc", datetime.date.today())
+        selected_vehicle_id = st.selectbox("Chọn Xe", list(vehicle_labels), format_func=vehicle_labels.get)
         submit_booking = st.form_submit_button("Xác Nhận Đặt")
 
     if submit_booking:
@@ -136,7 +173,7 @@ def create_booking(user):
             st.error("Ngày kết thúc không được trước ngày bắt đầu.")
             return
 
-        vehicle = _get_vehicle_details(selected_vehicle)
+        vehicle = _get_vehicle_details(selected_vehicle_id)
         if not vehicle:
             st.error("Không tìm thấy xe đã chọn. Vui lòng thử lại.")
             return
@@ -150,16 +187,31 @@ def create_booking(user):
                 st.error("Hạng bằng lái của bạn không đủ điều kiện để thuê xe này.")
                 return
 
-        if not check_vehicle_availability(vehicle["_id"], start_date, end_date):
-            st.error("Xe đã được thuê trong khoảng thời gian này. Vui lòng chọn xe hoặc thời gian khác.")
+        # Giữ các ngày thuê trước khi lưu đơn để hai khách đặt cùng lúc không thể trùng lịch
+        booking_id = ObjectId()
+        conflict = reserve_slots(vehicle["_id"], booking_id, start_date, end_date)
+        if conflict:
+            st.error(f"Xe đã được thuê từ {from_db_date(conflict['start_date'])} đến {from_db_date(conflict['end_date'])}. Vui lòng chọn xe hoặc thời gian khác.")
             return
 
-        total_price = _calculate_total_price(start_date, end_date, vehicle["price_per_day"])
+        price_per_day = _current_price_per_day(vehicle["_id"])
+        if price_per_day is None:
+            release_slots(booking_id)
+            st.error("Không tìm thấy xe đã chọn. Vui lòng thử lại.")
+            return
+        total_price = _calculate_total_price(start_date, end_date, price_per_day)
         st.write(f"Tổng giá tiền: {total_price} USD")
 
         # Lưu thông tin booking vào MongoDB
-        booking_id = _save_booking_to_db(user, vehicle["_id"], start_date, end_date, total_price)
+        try:
+            _save_booking_to_db(user, vehicle["_id"], start_date, end_date, total_price, booking_id=booking_id)
+        except Exception:
+            release_slots(booking_id)
+            raise
         st.success("Đặt xe thành công! Đang ở trạng thái chờ, hãy tiến hành thanh toán!")
+        image_path = thumbnail_path(vehicle.get("image"))
+        if image_path:
+            st.image(image_path)
 
         # Lưu booking_id vào session_state dưới dạng ObjectId
         st.session_state['current_booking_id'] = booking_id
@@ -180,134 +232,317 @@ def create_booking(user):
 # Hàm cập nhật trạng thái thanh toán
 def update_payment_status(booking_id, status):
     logger.info(f"Cập nhật trạng thái thanh toán cho booking_id: {booking_id} thành {status}")
-    result = db.bookings.update_one({"_id": booking_id}, {"$set": {"payment_status": status}})
-    if result.modified_count == 1:
+    if update_booking(booking_id, {"payment_status": status}) is not None:
         logger.info(f"Cập nhật thành công.")
     else:
         logger.warning(f"Không tìm thấy đơn đặt xe với booking_id này.")
 
+# Số đơn đã kết thúc hiển thị trên mỗi trang lịch sử
+BOOKING_HISTORY_PAGE_SIZE = 10
+
+# Các trường cần hiển thị của đơn và xe trong danh sách xe đã thuê
+USER_BOOKING_PROJECTION = {
+    "vehicle_id": 1,
+    "start_date": 1,
+    "end_date": 1,
+    "total_price": 1,
+    "status": 1,
+    "payment_status": 1,
+    "vehicle._id": 1,
+    "vehicle.brand": 1,
+    "vehicle.model": 1,
+    "vehicle.license_plate": 1,
+    "vehicle.price_per_day": 1,
+    "vehicle.image": 1
+}
+
+def fetch_user_bookings(user_id, active, after_id=None, limit=None):
+    """
+    Lấy đơn đặt xe của khách hàng kèm thông tin xe bằng một truy vấn aggregate.
+    active=True lấy các đơn còn hiệu lực, ngược lại lấy lịch sử (đã hủy/hoàn thành).
+    Phân trang theo _id giảm dần: after_id là _id của đơn cuối cùng ở trang trước.
+    """
+    match = {
+        "user_id": user_id,
+        "status": {"$nin": INACTIVE_BOOKING_STATUSES} if active else {"$in": INACTIVE_BOOKING_STATUSES}
+    }
+    if after_id is not None:
+        match["_id"] = {"$lt": after_id}
+
+    pipeline = [{"$match": match}, {"$sort": {"_id": -1}}]
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline += [
+        {"$lookup": {
+            "from": "vehicles",
+            "localField": "vehicle_id",
+            "foreignField": "_id",
+            "as": "vehicle"
+        }},
+        {"$unwind": {"path": "$vehicle", "preserveNullAndEmptyArrays": True}},
+        {"$project": USER_BOOKING_PROJECTION}
+    ]
+    return list(db.bookings.aggregate(pipeline))
+
 # Hàm hiển thị danh sách xe đã thuê
 def list_user_bookings(user):
     st.subheader("Các xe đã thuê")
-    bookings = db.bookings.find({"user_id": user["_id"]})
-    if not bookings:
+
+    # Con trỏ phân trang của lịch sử thuê xe: mỗi phần tử là _id cuối của trang trước đó
+    cursor_key = f"booking_history_cursors_{user['_id']}"
+    if cursor_key not in st.session_state:
+        st.session_state[cursor_key] = [None]
+    cursors = st.session_state[cursor_key]
+
+    try:
+        active_bookings = fetch_user_bookings(user["_id"], active=True)
+        history = fetch_user_bookings(user["_id"], active=False, after_id=cursors[-1], limit=BOOKING_HISTORY_PAGE_SIZE + 1)
+    except Exception as e:
+        st.error("Không thể tải danh sách đơn đặt xe. Vui lòng thử lại sau!")
+        logger.error(f"Lỗi khi tải danh sách đơn đặt xe: {e}")
+        return
+
+    has_next_page = len(history) > BOOKING_HISTORY_PAGE_SIZE
+    history = history[:BOOKING_HISTORY_PAGE_SIZE]
+
+    if not active_bookings and not history and len(cursors) == 1:
         st.write("Bạn chưa thuê xe nào.")
-    else:
-        for booking in bookings:
-            try:
-                vehicle = db.vehicles.find_one({"_id": booking["vehicle_id"]})
-                if vehicle:
-                    # Tạo các cột để hiển thị thông tin và nút
-                    col1, col2, col3, col4, col5 = st.columns([3, 1.5, 1.5, 1, 1]) # Chia thành 5 cột
-
-                    with col1:
-                        st.write(f"Xe: {vehicle['brand']} {vehicle['model']} - Biển số: {vehicle['license_plate']} -  Từ: {booking['start_date']} đến {booking['end_date']} - Trạng thái đơn hàng: {booking['status']} - Trạng thái thanh toán: {booking['payment_status']}")
-                    
-                    # Khởi tạo giá trị của st.session_state nếu chưa có
-                    if f"extend_{booking['_id']}_active" not in st.session_state:
-                        st.session_state[f"extend_{booking['_id']}_active"] = False
-                    if f"cancel_{booking['_id']}_active" not in st.session_state:
-                        st.session_state[f"cancel_{booking['_id']}_active"] = False
-                    
-                    with col2:
-                        if is_booking_expired(booking) or booking["status"] in ["cancelled", "completed"]:
-                            if st.button(f"Thuê lại", key=f"rent_again_{booking['_id']}"):
-                                st.session_state[f"extend_{booking['_id']}_active"] = False  # Reset trạng thái gia hạn
-                                st.session_state[f"rent_again_{booking['_id']}_active"] = True
-                                st.rerun()
-                        else:
-                            if st.button(f"Gia hạn", key=f"extend_{booking['_id']}"):
-                                st.session_state[f"rent_again_{booking['_id']}_active"] = False # Reset trạng thái thuê lại
-                                st.session_state[f"extend_{booking['_id']}_active"] = True
-                                st.rerun()
+        return
 
-                    with col3:
-                        # Nút hủy đơn hàng
-                        # Chỉ hiển thị nếu đơn hàng ở trạng thái 'pending'
-                        if booking["status"] == "pending":
-                            if st.button(f"Hủy đơn", key=f"cancel_{booking['_id']}"):
-                                # Cập nhật trạng thái đơn hàng thành "cancelled"
-                                db.bookings.update_one({"_id": booking["_id"]}, {"$set": {"status": "cancelled"}})
-                                # Cập nhật lại trạng thái của xe
-                                db.vehicles.update_one({"_id": vehicle["_id"]}, {"$set": {"status": "available"}})
-                                st.success(f"Đơn hàng {booking['_id']} đã được hủy.")
-                                st.rerun()
+    # Đơn còn hiệu lực luôn hiển thị trước lịch sử
+    for booking in active_bookings:
+        _render_user_booking(user, booking)
+
+    if history:
+        st.markdown("**Lịch sử thuê xe**")
+        for booking in history:
+            _render_user_booking(user, booking)
+
+    col_prev, col_next = st.columns(2)
+    with col_prev:
+        if len(cursors) > 1 and st.button("Trang trước", key="booking_history_prev"):
+            cursors.pop()
+            st.rerun()
+    with col_next:
+        if has_next_page and st.button("Trang sau", key="booking_history_next"):
+            cursors.append(history[-1]["_id"])
+            st.rerun()
+
+    # Hiển thị thông tin chi tiết đơn hàng (nếu có)
+    if 'booking_details' in st.session_state and st.session_state.get('show_details', False) == True:
+        st.subheader("Thông Tin Chi Tiết Đơn Hàng")
+        for key, value in st.session_state['booking_details'].items():
+            st.write(f"**{key}:** {value}")
+        if st.button("Đóng"):
+            del st.session_state['booking_details']
+            st.session_state['show_details'] = False
+            st.rerun()
 
-                    with col4:
-                        # Nút xem chi tiết
-                        if st.button("Chi tiết", key=f"detail_{booking['_id']}"):
-                            # Lưu thông tin chi tiết đơn hàng vào session_state
-                            st.session_state['booking_details'] = {
-                                "ID Đơn": str(booking["_id"]),
-                                "Khách Hàng": user['full_name'],
-                                "Email": user["email"],
-                                "Xe": f"{vehicle['brand']} {vehicle['model']} - Biển số: {vehicle['license_plate']}",
-                                "Thời Gian Thuê": f"Từ {booking['start_date']} đến {booking['end_date']}",
-                                "Số Ngày Thuê": str((datetime.datetime.strptime(booking['end_date'], "%Y-%m-%d").date() - datetime.datetime.strptime(booking['start_date'], "%Y-%m-%d").date()).days + 1),
-                                "Tổng Giá (USD)": f"{booking['total_price']} USD",
-                                "Trạng Thái Thanh Toán": booking["payment_status"],
-                                "Trạng Thái Đơn Hàng": booking["status"]
-                            }
-                            st.session_state['show_details'] = True
-                            st.rerun()
-                    
-                    # Hiển thị thông tin chi tiết đơn hàng (nếu có)
-                    if 'booking_details' in st.session_state and st.session_state.get('show_details', False) == True:
-                        st.subheader("Thông Tin Chi Tiết Đơn Hàng")
-                        for key, value in st.session_state['booking_details'].items():
-                            st.write(f"**{key}:** {value}")
-                        if st.button("Đóng"):
-                            del st.session_state['booking_details']
-                            st.session_state['show_details'] = False
-                            st.rerun()
-
-                    if st.session_state.get(f"rent_again_{booking['_id']}_active", False):
-                        create_booking(user)
-                        # st.session_state[f"rent_again_{booking['_id']}_active"] = False
-
-                    if st.session_state.get(f"extend_{booking['_id']}_active", False):
-                        new_end_date = st.date_input("Chọn ngày gia hạn", key=f"date_{booking['_id']}")
-                        if new_end_date > datetime.datetime.strptime(booking["end_date"], "%Y-%m-%d").date():
-                            if st.button("Xác nhận gia hạn", key=f"confirm_{booking['_id']}"):
-                                # Tính toán số ngày mới gia hạn
-                                old_end_date = datetime.datetime.strptime(booking["end_date"], "%Y-%m-%d").date()
-                                days_extended = (new_end_date - old_end_date).days
-                                total_price = days_extended * vehicle['price_per_day']
-
-                                # Cập nhật ngày kết thúc và tổng giá mới
-                                result = db.bookings.update_one(
-                                    {"_id": booking["_id"]},
-                                    {"$set": {
-                                        "end_date": new_end_date.isoformat(),
-                                        "total_price": booking['total_price'] + total_price,
-                                        "payment_status": "pending",  # Cập nhật lại trạng thái thanh toán
-                                        "status": "pending"  # Cập nhật lại trạng thái đơn hàng
-                                    }}
-                                )
-
-                                if result.modified_count == 1:
-                                    st.success(f"Đã gia hạn đơn hàng đến ngày {new_end_date.isoformat()}. Vui lòng thanh toán {total_price} USD.")
-                                    # Xử lý thanh toán cho gia hạn
-                                    st.session_state['current_booking_id'] = booking["_id"]
-                                    payment_method = st.radio("Chọn phương thức thanh toán", ["Thanh Toán Giả Lập"])
-                                    if payment_method == "Thanh Toán Giả Lập":
-                                        process_mock_payment(user, total_price, booking["_id"])
-                                    # Cập nhật lại trạng thái sau khi xử lý thanh toán
-                                    st.session_state[f"extend_{booking['_id']}_active"] = False
-                                    st.rerun()
-                                else:
-                                    st.error("Có lỗi xảy ra khi gia hạn đơn hàng.")
+def _render_user_booking(user, booking):
+    """Hiển thị một đơn đặt xe cùng các nút thao tác."""
+    try:
+        vehicle = booking.get("vehicle")
+        if vehicle:
+            # Tạo các cột để hiển thị thông tin và nút
+            col1, col2, col3, col4, col5 = st.columns([3, 1.5, 1.5, 1, 1]) # Chia thành 5 cột
+
+            with col1:
+                image_path = thumbnail_path(vehicle.get("image"))
+                if image_path:
+                    st.image(image_path)
+                st.write(f"Xe: {vehicle['brand']} {vehicle['model']} - Biển số: {vehicle['license_plate']} -  Từ: {from_db_date(booking['start_date'])} đến {from_db_date(booking['end_date'])} - Trạng thái đơn hàng: {booking['status']} - Trạng thái thanh toán: {booking['payment_status']}")
+
+            # Khởi tạo giá trị của st.session_state nếu chưa có
+            if f"extend_{booking['_id']}_active" not in st.session_state:
+                st.session_state[f"extend_{booking['_id']}_active"] = False
+            if f"cancel_{booking['_id']}_active" not in st.session_state:
+                st.session_state[f"cancel_{booking['_id']}_active"] = False
+
+            with col2:
+                if is_booking_expired(booking) or booking["status"] in ["cancelled", "completed"]:
+                    if st.button(f"Thuê lại", key=f"rent_again_{booking['_id']}"):
+                        st.session_state[f"extend_{booking['_id']}_active"] = False  # Reset trạng thái gia hạn
+                        st.session_state[f"rent_again_{booking['_id']}_active"] = True
+                        st.rerun()
+                else:
+                    if st.button(f"Gia hạn", key=f"extend_{booking['_id']}"):
+                        st.session_state[f"rent_again_{booking['_id']}_active"] = False # Reset trạng thái thuê lại
+                        st.session_state[f"extend_{booking['_id']}_active"] = True
+                        st.rerun()
+
+            with col3:
+                # Nút hủy đơn hàng
+                # Chỉ hiển thị nếu đơn hàng ở trạng thái 'pending'
+                if booking["status"] == "pending":
+                    if st.button(f"Hủy đơn", key=f"cancel_{booking['_id']}"):
+                        # Cập nhật trạng thái đơn hàng thành "cancelled"
+                        update_booking_status(booking["_id"], "cancelled")
+                        release_slots(booking["_id"])
+                        # Cập nhật lại trạng thái của xe
+                        update_vehicle_status(vehicle["_id"], "available")
+                        st.success(f"Đơn hàng {booking['_id']} đã được hủy.")
+                        st.rerun()
+
+            with col4:
+                # Nút xem chi tiết
+                if st.button("Chi tiết", key=f"detail_{booking['_id']}"):
+                    # Lưu thông tin chi tiết đơn hàng vào session_state
+                    st.session_state['booking_details'] = {
+                        "ID Đơn": str(booking["_id"]),
+                        "Khách Hàng": user['full_name'],
+                        "Email": user["email"],
+                        "Xe": f"{vehicle['brand']} {vehicle['model']} - Biển số: {vehicle['license_plate']}",
+                        "Thời Gian Thuê": f"Từ {from_db_date(booking['start_date'])} đến {from_db_date(booking['end_date'])}",
+                        "Số Ngày Thuê": str((from_db_date(booking['end_date']) - from_db_date(booking['start_date'])).days + 1),
+                        "Tổng Giá (USD)": f"{booking['total_price']} USD",
+                        "Trạng Thái Thanh Toán": booking["payment_status"],
+                        "Trạng Thái Đơn Hàng": booking["status"]
+                    }
+                    st.session_state['show_details'] = True
+                    st.rerun()
+
+            if st.session_state.get(f"rent_again_{booking['_id']}_active", False):
+                create_booking(user)
+                # st.session_state[f"rent_again_{booking['_id']}_active"] = False
+
+            if st.session_state.get(f"extend_{booking['_id']}_active", False):
+                new_end_date = st.date_input("Chọn ngày gia hạn", key=f"date_{booking['_id']}")
+                if new_end_date > from_db_date(booking["end_date"]):
+                    if st.button("Xác nhận gia hạn", key=f"confirm_{booking['_id']}"):
+                        # Tính toán số ngày mới gia hạn
+                        old_end_date = from_db_date(booking["end_date"])
+                        days_extended = (new_end_date - old_end_date).days
+                        total_price = days_extended * vehicle['price_per_day']
+
+                        # Giữ thêm các ngày gia hạn trước khi cập nhật đơn
+                        booking_start_date = from_db_date(booking["start_date"])
+                        previous_days = held_slot_days(booking["_id"])
+                        conflict = resize_slots(booking["vehicle_id"], booking["_id"], booking_start_date, new_end_date)
+                        if conflict:
+                            st.error(f"Không thể gia hạn: xe đã được đặt từ {from_db_date(conflict['start_date'])} đến {from_db_date(conflict['end_date'])}.")
                         else:
-                            st.error("Ngày kết thúc mới phải sau ngày kết thúc hiện tại.")
+                            # Cập nhật ngày kết thúc và tổng giá mới
+                            updated = _update_booking_keeping_slots(booking["vehicle_id"], booking["_id"], previous_days, {
+                                "end_date": to_db_date(new_end_date),
+                                "total_price": booking['total_price'] + total_price,
+                                "payment_status": "pending",  # Cập nhật lại trạng thái thanh toán
+                                "status": "pending"  # Cập nhật lại trạng thái đơn hàng
+                            })
+
+                            if updated is not None:
+                                st.success(f"Đã gia hạn đơn hàng đến ngày {new_end_date.isoformat()}. Vui lòng thanh toán {total_price} USD.")
+                                # Xử lý thanh toán cho gia hạn
+                                st.session_state['current_booking_id'] = booking["_id"]
+                                payment_method = st.radio("Chọn phương thức thanh toán", ["Thanh Toán Giả Lập"])
+                                if payment_method == "Thanh Toán Giả Lập":
+                                    process_mock_payment(user, total_price, booking["_id"])
+                                # Cập nhật lại trạng thái sau khi xử lý thanh toán
+                                st.session_state[f"extend_{booking['_id']}_active"] = False
+                                st.rerun()
+                            else:
+                                st.error("Có lỗi xảy ra khi gia hạn đơn hàng.")
                 else:
-                    st.error("Không tìm thấy thông tin xe.")
-            except Exception as e:
-                st.error(f"Lỗi: {e}")
-                logger.error(f"Lỗi: {e}")
+                    st.error("Ngày kết thúc mới phải sau ngày kết thúc hiện tại.")
+        else:
+            st.error("Không tìm thấy thông tin xe.")
+    except Exception as e:
+        st.error(f"Lỗi: {e}")
+        logger.error(f"Lỗi: {e}")
 
 # Hàm kiểm tra nếu đơn đặt xe đã hết hạn
 def is_booking_expired(booking):
-    return datetime.datetime.strptime(booking["end_date"], "%Y-%m-%d").date() < datetime.date.today()
+    return from_db_date(booking["end_date"]) < datetime.date.today()
+
+def _matching_ids(collection, query, limit):
+    """_id của tối đa limit document khớp query, và True nếu còn document khớp bị bỏ qua."""
+    ids = [document["_id"] for document in db[collection].find(query, {"_id": 1}).limit(limit + 1)]
+    if len(ids) > limit:
+        logger.warning(f"Từ khóa tìm đơn đặt xe khớp hơn {limit} document của {collection}, chỉ dùng {limit} document đầu tiên.")
+        return ids[:limit], True
+    return ids, False
+
+def build_booking_search_filter(search_term, match_limit=BOOKING_SEARCH_MATCH_LIMIT):
+    """
+    Chuyển từ khóa tìm kiếm thành điều kiện lọc trên bookings.
+    Từ khóa được so khớp trên users/vehicles (nhỏ hơn nhiều so với bookings) để lấy danh sách _id,
+    sau đó bookings được lọc qua index user_id / vehicle_id / payment_status.
+    Tên, email, biển số, thương hiệu và mẫu xe được so theo tiền tố (không phân biệt hoa thường) trên
+    trường search_keys có index; mỗi collection chỉ lấy tối đa match_limit kết quả.
+    Trạng thái thanh toán chỉ khớp khi từ khóa đúng bằng một trạng thái.
+    Trả về (điều kiện lọc, True nếu danh sách khách hàng/xe khớp bị cắt bớt).
+    """
+    search_term = normalize_search_term(search_term)
+    if not search_term:
+        return {}, False
+
+    prefix = {"search_keys": {"$regex": f"^{re.escape(search_term)}"}}
+    user_ids, users_truncated = _matching_ids("users", prefix, match_limit)
+    vehicle_ids, vehicles_truncated = _matching_ids("vehicles", prefix, match_limit)
+    conditions = [{"user_id": {"$in": user_ids}}, {"vehicle_id": {"$in": vehicle_ids}}]
+    if search_term in PAYMENT_STATUSES:
+        conditions.append({"payment_status": search_term})
+    return {"$or": conditions}, users_truncated or vehicles_truncated
+
+def search_bookings(search_filter, after_id=None, limit=ADMIN_PAGE_SIZE):
+    """
+    Tìm đơn đặt xe khớp search_filter (kết quả của build_booking_search_filter).
+    Phân trang theo _id giảm dần: after_id là _id của đơn cuối cùng ở trang trước.
+    Trả về (danh sách đơn của trang, tổng số đơn khớp) từ một truy vấn aggregate.
+    """
+    page_stages = []
+    if after_id is not None:
+        page_stages.append({"$match": {"_id": {"$lt": after_id}}})
+    page_stages += [
+        {"$sort": {"_id": -1}},
+        {"$limit": limit},
+        # Chỉ nối thông tin khách hàng và xe cho các đơn trên trang hiện tại
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "_id", "as": "customer"}},
+        {"$unwind": {"path": "$customer", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {"from": "vehicles", "localField": "vehicle_id", "foreignField": "_id", "as": "vehicle"}},
+        {"$unwind": {"path": "$vehicle", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "user_id": 1,
+            "vehicle_id": 1,
+            "start_date": 1,
+            "end_date": 1,
+            "total_price": 1,
+            "status": 1,
+            "payment_status": 1,
+            "customer.full_name": 1,
+            "customer.email": 1,
+            "vehicle.brand": 1,
+            "vehicle.model": 1,
+            "vehicle.license_plate": 1
+        }}
+    ]
+    pipeline = [
+        {"$match": search_filter},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "items": page_stages
+        }}
+    ]
+    result = next(db.bookings.aggregate(pipeline), {"total": [], "items": []})
+    total = result["total"][0]["count"] if result["total"] else 0
+    return result["items"], total
+
+def _booking_table_row(booking):
+    """Chuyển một đơn đặt xe (đã nối khách hàng và xe) thành một dòng của bảng quản lý."""
+    vehicle = booking.get("vehicle", {"brand": "", "model": "", "license_plate": ""})
+    customer = booking.get("customer", {"full_name": "", "email": ""})
+    start_date = from_db_date(booking['start_date'])
+    end_date = from_db_date(booking['end_date'])
+    return {
+        "ID Đơn": str(booking["_id"]),
+        "Khách Hàng": customer["full_name"],
+        "Email": customer["email"],
+        "Xe": f"{vehicle['brand']} {vehicle['model']} - Biển số: {vehicle['license_plate']}",
+        "Thời Gian Thuê": f"Từ {start_date} đến {end_date}",
+        "Số Ngày Thuê": (end_date - start_date).days + 1,
+        "Tổng Giá (USD)": booking['total_price'],
+        "Trạng Thái Thanh Toán": booking["payment_status"],
+        "Trạng Thái Đơn Hàng": booking["status"]
+    }
 
 def manage_bookings():
     st.subheader("Quản Lý Đơn Đặt Xe")
@@ -315,131 +550,69 @@ def manage_bookings():
     # Thêm trường tìm kiếm
     search_term = st.text_input("Tìm kiếm đơn đặt xe (theo tên khách hàng, email, biển số, nhãn hiệu xe, mẫu xe, hoặc trạng thái thanh toán)")
 
-    # Lấy tất cả các booking từ cơ sở dữ liệu
-    bookings = list(db.bookings.find({}))
+    try:
+        search_filter, truncated = build_booking_search_filter(search_term)
+        if truncated:
+            st.warning(f"Từ khóa khớp quá nhiều khách hàng hoặc xe, chỉ hiển thị đơn của {BOOKING_SEARCH_MATCH_LIMIT} kết quả đầu tiên. Hãy nhập từ khóa cụ thể hơn.")
+        selected_booking = paginated_table(
+            "manage_bookings",
+            lambda after_id, limit: search_bookings(search_filter, after_id, limit),
+            _booking_table_row,
+            reset_token=search_term,
+            empty_message="Không tìm thấy đơn đặt xe nào phù hợp." if search_term.strip() else "Hiện tại chưa có đơn đặt xe nào."
+        )
+    except Exception as e:
+        st.error("Không thể tải danh sách đơn đặt xe. Vui lòng thử lại sau!")
+        logger.error(f"Lỗi khi tìm kiếm đơn đặt xe: {e}")
+        return
 
-    # Nếu không có đơn đặt xe
-    if len(bookings) == 0:
-        st.write("Hiện tại chưa có đơn đặt xe nào.")
-    else:
-        # Lọc danh sách bookings dựa trên search_term
-        filtered_bookings = []
-        for booking in bookings:
-            vehicle = db.vehicles.find_one({"_id": booking["vehicle_id"]})
-            customer = db.users.find_one({"_id": booking["user_id"]})
-
-            # Kiểm tra nếu thông tin khớp với search_term
-            if (
-                search_term.lower() in customer["full_name"].lower() or
-                search_term.lower() in customer["email"].lower() or
-                search_term.lower() in vehicle["license_plate"].lower() or
-                search_term.lower() in vehicle["brand"].lower() or
-                search_term.lower() in vehicle["model"].lower() or
-                search_term.lower() in booking["payment_status"].lower()
-            ):
-                filtered_bookings.append(booking)
-
-        # Nếu không có đơn đặt xe khớp với tìm kiếm
-        if len(filtered_bookings) == 0:
-            st.write("Không tìm thấy đơn đặt xe nào phù hợp.")
-            return
+    # Xuất dữ liệu thô của các đơn khớp từ khóa tìm kiếm; file chỉ được tạo khi bấm tải xuống
+    # và được đọc theo từng lô nên không nạp toàn bộ bookings vào bộ nhớ
+    with st.expander("Xuất dữ liệu đơn đặt xe"):
+        export_format = st.radio("Định dạng", EXPORT_FORMATS, horizontal=True, format_func=str.upper, key="booking_export_format")
+        compress = st.checkbox("Nén gzip", value=True, key="booking_export_gzip")
+        st.download_button(
+            label="Tải xuống",
+            data=lambda: export_to_temp_file(export_format, compress, search_filter),
+            file_name=export_file_name(export_format, compress),
+            mime="application/gzip" if compress else ("text/csv" if export_format == "csv" else "application/x-ndjson"),
+            key="booking_export_download"
+        )
 
-        # CSS để làm cho bảng đồng nhất và dễ nhìn hơn
-        st.markdown("""
-        <style>
-        .st-column {border: 1px solid #ddd; padding: 8px;}
-        .st-header {background-color: #333; color: white; font-weight: bold; text-align: center;}
-        </style>
-        """, unsafe_allow_html=True)
-
-        # Tạo cột tiêu đề bằng cách sử dụng st.columns
-        col1, col2, col3, col4, col5, col6, col7, col8, col9, col10 = st.columns([0.8, 1.5, 1.5, 1.5, 1.5, 1, 1.5, 1.5, 1, 1]) # Thêm cột mới
-        col1.markdown('<div class="st-header">ID Đơn</div>', unsafe_allow_html=True)
-        col2.markdown('<div class="st-header">Khách Hàng</div>', unsafe_allow_html=True)
-        col3.markdown('<div class="st-header">Email</div>', unsafe_allow_html=True)
-        col4.markdown('<div class="st-header">Xe</div>', unsafe_allow_html=True)
-        col5.markdown('<div class="st-header">Thời Gian Thuê</div>', unsafe_allow_html=True)
-        col6.markdown('<div class="st-header">Số Ngày Thuê</div>', unsafe_allow_html=True)
-        col7.markdown('<div class="st-header">Tổng Giá (USD)</div>', unsafe_allow_html=True)
-        col8.markdown('<div class="st-header">Trạng Thái Thanh Toán</div>', unsafe_allow_html=True)
-        col9.markdown('<div class="st-header">Trạng thái đơn</div>', unsafe_allow_html=True)
-        col10.markdown('<div class="st-header"></div>', unsafe_allow_html=True)  # Cột cho nút "Chỉnh Sửa"
-
-        # Hiển thị từng dòng dữ liệu trong bảng
-        for index, booking in enumerate(filtered_bookings):
-            vehicle = db.vehicles.find_one({"_id": booking["vehicle_id"]})
-            customer = db.users.find_one({"_id": booking["user_id"]})
-
-            start_date = datetime.datetime.strptime(booking['start_date'], "%Y-%m-%d").date()
-            end_date = datetime.datetime.strptime(booking['end_date'], "%Y-%m-%d").date()
-            total_days = (end_date - start_date).days + 1
-
-            # Tạo các cột cho từng dòng dữ liệu
-            col1, col2, col3, col4, col5, col6, col7, col8, col9, col10 = st.columns([0.8, 1.5, 1.5, 1.5, 1.5, 1, 1.5, 1.5, 1, 1]) # Thêm cột mới
-            col1.write(str(booking["_id"]))
-            col2.write(customer["full_name"])
-            col3.write(customer["email"])
-            col4.write(f"{vehicle['brand']} {vehicle['model']} - Biển số: {vehicle['license_plate']}")
-            col5.write(f"Từ {booking['start_date']} đến {booking['end_date']}")
-            col6.write(str(total_days))
-            col7.write(f"{booking['total_price']} USD")
-            col8.write(booking["payment_status"])
-            col9.write(booking["status"])
-
-            # Nút chỉnh sửa nằm ở cột cuối cùng
-            # Nếu chưa thanh toán, cho phép chỉnh sửa
-            if booking['payment_status'] != 'paid' or booking['status'] != 'completed':
-                if col10.button("Chỉnh Sửa", key=f"edit_{index}"):
-                    st.session_state['editing_booking_id'] = str(booking["_id"])
-            else:
-                # Nếu đã thanh toán và hoàn thành, không hiển thị nút "Chỉnh Sửa"
-                col10.markdown('<div style="text-align: center;">(Đã hoàn thành)</div>', unsafe_allow_html=True)
-            
-            # Nút xem chi tiết đơn hàng
-            if col10.button("Chi tiết", key=f"detail_{index}"):
-                # Lưu thông tin chi tiết đơn hàng vào session_state
-                st.session_state['booking_details'] = {
-                    "ID Đơn": str(booking["_id"]),
-                    "Khách Hàng": customer["full_name"],
-                    "Email": customer["email"],
-                    "Xe": f"{vehicle['brand']} {vehicle['model']} - Biển số: {vehicle['license_plate']}",
-                    "Thời Gian Thuê": f"Từ {booking['start_date']} đến {booking['end_date']}",
-                    "Số Ngày Thuê": str(total_days),
-                    "Tổng Giá (USD)": f"{booking['total_price']} USD",
-                    "Trạng Thái Thanh Toán": booking["payment_status"],
-                    "Trạng Thái Đơn Hàng": booking["status"]
-                }
-
-        # Hiển thị thông tin chi tiết đơn hàng (nếu có)
-        if 'booking_details' in st.session_state:
-            st.subheader("Thông Tin Chi Tiết Đơn Hàng")
-            for key, value in st.session_state['booking_details'].items():
-                st.write(f"**{key}:** {value}")
-            if st.button("Đóng"):
-                del st.session_state['booking_details']
-
-        # Nếu có booking đang được chỉnh sửa, hiển thị form chỉnh sửa
-        editing_booking_id = st.session_state.get('editing_booking_id', None)
-        if editing_booking_id:
-            booking_to_edit = db.bookings.find_one({"_id": ObjectId(editing_booking_id)})
-            if booking_to_edit:
-                edit_booking(booking_to_edit)
-            else:
-                st.error("Không tìm thấy đơn đặt xe để chỉnh sửa.")
-                st.session_state['editing_booking_id'] = None
+    # Hiển thị thông tin chi tiết của đơn được chọn
+    if selected_booking is not None:
+        st.subheader("Thông Tin Chi Tiết Đơn Hàng")
+        for key, value in _booking_table_row(selected_booking).items():
+            st.write(f"**{key}:** {value}")
+
+        # Nếu chưa thanh toán và hoàn thành, cho phép chỉnh sửa
+        if selected_booking['payment_status'] != 'paid' or selected_booking['status'] != 'completed':
+            if st.button("Chỉnh Sửa", key="edit_selected_booking"):
+                st.session_state['editing_booking_id'] = str(selected_booking["_id"])
+        else:
+            st.write("(Đã hoàn thành)")
+
+    # Nếu có booking đang được chỉnh sửa, hiển thị form chỉnh sửa
+    editing_booking_id = st.session_state.get('editing_booking_id', None)
+    if editing_booking_id:
+        booking_to_edit = db.bookings.find_one({"_id": ObjectId(editing_booking_id)})
+        if booking_to_edit:
+            edit_booking(booking_to_edit)
+        else:
+            st.error("Không tìm thấy đơn đặt xe để chỉnh sửa.")
+            st.session_state['editing_booking_id'] = None
 
 # Hàm để chỉnh sửa booking
 def edit_booking(booking):
     st.subheader("Chỉnh Sửa Đơn Đặt Xe")
     # Lấy thông tin cần thiết
-    vehicle = db.vehicles.find_one({"_id": booking["vehicle_id"]})
     customer = db.users.find_one({"_id": booking["user_id"]})
 
     # Hiển thị thông tin hiện tại và cho phép chỉnh sửa
     with st.form(key=f"edit_form_{booking['_id']}"):
-        start_date = st.date_input("Ngày Bắt Đầu", datetime.datetime.strptime(booking['start_date'], "%Y-%m-%d").date())
-        end_date = st.date_input("Ngày Kết Thúc", datetime.datetime.strptime(booking['end_date'], "%Y-%m-%d").date())
-        payment_status = st.selectbox("Trạng Thái Thanh Toán", ["pending", "paid", "failed", "refunded"], index=["pending", "paid", "failed", "refunded"].index(booking["payment_status"]))
+        start_date = st.date_input("Ngày Bắt Đầu", from_db_date(booking['start_date']))
+        end_date = st.date_input("Ngày Kết Thúc", from_db_date(booking['end_date']))
+        payment_status = st.selectbox("Trạng Thái Thanh Toán", PAYMENT_STATUSES, index=PAYMENT_STATUSES.index(booking["payment_status"]))
         booking_status = st.selectbox("Trạng Thái Đơn Hàng", ["pending", "confirmed", "cancelled", "completed"], index=["pending", "confirmed", "cancelled", "completed"].index(booking["status"]))
         submit_button = st.form_submit_button(label="Cập Nhật")
 
@@ -448,32 +621,38 @@ def edit_booking(booking):
             st.error("Ngày kết thúc không được trước ngày bắt đầu.")
             return
 
-        # Tính toán lại số ngày thuê và tổng giá
-        total_days = (end_date - start_date).days + 1
-        total_price = total_days * vehicle["price_per_day"]
-
-        # Chuyển đổi start_date và end_date thành chuỗi ISO
-        start_date_iso = start_date.isoformat()
-        end_date_iso = end_date.isoformat()
+        # Tính toán lại số ngày thuê và tổng giá theo giá hiện tại của xe
+        price_per_day = _current_price_per_day(booking["vehicle_id"])
+        if price_per_day is None:
+            st.error("Không tìm thấy xe của đơn đặt này.")
+            return
+        total_price = _calculate_total_price(start_date, end_date, price_per_day)
 
         # Đảm bảo booking["_id"] là ObjectId
         booking_id = booking["_id"]
         if not isinstance(booking_id, ObjectId):
             booking_id = ObjectId(booking_id)
 
-        # Cập nhật thông tin booking trong cơ sở dữ liệu
-        result = db.bookings.update_one(
-            {"_id": booking_id},
-            {"$set": {
-                "start_date": start_date_iso,
-                "end_date": end_date_iso,
-                "total_price": total_price,
-                "payment_status": payment_status,
-                "status": booking_status
-            }}
-        )
+        # Đơn đã hủy/hoàn thành thì trả lại các ngày giữ xe, ngược lại giữ theo khoảng ngày mới
+        previous_days = held_slot_days(booking_id)
+        if booking_status in INACTIVE_BOOKING_STATUSES:
+            release_slots(booking_id)
+        else:
+            conflict = resize_slots(booking["vehicle_id"], booking_id, start_date, end_date)
+            if conflict:
+                st.error(f"Xe đã được đặt từ {from_db_date(conflict['start_date'])} đến {from_db_date(conflict['end_date'])}. Vui lòng chọn thời gian khác.")
+                return
 
-        if result.modified_count > 0:
+        # Cập nhật thông tin booking trong cơ sở dữ liệu
+        updated = _update_booking_keeping_slots(booking["vehicle_id"], booking_id, previous_days, {
+            "start_date": to_db_date(start_date),
+            "end_date": to_db_date(end_date),
+            "total_price": total_price,
+            "payment_status": payment_status,
+            "status": booking_status
+        })
+
+        if updated is not None:
             st.success("Cập nhật đơn đặt xe thành công!")
             # Xóa trạng thái chỉnh sửa
             st.session_state['editing_booking_id'] = None
@@ -494,11 +673,15 @@ def check_booking_status(booking_id):
 def update_booking_status(booking_id, status):
     """Cập nhật trạng thái của đơn hàng."""
     result = db.bookings.update_one({"_id": booking_id}, {"$set": {"status": status}})
+    if result.modified_count > 0:
+        record_status_change()
     return result.modified_count > 0
 
 def update_vehicle_status(vehicle_id, status):
     """Cập nhật trạng thái của xe."""
     result = db.vehicles.update_one({"_id": vehicle_id}, {"$set": {"status": status}})
+    if result.modified_count > 0:
+        record_status_change()
     return result.modified_count > 0
 
 def return_vehicle(user):
@@ -510,13 +693,14 @@ def return_vehicle(user):
         return
 
     for booking in active_bookings:
-        vehicle = db.vehicles.find_one({"_id": booking["vehicle_id"]})
+        vehicle = get_vehicle_catalog().get(booking["vehicle_id"])
         if vehicle:
             st.write(f"Xe: {vehicle['brand']} {vehicle['model']} - Biển số: {vehicle['license_plate']}")
             if st.button("Trả Xe", key=f"return_{booking['_id']}"):
                 
                 # Cập nhật trạng thái đơn hàng
                 if update_booking_status(booking["_id"], "completed"):
+                    release_slots(booking["_id"])
                     # Cập nhật trạng thái xe
                     vehicle_id = booking["vehicle_id"]
                     if not isinstance(vehicle_id, ObjectId):
@@ -0,0 +1,143 @@
+from config import db
+import argparse
+import csv
+import datetime
+import io
+import json
+import logging
+import sys
+import tempfile
+import zlib
+from utils import from_db_date
+
+logger = logging.getLogger(__name__)
+
+# Số đơn đọc mỗi lượt từ MongoDB và được nối thông tin khách hàng/xe cùng lúc;
+# bộ nhớ dùng khi xuất chỉ phụ thuộc giá trị này chứ không phụ thuộc số đơn
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = ("csv", "ndjson")
+# Thứ tự cột của file xuất
+EXPORT_COLUMNS = [
+    "booking_id", "created_at", "start_date", "end_date", "total_price", "payment_status", "status",
+    "customer_id", "customer_name", "customer_email", "vehicle_id", "license_plate", "vehicle_brand", "vehicle_model"
+]
+EXPORT_PROJECTION = {
+    "user_id": 1, "vehicle_id": 1, "created_at": 1, "start_date": 1, "end_date": 1,
+    "total_price": 1, "payment_status": 1, "status": 1
+}
+
+def _format_date(value):
+    return from_db_date(value).isoformat() if value else None
+
+def _record(booking, customers, vehicles):
+    customer = customers.get(booking.get("user_id"), {})
+    vehicle = vehicles.get(booking.get("vehicle_id"), {})
+    created_at = booking.get("created_at")
+    return {
+        "booking_id": str(booking["_id"]),
+        "created_at": created_at.isoformat() if isinstance(created_at, datetime.datetime) else created_at,
+        "start_date": _format_date(booking.get("start_date")),
+        "end_date": _format_date(booking.get("end_date")),
+        "total_price": booking.get("total_price"),
+        "payment_status": booking.get("payment_status"),
+        "status": booking.get("status"),
+        "customer_id": str(booking["user_id"]) if booking.get("user_id") is not None else None,
+        "customer_name": customer.get("full_name"),
+        "customer_email": customer.get("email"),
+        "vehicle_id": str(booking["vehicle_id"]) if booking.get("vehicle_id") is not None else None,
+        "license_plate": vehicle.get("license_plate"),
+        "vehicle_brand": vehicle.get("brand"),
+        "vehicle_model": vehicle.get("model"),
+    }
+
+def iter_booking_batches(query=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Đọc bookings theo từng lô (sắp xếp theo _id) và nối khách hàng, xe bằng một truy vấn $in cho mỗi lô.
+    Trả về lần lượt các danh sách bản ghi phẳng.
+    """
+    cursor = db.bookings.find(query or {}, EXPORT_PROJECTION).sort("_id", 1).batch_size(batch_size)
+    batch = []
+    for booking in cursor:
+        batch.append(booking)
+        if len(batch) >= batch_size:
+            yield _join_batch(batch)
+            batch = []
+    if batch:
+        yield _join_batch(batch)
+
+def _join_batch(bookings):
+    user_ids = list({booking.get("user_id") for booking in bookings})
+    vehicle_ids = list({booking.get("vehicle_id") for booking in bookings})
+    customers = {u["_id"]: u for u in db.users.find({"_id": {"$in": user_ids}}, {"full_name": 1, "email": 1})}
+    vehicles = {v["_id"]: v for v in db.vehicles.find({"_id": {"$in": vehicle_ids}}, {"license_plate": 1, "brand": 1, "model": 1})}
+    return [_record(booking, customers, vehicles) for booking in bookings]
+
+def iter_csv(batches):
+    """Các đoạn văn bản CSV (có BOM để Excel đọc đúng tiếng Việt), mỗi lô một đoạn."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    yield "\ufeff" + buffer.getvalue()
+    for records in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(records)
+        yield buffer.getvalue()
+
+def iter_ndjson(batches):
+    """Các đoạn NDJSON, mỗi đơn một dòng JSON."""
+    for records in batches:
+        yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+def iter_gzip(chunks):
+    """Nén gzip một dãy đoạn bytes mà không cần giữ cả file trong bộ nhớ."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_bookings(fmt="csv", compress=False, query=None, batch_size=EXPORT_BATCH_SIZE):
+    """Dãy đoạn bytes của file xuất bookings theo định dạng fmt ("csv" hoặc "ndjson"), có thể nén gzip."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+    batches = iter_booking_batches(query, batch_size)
+    chunks = (text.encode("utf-8") for text in (iter_csv(batches) if fmt == "csv" else iter_ndjson(batches)))
+    return iter_gzip(chunks) if compress else chunks
+
+def export_file_name(fmt, compress):
+    return f"bookings_{datetime.date.today():%Y%m%d}.{fmt}" + (".gz" if compress else "")
+
+def export_to_temp_file(fmt="csv", compress=False, query=None):
+    """Ghi file xuất vào file tạm trên đĩa và trả về file đó (đã về đầu file) để st.download_button đọc."""
+    output = tempfile.TemporaryFile()
+    for chunk in export_bookings(fmt, compress, query):
+        output.write(chunk)
+    output.seek(0)
+    return output
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Xuất dữ liệu đơn đặt xe (kèm khách hàng và xe) ra CSV hoặc NDJSON.")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="Định dạng file")
+    parser.add_argument("--gzip", action="store_true", help="Nén gzip")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, help="Chỉ xuất đơn tạo từ ngày này (YYYY-MM-DD)")
+    parser.add_argument("--end", type=datetime.date.fromisoformat, help="Chỉ xuất đơn tạo tới hết ngày này (YYYY-MM-DD)")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="Số đơn mỗi lượt đọc")
+    parser.add_argument("--output", default="-", help="Đường dẫn file xuất (mặc định: stdout)")
+    args = parser.parse_args()
+
+    created_at = {}
+    if args.start:
+        created_at["$gte"] = datetime.datetime.combine(args.start, datetime.time.min)
+    if args.end:
+        created_at["$lte"] = datetime.datetime.combine(args.end, datetime.time.max)
+    chunks = export_bookings(args.format, args.gzip, {"created_at": created_at} if created_at else None, args.batch_size)
+    if args.output == "-":
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.output, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
@@ -0,0 +1,218 @@
+from config import db, BOOKING_STATS_REPAIR_DAYS
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from collections import Counter
+import argparse
+import datetime
+import logging
+from modules.timeseries import combine_series, time_buckets
+from modules.versions import bump_version
+from utils import to_db_date
+
+logger = logging.getLogger(__name__)
+
+# Mỗi document của booking_daily_stats tổng hợp các đơn tạo trong một ngày, của một xe, với một trạng thái thanh toán:
+# {"day", "vehicle_id", "payment_status", "count", "revenue", "customers": {user_id: số đơn}, "refreshed_at"}
+# Bảng được cập nhật tăng dần mỗi khi đơn thay đổi và được tính lại định kỳ từ bookings để sửa sai lệch.
+ROLLUP_COLLECTION = "booking_daily_stats"
+ROLLUP_KEY_FIELDS = ("day", "vehicle_id", "payment_status")
+# Các trường của đơn có ảnh hưởng tới bảng tổng hợp
+ROLLUP_SOURCE_PROJECTION = {"created_at": 1, "vehicle_id": 1, "payment_status": 1, "total_price": 1, "user_id": 1}
+# Tên bộ đếm phiên bản của số liệu đơn đặt xe, tăng mỗi khi bảng tổng hợp thay đổi
+BOOKING_STATS_VERSION = "booking_stats"
+# Tên bộ đếm phiên bản tăng mỗi khi trạng thái đơn, ngày thuê của đơn hoặc trạng thái xe thay đổi
+FLEET_STATUS_VERSION = "fleet_status"
+# Các trường của đơn mà khi đổi thì phải tăng FLEET_STATUS_VERSION
+FLEET_STATUS_FIELDS = ("status", "start_date", "end_date")
+# Các cột của chuỗi thời gian doanh thu/số đơn và biểu thức $sum tương ứng trên bảng tổng hợp và trên bookings
+SERIES_FIELDS = ("revenue", "count")
+ROLLUP_SERIES_SUMS = {"revenue": "$revenue", "count": "$count"}
+BOOKING_SERIES_SUMS = {"revenue": "$total_price", "count": 1}
+
+def _rollup_key(booking):
+    if not booking.get("created_at"):
+        return None
+    return {"day": to_db_date(booking["created_at"]), "vehicle_id": booking.get("vehicle_id"), "payment_status": booking.get("payment_status")}
+
+def _apply_delta(booking, sign):
+    key = _rollup_key(booking)
+    if key is None:
+        return
+    db[ROLLUP_COLLECTION].update_one(
+        key,
+        {
+            "$inc": {"count": sign, "revenue": sign * booking.get("total_price", 0), f"customers.{booking.get('user_id')}": sign},
+            # Dòng mới tạo sau lần tính lại gần nhất không bị coi là dòng cũ khi dọn dẹp
+            "$setOnInsert": {"refreshed_at": datetime.datetime.now()}
+        },
+        upsert=True
+    )
+
+def record_booking_change(before, after):
+    """
+    Cập nhật bảng tổng hợp theo thay đổi của một đơn: trừ phần của bản cũ (before) rồi cộng phần của bản mới (after).
+    before=None khi tạo đơn. Lỗi chỉ được ghi log vì lần tính lại định kỳ sẽ sửa số liệu.
+    """
+    if before is not None and after is not None and _rollup_key(before) == _rollup_key(after) \
+            and before.get("total_price") == after.get("total_price"):
+        return
+    try:
+        if before is not None:
+            _apply_delta(before, -1)
+        if after is not None:
+            _apply_delta(after, 1)
+        bump_version(BOOKING_STATS_VERSION)
+    except PyMongoError as e:
+        logger.error(f"Không cập nhật được bảng tổng hợp đơn đặt xe: {e}")
+
+def record_status_change():
+    """Gọi sau khi đổi trạng thái đơn, ngày thuê hoặc trạng thái xe. Lỗi chỉ được ghi log."""
+    try:
+        bump_version(FLEET_STATUS_VERSION)
+    except PyMongoError as e:
+        logger.error(f"Không tăng được phiên bản trạng thái đội xe: {e}")
+
+def update_booking(booking_id, changes):
+    """
+    Cập nhật đơn bằng $set và ghi nhận thay đổi vào bảng tổng hợp (và vào FLEET_STATUS_VERSION nếu đổi trạng thái hoặc ngày thuê).
+    Trả về đơn trước khi cập nhật (chỉ gồm các trường tổng hợp), hoặc None nếu không có đơn.
+    """
+    before = db.bookings.find_one_and_update(
+        {"_id": booking_id},
+        {"$set": changes},
+        projection=ROLLUP_SOURCE_PROJECTION,
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is not None:
+        record_booking_change(before, {**before, **changes})
+        if any(field in changes for field in FLEET_STATUS_FIELDS):
+            record_status_change()
+    return before
+
+def _rollup_stages():
+    """Các stage gom đơn thành các dòng tổng hợp, dùng cho cả lần tính lại định kỳ lẫn số liệu của hôm nay."""
+    return [
+        {"$group": {
+            "_id": {
+                "day": {"$dateFromParts": {"year": {"$year": "$created_at"}, "month": {"$month": "$created_at"}, "day": {"$dayOfMonth": "$created_at"}}},
+                "vehicle_id": "$vehicle_id",
+                "payment_status": "$payment_status",
+                "user_id": {"$toString": "$user_id"}
+            },
+            "count": {"$sum": 1},
+            "revenue": {"$sum": "$total_price"}
+        }},
+        {"$group": {
+            "_id": {"day": "$_id.day", "vehicle_id": "$_id.vehicle_id", "payment_status": "$_id.payment_status"},
+            "count": {"$sum": "$count"},
+            "revenue": {"$sum": "$revenue"},
+            "customers": {"$push": {"k": "$_id.user_id", "v": "$count"}}
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "vehicle_id": "$_id.vehicle_id",
+            "payment_status": "$_id.payment_status",
+            "count": 1,
+            "revenue": 1,
+            "customers": {"$arrayToObject": "$customers"}
+        }}
+    ]
+
+def _summary_facet():
+    """$facet tính các số liệu của trang thống kê từ các dòng tổng hợp."""
+    return {"$facet": {
+        "totals": [{"$group": {"_id": None, "count": {"$sum": "$count"}, "revenue": {"$sum": "$revenue"}}}],
+        "payment_status": [{"$group": {"_id": "$payment_status", "count": {"$sum": "$count"}}}],
+        "vehicle_revenue": [{"$group": {"_id": "$vehicle_id", "total_revenue": {"$sum": "$revenue"}}}],
+        "customers": [
+            {"$project": {"customers": {"$objectToArray": "$customers"}}},
+            {"$unwind": "$customers"},
+            {"$match": {"customers.v": {"$gt": 0}}},
+            {"$group": {"_id": "$customers.k"}}
+        ]
+    }}
+
+def refresh_booking_daily_stats(days=BOOKING_STATS_REPAIR_DAYS, today=None):
+    """
+    Tính lại bảng tổng hợp từ bookings cho `days` ngày gần nhất (days=None hoặc bảng còn trống: toàn bộ lịch sử)
+    bằng $merge, rồi xóa các dòng trong khoảng đó không còn đơn nào tương ứng.
+    """
+    today = today or datetime.date.today()
+    if days is not None and db[ROLLUP_COLLECTION].estimated_document_count() == 0:
+        days = None
+    since = None if days is None else to_db_date(today - datetime.timedelta(days=days - 1))
+    refreshed_at = datetime.datetime.now()
+
+    db.bookings.aggregate([
+        {"$match": {"created_at": {"$gte": since}} if since else {"created_at": {"$exists": True}}},
+        *_rollup_stages(),
+        {"$addFields": {"refreshed_at": refreshed_at}},
+        {"$merge": {"into": ROLLUP_COLLECTION, "on": list(ROLLUP_KEY_FIELDS), "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ])
+    stale_filter = {"refreshed_at": {"$lt": refreshed_at}}
+    if since:
+        stale_filter["day"] = {"$gte": since}
+    removed = db[ROLLUP_COLLECTION].delete_many(stale_filter).deleted_count
+    bump_version(BOOKING_STATS_VERSION)
+    logger.info(f"Đã tính lại bảng tổng hợp đơn đặt xe từ {since.date() if since else 'đầu'}, xóa {removed} dòng cũ.")
+    return {"since": since, "removed": removed}
+
+def _combine(parts):
+    total_bookings = revenue = 0
+    payment_status, vehicle_revenue = Counter(), Counter()
+    customers = set()
+    for part in parts:
+        totals = (part.get("totals") or [{}])[0]
+        total_bookings += totals.get("count", 0)
+        revenue += totals.get("revenue", 0)
+        payment_status.update({item["_id"]: item["count"] for item in part.get("payment_status", []) if item["count"] > 0})
+        vehicle_revenue.update({item["_id"]: item["total_revenue"] for item in part.get("vehicle_revenue", [])})
+        customers.update(item["_id"] for item in part.get("customers", []))
+
+    # Đổi mã xe thành biển số; xe đã bị xóa không được hiển thị
+    plates = {vehicle["_id"]: vehicle["license_plate"] for vehicle in db.vehicles.find(
+        {"_id": {"$in": list(vehicle_revenue)}}, {"license_plate": 1}
+    )}
+    return {
+        "total_bookings": total_bookings,
+        "revenue": revenue,
+        "total_customers": len(customers),
+        "payment_status": [{"_id": status, "count": count} for status, count in payment_status.items()],
+        "vehicle_revenue": [
+            {"_id": plates[vehicle_id], "total_revenue": total}
+            for vehicle_id, total in vehicle_revenue.most_common() if vehicle_id in plates
+        ]
+    }
+
+def booking_statistics(start_date, end_date, vehicle_ids=None, today=None, unit="month"):
+    """
+    Số liệu thống kê đơn đặt xe tạo trong khoảng [start_date, end_date] (datetime), có thể lọc theo danh sách xe.
+    Các ngày trước hôm nay đọc từ bảng tổng hợp; riêng hôm nay được tính trực tiếp từ bookings.
+    "series" là chuỗi doanh thu/số đơn đầy đủ theo chu kỳ unit (xem modules.timeseries).
+    """
+    today = today or datetime.date.today()
+    parts, series = [], []
+    rollup_end = min(end_date.date(), today - datetime.timedelta(days=1))
+    if start_date.date() <= rollup_end:
+        rollup_filter = {"day": {"$gte": to_db_date(start_date), "$lte": to_db_date(rollup_end)}, "count": {"$gt": 0}}
+        if vehicle_ids:
+            rollup_filter["vehicle_id"] = {"$in": vehicle_ids}
+        parts.append(next(db[ROLLUP_COLLECTION].aggregate([{"$match": rollup_filter}, _summary_facet()]), {}))
+        series.append(time_buckets(db[ROLLUP_COLLECTION], rollup_filter, "day", start_date, end_date, unit, ROLLUP_SERIES_SUMS))
+    if start_date.date() <= today <= end_date.date():
+        today_filter = {"created_at": {"$gte": max(start_date, to_db_date(today)), "$lte": end_date}}
+        if vehicle_ids:
+            today_filter["vehicle_id"] = {"$in": vehicle_ids}
+        parts.append(next(db.bookings.aggregate([{"$match": today_filter}, *_rollup_stages(), _summary_facet()]), {}))
+        series.append(time_buckets(db.bookings, today_filter, "created_at", start_date, end_date, unit, BOOKING_SERIES_SUMS))
+    result = _combine(parts)
+    result["series"] = combine_series(series, start_date, end_date, unit, SERIES_FIELDS)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tính lại bảng tổng hợp booking_daily_stats từ bookings.")
+    parser.add_argument("--days", type=int, default=BOOKING_STATS_REPAIR_DAYS, help="Số ngày gần nhất cần tính lại")
+    parser.add_argument("--full", action="store_true", help="Tính lại toàn bộ lịch sử")
+    args = parser.parse_args()
+    print(refresh_booking_daily_stats(days=None if args.full else args.days))
@@ -0,0 +1,133 @@
+import streamlit as st
+from config import db, FERNET_KEYS, REENCRYPT_BATCH_SIZE
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from pymongo import UpdateOne
+import argparse
+import itertools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Các trường của users được mã hóa bằng Fernet
+ENCRYPTED_USER_FIELDS = ("password", "2fa_secret")
+
+_reencrypt_thread = None
+_reencrypt_lock = threading.Lock()
+
+class CryptoService:
+    """
+    Mã hóa/giải mã bằng MultiFernet: khóa đầu tiên dùng để mã hóa, mọi khóa đều dùng được để giải mã,
+    nên có thể thêm khóa mới lên đầu danh sách mà dữ liệu cũ vẫn đọc được trong lúc mã hóa lại.
+    """
+
+    def __init__(self, keys):
+        if not keys:
+            raise ValueError("Chưa cấu hình khóa Fernet (FERNET_KEYS hoặc FERNET_KEY).")
+        fernets = [Fernet(key) for key in keys]
+        self._primary = fernets[0]
+        self._cipher = MultiFernet(fernets)
+        self.key_count = len(fernets)
+
+    def encrypt(self, text):
+        return self._cipher.encrypt(text.encode()).decode()
+
+    def decrypt(self, token):
+        return self._cipher.decrypt(token.encode()).decode()
+
+    def is_current(self, token):
+        """True nếu token đã được mã hóa bằng khóa chính (chỉ kiểm tra chữ ký, không giải mã)."""
+        try:
+            self._primary.extract_timestamp(token.encode())
+            return True
+        except InvalidToken:
+            return False
+
+    def rotate(self, token):
+        """Mã hóa lại token bằng khóa chính; InvalidToken nếu không khóa nào giải mã được."""
+        return self._cipher.rotate(token.encode()).decode()
+
+@st.cache_resource
+def get_crypto_service():
+    """Dịch vụ mã hóa dùng chung cho mọi phiên trong tiến trình, dựng một lần từ FERNET_KEYS."""
+    return CryptoService(FERNET_KEYS)
+
+def encrypt(text):
+    return get_crypto_service().encrypt(text)
+
+def decrypt(token):
+    return get_crypto_service().decrypt(token)
+
+def reencrypt_users(service=None, batch_size=REENCRYPT_BATCH_SIZE):
+    """
+    Mã hóa lại password và 2fa_secret của người dùng bằng khóa chính, ghi theo từng lô bằng bulk_write.
+    Giá trị đã dùng khóa chính được bỏ qua nên chạy lại nhiều lần không ghi thêm; mỗi lệnh cập nhật chỉ khớp
+    khi giá trị cũ chưa bị đổi trong lúc chạy. Trả về số người dùng đã duyệt, đã cập nhật và số giá trị không giải mã được.
+    """
+    service = service or get_crypto_service()
+    report = {"scanned": 0, "updated": 0, "failed": 0}
+    cursor = db.users.find(
+        {"$or": [{field: {"$type": "string"}} for field in ENCRYPTED_USER_FIELDS]},
+        {field: 1 for field in ENCRYPTED_USER_FIELDS}
+    ).sort("_id", 1).batch_size(batch_size)
+
+    while True:
+        batch = list(itertools.islice(cursor, batch_size))
+        if not batch:
+            break
+        updates = []
+        for user in batch:
+            expected, changes = {}, {}
+            for field in ENCRYPTED_USER_FIELDS:
+                token = user.get(field)
+                if not isinstance(token, str) or service.is_current(token):
+                    continue
+                try:
+                    changes[field] = service.rotate(token)
+                except InvalidToken:
+                    report["failed"] += 1
+                    logger.warning(f"Không giải mã được trường {field} của người dùng {user['_id']} bằng các khóa hiện có.")
+                    continue
+                expected[field] = token
+            if changes:
+                updates.append(UpdateOne({"_id": user["_id"], **expected}, {"$set": changes}))
+        if updates:
+            report["updated"] += db.users.bulk_write(updates, ordered=False).modified_count
+        report["scanned"] += len(batch)
+
+    logger.info(f"Mã hóa lại dữ liệu người dùng: cập nhật {report['updated']}/{report['scanned']}, {report['failed']} giá trị lỗi.")
+    return report
+
+def _run_reencryption(batch_size):
+    try:
+        reencrypt_users(batch_size=batch_size)
+    except Exception as e:
+        logger.error(f"Lỗi khi mã hóa lại dữ liệu người dùng: {e}")
+
+def start_reencryption(batch_size=REENCRYPT_BATCH_SIZE):
+    """
+    Chạy reencrypt_users ở luồng nền khi có khóa cũ trong FERNET_KEYS (mỗi tiến trình chỉ chạy một lần).
+    Trả về luồng đã khởi động hoặc None nếu chỉ có một khóa.
+    """
+    global _reencrypt_thread
+    with _reencrypt_lock:
+        if _reencrypt_thread is not None:
+            return _reencrypt_thread
+        if get_crypto_service().key_count < 2:
+            return None
+        _reencrypt_thread = threading.Thread(target=_run_reencryption, args=(batch_size,), name="user-reencryption", daemon=True)
+        _reencrypt_thread.start()
+        logger.info("Đã khởi động luồng mã hóa lại dữ liệu người dùng bằng khóa Fernet mới.")
+        return _reencrypt_thread
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quản lý khóa Fernet của dữ liệu người dùng.")
+    parser.add_argument("--generate-key", action="store_true", help="In ra một khóa Fernet mới để thêm vào đầu FERNET_KEYS")
+    parser.add_argument("--reencrypt", action="store_true", help="Mã hóa lại password và 2fa_secret bằng khóa chính")
+    parser.add_argument("--batch-size", type=int, default=REENCRYPT_BATCH_SIZE, help="Số người dùng mỗi lô")
+    args = parser.parse_args()
+
+    if args.generate_key:
+        print(Fernet.generate_key().decode())
+    if args.reencrypt:
+        print(reencrypt_users(batch_size=args.batch_size))
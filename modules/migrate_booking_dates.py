@@ -0,0 +1,127 @@
+from config import db
+from pymongo import UpdateOne
+import argparse
+import datetime
+import logging
+import threading
+from modules.availability import match_string_dates
+from utils import to_db_date, from_db_date
+
+logger = logging.getLogger(__name__)
+
+# Tên bản ghi lưu tiến độ trong collection migrations
+MIGRATION_ID = "booking_dates_to_bson"
+
+# Các đơn còn lưu ngày dạng chuỗi ISO
+STRING_DATE_FILTER = {"$or": [
+    {"start_date": {"$type": "string"}},
+    {"end_date": {"$type": "string"}}
+]}
+
+_startup_thread = None
+_startup_lock = threading.Lock()
+
+def _load_checkpoint():
+    progress = db.migrations.find_one({"_id": MIGRATION_ID})
+    return progress.get("last_id") if progress else None
+
+def _save_checkpoint(last_id, converted, skipped):
+    db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {
+            "$set": {"last_id": last_id, "updated_at": datetime.datetime.now()},
+            "$inc": {"converted": converted, "skipped": skipped}
+        },
+        upsert=True
+    )
+
+def migrate_booking_dates(batch_size=1000, restart=False):
+    """
+    Chuyển start_date/end_date của bookings từ chuỗi ISO sang ngày BSON theo từng lô bằng bulk_write.
+    Tiến độ (_id cuối cùng đã xử lý) được lưu sau mỗi lô nên có thể chạy tiếp khi bị ngắt giữa chừng;
+    khi chạy xong, tiến độ được xóa để lần chạy sau quét lại từ đầu (ví dụ đơn từ bản sao lưu được khôi phục).
+    """
+    last_id = None if restart else _load_checkpoint()
+    if restart:
+        db.migrations.delete_one({"_id": MIGRATION_ID})
+    total_converted = 0
+    total_skipped = 0
+
+    while True:
+        query = dict(STRING_DATE_FILTER)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(db.bookings.find(query, {"start_date": 1, "end_date": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        skipped = 0
+        for booking in batch:
+            try:
+                new_dates = {
+                    "start_date": to_db_date(from_db_date(booking["start_date"])),
+                    "end_date": to_db_date(from_db_date(booking["end_date"]))
+                }
+            except (KeyError, TypeError, ValueError) as e:
+                skipped += 1
+                logger.warning(f"Bỏ qua đơn {booking['_id']} vì ngày không hợp lệ: {e}")
+                continue
+            operations.append(UpdateOne({"_id": booking["_id"]}, {"$set": new_dates}))
+
+        if operations:
+            db.bookings.bulk_write(operations, ordered=False)
+        last_id = batch[-1]["_id"]
+        _save_checkpoint(last_id, len(operations), skipped)
+        total_converted += len(operations)
+        total_skipped += skipped
+        logger.info(f"Đã chuyển đổi {total_converted} đơn (bỏ qua {total_skipped}), đến _id {last_id}.")
+
+    db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"completed_at": datetime.datetime.now()}, "$unset": {"last_id": ""}},
+        upsert=True
+    )
+    return {"converted": total_converted, "skipped": total_skipped}
+
+def string_dated_bookings_remain():
+    """True nếu còn đơn lưu start_date/end_date dạng chuỗi."""
+    return db.bookings.find_one(STRING_DATE_FILTER, {"_id": 1}) is not None
+
+def ensure_booking_dates(batch_size=1000):
+    """
+    Chuyển đổi các đơn còn lưu ngày dạng chuỗi (nếu có) rồi kiểm tra lại. Chỉ khi không còn đơn nào như vậy
+    thì các điều kiện lọc theo ngày mới bỏ nhánh so khớp chuỗi; ngược lại ghi cảnh báo và giữ nhánh đó.
+    Trả về True nếu mọi đơn đã lưu ngày BSON.
+    """
+    if string_dated_bookings_remain():
+        logger.warning("Còn đơn đặt xe lưu ngày dạng chuỗi, đang chuyển sang ngày BSON.")
+        migrate_booking_dates(batch_size=batch_size)
+    if string_dated_bookings_remain():
+        logger.warning("Vẫn còn đơn đặt xe có ngày dạng chuỗi không chuyển đổi được, tiếp tục so khớp cả ngày dạng chuỗi.")
+        return False
+    match_string_dates(False)
+    return True
+
+def _run_startup_migration(batch_size):
+    try:
+        ensure_booking_dates(batch_size=batch_size)
+    except Exception as e:
+        logger.error(f"Lỗi khi chuyển đổi ngày của bookings: {e}")
+
+def start_booking_date_migration(batch_size=1000):
+    """Chạy ensure_booking_dates ở luồng nền (mỗi tiến trình chỉ chạy một lần). Trả về luồng đã khởi động."""
+    global _startup_thread
+    with _startup_lock:
+        if _startup_thread is None:
+            _startup_thread = threading.Thread(target=_run_startup_migration, args=(batch_size,), name="booking-date-migration", daemon=True)
+            _startup_thread.start()
+        return _startup_thread
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chuyển ngày của bookings từ chuỗi ISO sang ngày BSON.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Số đơn xử lý mỗi lô")
+    parser.add_argument("--restart", action="store_true", help="Bỏ qua tiến độ đã lưu và chạy lại từ đầu")
+    args = parser.parse_args()
+
+    print(migrate_booking_dates(batch_size=args.batch_size, restart=args.restart))
@@ -0,0 +1,71 @@
+import streamlit as st
+import pandas as pd
+from config import ADMIN_PAGE_SIZE
+
+# Các lựa chọn số dòng mỗi trang
+PAGE_SIZE_OPTIONS = [10, 20, 50, 100]
+
+def paginated_table(key, fetch_page, to_row, reset_token=None, empty_message="Không có dữ liệu.", column_config=None):
+    """
+    Hiển thị một trang dữ liệu dạng bảng với phân trang theo con trỏ (keyset).
+
+    fetch_page(after_id, limit) trả về (danh sách document sắp xếp theo _id giảm dần, tổng số hoặc None).
+    to_row(document) chuyển một document thành một dòng (dict) của bảng.
+    reset_token: khi giá trị này thay đổi (ví dụ từ khóa tìm kiếm) bảng quay về trang đầu.
+    empty_message: thông báo hiển thị khi không có dòng nào.
+    column_config: cấu hình cột truyền thẳng cho st.dataframe (ví dụ cột ảnh).
+    Trả về document đang được chọn trong bảng, hoặc None.
+    """
+    cursors_key = f"{key}_cursors"
+    token_key = f"{key}_reset_token"
+    page_size_key = f"{key}_page_size"
+
+    page_size_options = sorted(set(PAGE_SIZE_OPTIONS + [ADMIN_PAGE_SIZE]))
+    page_size = st.selectbox("Số dòng mỗi trang", page_size_options, index=page_size_options.index(ADMIN_PAGE_SIZE), key=page_size_key)
+
+    # Con trỏ của từng trang: _id cuối cùng của trang trước đó (None là trang đầu)
+    reset_state = (reset_token, page_size)
+    if cursors_key not in st.session_state or st.session_state.get(token_key) != reset_state:
+        st.session_state[cursors_key] = [None]
+        st.session_state[token_key] = reset_state
+    cursors = st.session_state[cursors_key]
+
+    documents, total = fetch_page(cursors[-1], page_size + 1)
+    has_next_page = len(documents) > page_size
+    documents = documents[:page_size]
+
+    if not documents:
+        st.write(empty_message)
+        return None
+
+    page_number = len(cursors)
+    if total is not None:
+        total_pages = max(1, (total + page_size - 1) // page_size)
+        st.caption(f"Trang {page_number}/{total_pages} - Tổng {total} dòng")
+    else:
+        st.caption(f"Trang {page_number}")
+
+    # Toàn bộ trang được gửi qua một widget bảng duy nhất thay vì mỗi dòng một nhóm nút
+    event = st.dataframe(
+        pd.DataFrame([to_row(document) for document in documents]),
+        hide_index=True,
+        column_config=column_config,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=f"{key}_table_{page_number}"
+    )
+
+    col_prev, col_next = st.columns(2)
+    with col_prev:
+        if page_number > 1 and st.button("Trang trước", key=f"{key}_prev"):
+            cursors.pop()
+            st.rerun()
+    with col_next:
+        if has_next_page and st.button("Trang sau", key=f"{key}_next"):
+            cursors.append(documents[-1]["_id"])
+            st.rerun()
+
+    selected_rows = event.selection.rows if event else []
+    if selected_rows:
+        return documents[selected_rows[0]]
+    return None
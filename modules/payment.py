@@ -3,6 +3,7 @@ import logging
 from datetime import datetime
 from config import db
 from bson.objectid import ObjectId
+from modules.booking_stats import update_booking
 
 logger = logging.getLogger(__name__)
 
@@ -47,8 +48,7 @@ def process_simulated_payment(card_number, amount, booking_id):
 
 def update_payment_status(booking_id, status):
     logger.info(f"Cập nhật trạng thái thanh toán cho booking_id: {booking_id} thành {status}")
-    result = db.bookings.update_one({"_id": booking_id}, {"$set": {"payment_status": status}})
-    if result.modified_count == 1:
+    if update_booking(booking_id, {"payment_status": status}) is not None:
         logger.info(f"Cập nhật thành công.")
     else:
         logger.warning(f"Không tìm thấy đơn đặt xe với booking_id này.")
\ No newline at end of file
@@ -0,0 +1,146 @@
+import streamlit as st
+from config import REPORT_CACHE_DIR, REPORT_CACHE_TTL_SECONDS
+from concurrent.futures import ThreadPoolExecutor
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, Side
+from bson import ObjectId
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Kiểu ô dùng chung cho mọi sheet; được đăng ký một lần cho mỗi workbook thay vì gán lại cho từng ô
+_THIN = Side(style="thin")
+_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+HEADER_STYLE = "report_header"
+CELL_STYLE = "report_cell"
+INDEX_STYLE = "report_index"
+
+def _register_styles(workbook):
+    workbook.add_named_style(NamedStyle(HEADER_STYLE, font=Font(bold=True), alignment=Alignment(horizontal="center"), border=_BORDER))
+    workbook.add_named_style(NamedStyle(CELL_STYLE, border=_BORDER))
+    workbook.add_named_style(NamedStyle(INDEX_STYLE, alignment=Alignment(horizontal="center"), border=_BORDER))
+
+def _cell(sheet, value, style):
+    if isinstance(value, ObjectId):
+        value = str(value)
+    cell = WriteOnlyCell(sheet, value=value)
+    cell.style = style
+    return cell
+
+def dataframe_source(frame, index=False):
+    """Tiêu đề và các dòng của một DataFrame (duyệt dần từng dòng, không chép cả bảng)."""
+    headers = ([frame.index.name or ""] if index else []) + [str(column) for column in frame.columns]
+    return headers, frame.itertuples(index=index, name=None)
+
+def cursor_source(cursor, columns):
+    """Tiêu đề và các dòng đọc dần từ cursor MongoDB; columns là danh sách (tiêu đề, tên trường)."""
+    headers = [header for header, _ in columns]
+    return headers, ([document.get(field) for _, field in columns] for document in cursor)
+
+def write_sheet(workbook, title, headers, rows, index_column=False):
+    """Ghi một sheet ở chế độ write-only: mỗi dòng được ghi thẳng ra file ngay khi đọc được."""
+    sheet = workbook.create_sheet(title)
+    sheet.append([_cell(sheet, header, HEADER_STYLE) for header in headers])
+    count = 0
+    for row in rows:
+        sheet.append([
+            _cell(sheet, value, INDEX_STYLE if index_column and position == 0 else CELL_STYLE)
+            for position, value in enumerate(row)
+        ])
+        count += 1
+    return count
+
+def build_report(path, sheets):
+    """
+    Ghi workbook Excel ra path (hoặc file object) từ các sheet (tiêu đề, (headers, rows), có cột index hay không).
+    Khi ghi ra đường dẫn, file được ghi ra tên tạm rồi mới đổi tên nên không bao giờ có file báo cáo ghi dở.
+    """
+    workbook = Workbook(write_only=True)
+    _register_styles(workbook)
+    for title, (headers, rows), index_column in sheets:
+        write_sheet(workbook, title, headers, rows, index_column)
+    if not isinstance(path, str):
+        workbook.save(path)
+        return path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    workbook.save(temp_path)
+    os.replace(temp_path, path)
+    return path
+
+def report_key(*parts):
+    """Mã băm của bộ lọc báo cáo (ngày, danh sách xe, nguồn dữ liệu, phiên bản dữ liệu...)."""
+    return hashlib.sha256(json.dumps(parts, default=str, sort_keys=True).encode("utf-8")).hexdigest()
+
+class ReportWorker:
+    """
+    Tạo báo cáo ở luồng nền để phiên admin không phải chờ. Kết quả được lưu thành file theo mã băm của bộ lọc
+    nên cùng bộ lọc (và cùng phiên bản dữ liệu) chỉ tạo một lần; file quá ttl giây được xóa khi có yêu cầu mới.
+    """
+
+    def __init__(self, cache_dir=REPORT_CACHE_DIR, ttl=REPORT_CACHE_TTL_SECONDS, max_workers=1):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-worker")
+        self._lock = threading.Lock()
+        self._jobs = {}  # mã báo cáo -> Future
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.xlsx")
+
+    def _prune(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def submit(self, key, build):
+        """Yêu cầu tạo báo cáo key bằng build(path); không làm gì nếu báo cáo đã có hoặc đang được tạo."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.done():
+                return job
+            self._prune()
+            if os.path.exists(self.path(key)):
+                return None
+            job = self._executor.submit(self._run, key, build)
+            self._jobs[key] = job
+            return job
+
+    def _run(self, key, build):
+        started = time.perf_counter()
+        try:
+            build(self.path(key))
+        except Exception as e:
+            logger.error(f"Lỗi khi tạo báo cáo {key[:12]}: {e}")
+            raise
+        logger.info(f"Đã tạo báo cáo {key[:12]} trong {time.perf_counter() - started:.1f} giây.")
+
+    def status(self, key):
+        """"ready", "running", "failed" hoặc None (chưa yêu cầu)."""
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is not None and not job.done():
+            return "running"
+        if os.path.exists(self.path(key)):
+            return "ready"
+        if job is not None and job.exception() is not None:
+            return "failed"
+        return None
+
+@st.cache_resource
+def get_report_worker():
+    """Luồng tạo báo cáo dùng chung cho mọi phiên trong tiến trình."""
+    return ReportWorker()
@@ -0,0 +1,116 @@
+import streamlit as st
+from config import db
+from pymongo.errors import BulkWriteError
+import datetime
+import logging
+from indexes import ensure_collection_indexes
+from modules.availability import find_conflicting_booking
+from utils import to_db_date
+
+logger = logging.getLogger(__name__)
+
+# Mỗi document trong vehicle_slots giữ một ngày của một xe cho một đơn đặt.
+# Index duy nhất (vehicle_id, day) khiến hai đơn không thể cùng giữ một ngày,
+# nên việc đặt xe đồng thời được MongoDB phân xử mà không cần khóa toàn cục.
+
+@st.cache_resource
+def ensure_slot_indexes():
+    """Tạo index khai báo trong indexes.py cho vehicle_slots (chỉ chạy một lần mỗi tiến trình)."""
+    ensure_collection_indexes(db, "vehicle_slots")
+
+def _slot_days(start_date, end_date):
+    """Danh sách các ngày (dạng datetime lúc 0 giờ) trong khoảng [start_date, end_date]."""
+    total_days = (end_date - start_date).days + 1
+    return [to_db_date(start_date + datetime.timedelta(days=i)) for i in range(total_days)]
+
+def _claim_days(vehicle_id, booking_id, days):
+    """Giữ các ngày cho đơn đặt. Trả về ngày bị trùng đầu tiên, hoặc None nếu giữ được hết."""
+    if not days:
+        return None
+    slots = [{"vehicle_id": vehicle_id, "day": day, "booking_id": booking_id} for day in days]
+    try:
+        db.vehicle_slots.insert_many(slots, ordered=True)
+        return None
+    except BulkWriteError as e:
+        # Insert có thứ tự dừng ở slot bị trùng: chỉ hoàn tác các slot vừa chèn
+        inserted = e.details.get("nInserted", 0)
+        if inserted:
+            db.vehicle_slots.delete_many({"booking_id": booking_id, "day": {"$in": days[:inserted]}})
+        logger.info(f"Xe {vehicle_id} đã được giữ vào ngày {days[inserted].date()} bởi đơn khác.")
+        return days[inserted]
+
+def _describe_conflict(vehicle_id, day):
+    """Lấy thông tin đơn đang giữ ngày bị trùng để hiển thị cho người dùng."""
+    slot = db.vehicle_slots.find_one({"vehicle_id": vehicle_id, "day": day}, {"booking_id": 1})
+    if slot:
+        booking = db.bookings.find_one({"_id": slot["booking_id"]}, {"start_date": 1, "end_date": 1, "status": 1})
+        if booking:
+            return booking
+    return {"start_date": day, "end_date": day}
+
+def reserve_slots(vehicle_id, booking_id, start_date, end_date):
+    """
+    Giữ xe cho đơn đặt trong khoảng [start_date, end_date].
+    Trả về None nếu thành công, ngược lại trả về đơn đặt bị trùng lịch.
+    """
+    ensure_slot_indexes()
+    conflict_day = _claim_days(vehicle_id, booking_id, _slot_days(start_date, end_date))
+    if conflict_day is not None:
+        return _describe_conflict(vehicle_id, conflict_day)
+
+    # Các đơn tạo trước khi có vehicle_slots không giữ slot nên vẫn phải kiểm tra trực tiếp
+    conflict = find_conflicting_booking(vehicle_id, start_date, end_date, exclude_booking_id=booking_id)
+    if conflict:
+        release_slots(booking_id)
+        return conflict
+    return None
+
+def held_slot_days(booking_id):
+    """Các ngày đang giữ của một đơn (lưu lại trước khi đổi để có thể khôi phục bằng restore_slots)."""
+    return [slot["day"] for slot in db.vehicle_slots.find({"booking_id": booking_id}, {"day": 1})]
+
+def resize_slots(vehicle_id, booking_id, start_date, end_date):
+    """
+    Đổi khoảng giữ xe của một đơn sang [start_date, end_date] (gia hạn hoặc chỉnh sửa).
+    Chỉ giữ thêm các ngày mới, rồi trả các ngày nằm ngoài khoảng mới.
+    Trả về None nếu thành công, ngược lại trả về đơn đặt bị trùng lịch.
+    """
+    ensure_slot_indexes()
+    wanted_days = _slot_days(start_date, end_date)
+    held_days = set(held_slot_days(booking_id))
+    conflict_day = _claim_days(vehicle_id, booking_id, [day for day in wanted_days if day not in held_days])
+    if conflict_day is not None:
+        return _describe_conflict(vehicle_id, conflict_day)
+
+    conflict = find_conflicting_booking(vehicle_id, start_date, end_date, exclude_booking_id=booking_id)
+    if conflict:
+        db.vehicle_slots.delete_many({"booking_id": booking_id, "day": {"$in": [day for day in wanted_days if day not in held_days]}})
+        return conflict
+
+    db.vehicle_slots.delete_many({"booking_id": booking_id, "day": {"$nin": wanted_days}})
+    return None
+
+def restore_slots(vehicle_id, booking_id, days):
+    """
+    Đưa các ngày giữ của một đơn về đúng danh sách days (lấy từ held_slot_days trước khi đổi),
+    dùng khi đã đổi khoảng giữ xe nhưng cập nhật đơn thất bại.
+    Trả về False nếu có ngày không giữ lại được vì đã bị đơn khác giữ trong lúc đó.
+    """
+    days = list(days)
+    db.vehicle_slots.delete_many({"booking_id": booking_id, "day": {"$nin": days}})
+    held_days = set(held_slot_days(booking_id))
+    missing = [day for day in days if day not in held_days]
+    if not missing:
+        return True
+    try:
+        db.vehicle_slots.insert_many([{"vehicle_id": vehicle_id, "day": day, "booking_id": booking_id} for day in missing], ordered=False)
+        return True
+    except BulkWriteError as e:
+        logger.warning(f"Không giữ lại được {len(e.details.get('writeErrors', []))} ngày của đơn {booking_id} khi khôi phục.")
+        return False
+
+def release_slots(booking_id):
+    """Trả toàn bộ các ngày đang giữ của một đơn (khi hủy, trả xe hoặc hoàn thành)."""
+    result = db.vehicle_slots.delete_many({"booking_id": booking_id})
+    logger.info(f"Đã trả {result.deleted_count} ngày giữ xe của đơn {booking_id}.")
+    return result.deleted_count
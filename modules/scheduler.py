@@ -0,0 +1,115 @@
+from config import db, SCHEDULER_INTERVAL_SECONDS
+from modules.availability import INACTIVE_BOOKING_STATUSES, date_condition
+from modules.booking_stats import record_status_change, refresh_booking_daily_stats
+import argparse
+import datetime
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_scheduler_thread = None
+_scheduler_stop = threading.Event()
+_scheduler_lock = threading.Lock()
+
+def process_expired_bookings(today=None):
+    """
+    Xử lý các đơn đặt xe đã quá ngày kết thúc.
+    - Đơn đã thanh toán: tự động chuyển sang "completed", trả các ngày giữ xe và trả xe về "available".
+    - Đơn chưa thanh toán: đánh dấu expired=True để admin xử lý.
+    Chạy lại nhiều lần không làm thay đổi kết quả (idempotent).
+    """
+    today = today or datetime.date.today()
+    now = datetime.datetime.now()
+    expired_filter = {
+        "status": {"$nin": INACTIVE_BOOKING_STATUSES},
+        "$and": [date_condition("end_date", "$lt", today)]
+    }
+
+    # Đơn đã thanh toán và hết hạn: hoàn thành hàng loạt
+    completed = list(db.bookings.find({**expired_filter, "payment_status": "paid"}, {"_id": 1, "vehicle_id": 1}))
+    completed_ids = [booking["_id"] for booking in completed]
+    completed_count = 0
+    if completed_ids:
+        completed_count = db.bookings.update_many(
+            {"_id": {"$in": completed_ids}, "status": {"$nin": INACTIVE_BOOKING_STATUSES}},
+            {"$set": {"status": "completed", "auto_completed_at": now}}
+        ).modified_count
+        db.vehicle_slots.delete_many({"booking_id": {"$in": completed_ids}})
+
+    # Đơn chưa thanh toán và hết hạn: chỉ đánh dấu
+    flagged_count = db.bookings.update_many(
+        {**expired_filter, "payment_status": {"$ne": "paid"}, "expired": {"$ne": True}},
+        {"$set": {"expired": True, "expired_flagged_at": now}}
+    ).modified_count
+
+    # Trả xe về trạng thái sẵn sàng nếu không còn đơn đã thanh toán nào đang chạy hôm nay
+    released_count = 0
+    vehicle_ids = list({booking["vehicle_id"] for booking in completed})
+    if vehicle_ids:
+        still_rented = set(db.bookings.distinct("vehicle_id", {
+            "vehicle_id": {"$in": vehicle_ids},
+            "status": {"$nin": INACTIVE_BOOKING_STATUSES},
+            "payment_status": "paid",
+            "$and": [date_condition("start_date", "$lte", today), date_condition("end_date", "$gte", today)]
+        }))
+        released_ids = [vehicle_id for vehicle_id in vehicle_ids if vehicle_id not in still_rented]
+        if released_ids:
+            released_count = db.vehicles.update_many(
+                {"_id": {"$in": released_ids}, "status": "rented"},
+                {"$set": {"status": "available"}}
+            ).modified_count
+
+    if completed_count or released_count:
+        record_status_change()
+
+    summary = {
+        "ran_at": now,
+        "run_date": today.isoformat(),
+        "completed_bookings": completed_count,
+        "flagged_bookings": flagged_count,
+        "released_vehicles": released_count
+    }
+    # Ghi lại kết quả của mỗi lần chạy để tra cứu sau
+    db.scheduler_runs.insert_one(dict(summary))
+    logger.info(f"Xử lý đơn hết hạn: hoàn thành {completed_count}, đánh dấu {flagged_count}, trả {released_count} xe.")
+    return summary
+
+def _run_loop(interval):
+    while not _scheduler_stop.is_set():
+        try:
+            process_expired_bookings()
+        except Exception as e:
+            logger.error(f"Lỗi khi xử lý đơn hết hạn: {e}")
+        try:
+            refresh_booking_daily_stats()  # Sửa sai lệch của bảng tổng hợp thống kê
+        except Exception as e:
+            logger.error(f"Lỗi khi tính lại bảng tổng hợp đơn đặt xe: {e}")
+        _scheduler_stop.wait(interval)
+
+def start_scheduler(interval=SCHEDULER_INTERVAL_SECONDS):
+    """Khởi động luồng nền xử lý đơn hết hạn (mỗi tiến trình chỉ có một luồng)."""
+    global _scheduler_thread
+    with _scheduler_lock:
+        if _scheduler_thread is not None and _scheduler_thread.is_alive():
+            return _scheduler_thread
+        _scheduler_stop.clear()
+        _scheduler_thread = threading.Thread(target=_run_loop, args=(interval,), name="booking-scheduler", daemon=True)
+        _scheduler_thread.start()
+        logger.info(f"Đã khởi động luồng xử lý đơn hết hạn, chu kỳ {interval} giây.")
+        return _scheduler_thread
+
+def stop_scheduler():
+    """Dừng luồng nền xử lý đơn hết hạn."""
+    _scheduler_stop.set()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Xử lý các đơn đặt xe đã hết hạn.")
+    parser.add_argument("--once", action="store_true", help="Chạy một lần rồi thoát (dùng cho cron)")
+    parser.add_argument("--interval", type=int, default=SCHEDULER_INTERVAL_SECONDS, help="Chu kỳ chạy (giây) khi không dùng --once")
+    args = parser.parse_args()
+
+    if args.once:
+        print(process_expired_bookings())
+    else:
+        _run_loop(args.interval)
@@ -0,0 +1,243 @@
+import streamlit as st
+from config import db, VEHICLE_CATALOG_CHECK_SECONDS
+from collections import Counter
+import bisect
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+import unicodedata
+from modules.vehicle_catalog import VEHICLE_VERSION
+from modules.versions import get_version
+
+logger = logging.getLogger(__name__)
+
+# Các trường được đưa vào chỉ mục tìm kiếm và hiển thị trong kết quả
+SEARCH_INDEX_PROJECTION = {
+    "brand": 1,
+    "model": 1,
+    "license_plate": 1,
+    "year": 1,
+    "price_per_day": 1,
+    "required_license_type": 1,
+    "image": 1
+}
+SEARCH_FIELDS = ("brand", "model", "license_plate", "year")
+
+# Độ giống tối thiểu (hệ số Dice trên tập trigram) để coi hai từ là khớp
+MIN_SIMILARITY = 0.4
+# Số từ gần đúng tối đa giữ lại cho mỗi từ trong truy vấn
+MAX_TOKEN_MATCHES = 8
+# Điểm cho từ bắt đầu bằng chuỗi đã nhập (người dùng đang gõ dở)
+PREFIX_SIMILARITY = 0.9
+# Số từ tối đa của truy vấn được dùng để tìm (các từ sau bị bỏ qua)
+MAX_QUERY_TOKENS = 6
+
+def normalize_text(text):
+    """Viết thường, bỏ dấu tiếng Việt và tách thành các từ chỉ gồm chữ và số."""
+    text = unicodedata.normalize("NFKD", str(text)).replace("đ", "d").replace("Đ", "D")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return re.findall(r"[a-z0-9]+", text)
+
+def trigrams(token):
+    """Tập trigram của một từ, có thêm khoảng trắng ở hai đầu để ưu tiên khớp phần đầu từ."""
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class VehicleSearchIndex:
+    """
+    Chỉ mục tìm kiếm mờ trong bộ nhớ theo trigram trên thương hiệu, mẫu xe, biển số và năm sản xuất.
+    Trigram được đánh trên tập từ vựng (mỗi từ khác nhau một lần) nên tìm từ gần đúng không phụ thuộc số xe.
+    Khi tìm, chỉ việc chọn từ gần đúng và chụp lại danh sách xe của các từ đó diễn ra trong khóa;
+    việc chấm điểm từng xe và lấy top-k làm ngoài khóa nên các phiên khác không phải chờ.
+    Nếu được dựng kèm phiên bản (get_search_index), chỉ mục tự dựng lại khi bộ đếm phiên bản "vehicles" đổi,
+    nên thay đổi xe ở tiến trình khác cũng được cập nhật.
+    """
+
+    def __init__(self, check_interval=VEHICLE_CATALOG_CHECK_SECONDS):
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._records = {}          # _id -> bản ghi hiển thị gọn
+        self._doc_tokens = {}       # _id -> tập từ của xe
+        self._token_docs = {}       # từ -> tập _id chứa từ đó
+        self._token_trigrams = {}   # từ -> tập trigram của từ
+        self._trigram_tokens = {}   # trigram -> tập từ chứa trigram đó
+        self._vocabulary = []       # các từ đã sắp xếp, để tra theo tiền tố
+        self._collection = None     # collection nguồn để dựng lại khi phiên bản đổi
+        self._version = None        # phiên bản "vehicles" ứng với dữ liệu đang giữ (None: không theo dõi)
+        self._checked_at = 0.0
+        self.check_interval = check_interval
+
+    def __len__(self):
+        return len(self._records)
+
+    def _add_token(self, token, vehicle_id):
+        docs = self._token_docs.get(token)
+        if docs is None:
+            docs = self._token_docs[token] = set()
+            bisect.insort(self._vocabulary, token)
+            grams = self._token_trigrams[token] = trigrams(token)
+            for gram in grams:
+                self._trigram_tokens.setdefault(gram, set()).add(token)
+        docs.add(vehicle_id)
+
+    def _remove_token(self, token, vehicle_id):
+        docs = self._token_docs.get(token)
+        if docs is None:
+            return
+        docs.discard(vehicle_id)
+        if not docs:
+            del self._token_docs[token]
+            del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+            for gram in self._token_trigrams.pop(token):
+                tokens = self._trigram_tokens[gram]
+                tokens.discard(token)
+                if not tokens:
+                    del self._trigram_tokens[gram]
+
+    def _adopt_version(self, version):
+        """Ghi nhận phiên bản do chính tiến trình này vừa tăng khi thay đổi ngay sau phiên bản đang giữ (gọi khi giữ khóa)."""
+        if version is not None and self._version is not None and version == self._version + 1:
+            self._version = version
+
+    def upsert(self, vehicle, version=None):
+        """
+        Thêm mới hoặc cập nhật một xe trong chỉ mục.
+        version là giá trị trả về của invalidate_vehicle_catalog() cho thay đổi này, để không phải dựng lại cả chỉ mục.
+        """
+        vehicle_id = vehicle["_id"]
+        record = {field: vehicle.get(field) for field in SEARCH_INDEX_PROJECTION}
+        record["_id"] = vehicle_id
+        tokens = set()
+        for field in SEARCH_FIELDS:
+            tokens.update(normalize_text(vehicle.get(field, "")))
+        with self._lock:
+            old_tokens = self._doc_tokens.get(vehicle_id, set())
+            for token in old_tokens - tokens:
+                self._remove_token(token, vehicle_id)
+            for token in tokens - old_tokens:
+                self._add_token(token, vehicle_id)
+            self._doc_tokens[vehicle_id] = tokens
+            self._records[vehicle_id] = record
+            self._adopt_version(version)
+
+    def remove(self, vehicle_id, version=None):
+        """Xóa một xe khỏi chỉ mục."""
+        with self._lock:
+            for token in self._doc_tokens.pop(vehicle_id, set()):
+                self._remove_token(token, vehicle_id)
+            self._records.pop(vehicle_id, None)
+            self._adopt_version(version)
+
+    def refresh(self):
+        """
+        Dựng lại chỉ mục nếu bộ đếm phiên bản "vehicles" đã đổi (kiểm tra tối đa mỗi check_interval giây).
+        Dữ liệu mới được đọc ngoài khóa rồi mới thay vào; trong lúc đó các lượt tìm vẫn dùng dữ liệu cũ.
+        """
+        if self._version is None or self._collection is None:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = get_version(VEHICLE_VERSION)
+        if version == self._version or not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            fresh = VehicleSearchIndex.from_collection(self._collection)
+            with self._lock:
+                self._records = fresh._records
+                self._doc_tokens = fresh._doc_tokens
+                self._token_docs = fresh._token_docs
+                self._token_trigrams = fresh._token_trigrams
+                self._trigram_tokens = fresh._trigram_tokens
+                self._vocabulary = fresh._vocabulary
+                self._version = version
+            logger.info(f"Đã dựng lại chỉ mục tìm kiếm cho {len(fresh)} xe (phiên bản {version}).")
+        finally:
+            self._reload_lock.release()
+
+    def _prefix_tokens(self, query_token):
+        """Các từ bắt đầu bằng query_token, theo thứ tự từ điển."""
+        for position in range(bisect.bisect_left(self._vocabulary, query_token), len(self._vocabulary)):
+            token = self._vocabulary[position]
+            if not token.startswith(query_token):
+                break
+            yield token
+
+    def _similar_tokens(self, query_token):
+        """Tối đa MAX_TOKEN_MATCHES từ giống query_token nhất, kèm độ giống, xếp giảm dần."""
+        matches = {}
+        for token in itertools.islice(self._prefix_tokens(query_token), MAX_TOKEN_MATCHES):
+            matches[token] = 1.0 if token == query_token else PREFIX_SIMILARITY
+
+        # Biển số và năm chỉ khớp theo tiền tố; gõ sai chữ số thì tìm gần đúng không có ý nghĩa
+        if not any(ch.isdigit() for ch in query_token):
+            query_grams = trigrams(query_token)
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self._trigram_tokens.get(gram, ()))
+            for token, count in shared.items():
+                similarity = 2 * count / (len(query_grams) + len(self._token_trigrams[token]))
+                if similarity >= MIN_SIMILARITY and similarity > matches.get(token, 0):
+                    matches[token] = similarity
+        return sorted(matches.items(), key=lambda item: item[1], reverse=True)[:MAX_TOKEN_MATCHES]
+
+    def search(self, query, limit=20):
+        """
+        Trả về tối đa limit xe khớp gần đúng với query. Mỗi xe được xếp theo số từ của truy vấn mà nó khớp,
+        rồi theo tổng độ giống tốt nhất của từng từ; chỉ giữ top-k bằng heap thay vì xét mọi tổ hợp từ.
+        """
+        self.refresh()
+        query_tokens = list(dict.fromkeys(normalize_text(query)))[:MAX_QUERY_TOKENS]
+        if not query_tokens:
+            return []
+        with self._lock:
+            # Chụp lại danh sách xe của các từ gần đúng; các tập này có thể bị sửa sau khi nhả khóa
+            postings = []
+            for query_token in query_tokens:
+                matches = self._similar_tokens(query_token)
+                if matches:
+                    postings.append([(similarity, frozenset(self._token_docs[token])) for token, similarity in matches])
+        if not postings:
+            return []
+
+        matched, scores = Counter(), Counter()
+        for matches in postings:
+            # matches đã xếp giảm dần theo độ giống nên lần đầu gặp một xe là độ giống tốt nhất của nó
+            best = {}
+            for similarity, docs in matches:
+                for vehicle_id in docs:
+                    best.setdefault(vehicle_id, similarity)
+            for vehicle_id, similarity in best.items():
+                matched[vehicle_id] += 1
+                scores[vehicle_id] += similarity
+        top = heapq.nlargest(limit, scores, key=lambda vehicle_id: (matched[vehicle_id], scores[vehicle_id]))
+
+        with self._lock:
+            return [self._records[vehicle_id] for vehicle_id in top if vehicle_id in self._records]
+
+    @classmethod
+    def from_collection(cls, collection, version=None):
+        """
+        Dựng chỉ mục từ collection vehicles (chỉ đọc các trường cần thiết).
+        Có version thì chỉ mục theo dõi bộ đếm phiên bản "vehicles" và tự dựng lại từ collection khi nó đổi.
+        """
+        index = cls()
+        for vehicle in collection.find({}, SEARCH_INDEX_PROJECTION):
+            index.upsert(vehicle)
+        index._collection = collection
+        index._version = version
+        index._checked_at = time.monotonic()
+        return index
+
+@st.cache_resource
+def get_search_index():
+    """Chỉ mục tìm kiếm dùng chung cho mọi phiên trong tiến trình, dựng một lần từ MongoDB."""
+    # Đọc phiên bản trước khi dựng: thay đổi xảy ra trong lúc dựng sẽ làm chỉ mục được dựng lại ở lần tìm sau
+    version = get_version(VEHICLE_VERSION)
+    index = VehicleSearchIndex.from_collection(db.vehicles, version=version)
+    logger.info(f"Đã dựng chỉ mục tìm kiếm cho {len(index)} xe.")
+    return index
@@ -0,0 +1,252 @@
+from config import db, BOOKING_SNAPSHOT_DIR
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pandas as pd
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import uuid
+from modules.booking_stats import SERIES_FIELDS
+from modules.timeseries import densify_frame
+
+logger = logging.getLogger(__name__)
+
+# Số đơn trong mỗi record batch; bộ nhớ dùng khi xuất chỉ phụ thuộc giá trị này
+SNAPSHOT_BATCH_SIZE = 10000
+WATERMARK_FILE = "_watermark.json"
+# Lần xuất tiếp theo đọc lại các đơn tạo trong khoảng này trước mốc, để không bỏ sót đơn trùng created_at với mốc
+# hoặc được ghi muộn với created_at sớm hơn mốc; đơn đã có trong snapshot được bỏ qua khi ghi
+SNAPSHOT_OVERLAP = datetime.timedelta(minutes=10)
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ("booking_id", pa.string()),
+    ("user_id", pa.string()),
+    ("customer_email", pa.string()),
+    ("vehicle_id", pa.string()),
+    ("license_plate", pa.string()),
+    ("start_date", pa.timestamp("us")),
+    ("end_date", pa.timestamp("us")),
+    ("total_price", pa.float64()),
+    ("payment_status", pa.string()),
+    ("status", pa.string()),
+    ("created_at", pa.timestamp("us")),
+])
+SNAPSHOT_SOURCE_PROJECTION = {
+    "user_id": 1, "vehicle_id": 1, "start_date": 1, "end_date": 1,
+    "total_price": 1, "payment_status": 1, "status": 1, "created_at": 1
+}
+
+def _month(value):
+    return value.strftime("%Y-%m")
+
+def _read_state(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, WATERMARK_FILE), encoding="utf-8") as file:
+            return {key: datetime.datetime.fromisoformat(value) for key, value in json.load(file).items()}
+    except FileNotFoundError:
+        return {}
+
+def _dataset(snapshot_dir):
+    return ds.dataset(snapshot_dir, format="parquet", partitioning=ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive"))
+
+def _exported_ids(snapshot_dir, since):
+    """booking_id của các đơn đã có trong snapshot với created_at từ since trở đi."""
+    condition = (ds.field("month") >= _month(since)) & (ds.field("created_at") >= pa.scalar(since, pa.timestamp("us")))
+    return set(_dataset(snapshot_dir).to_table(columns=["booking_id"], filter=condition).column("booking_id").to_pylist())
+
+def read_watermark(snapshot_dir=BOOKING_SNAPSHOT_DIR):
+    """created_at của đơn mới nhất đã có trong snapshot, hoặc None nếu chưa có snapshot."""
+    return _read_state(snapshot_dir).get("created_at")
+
+def _write_state(snapshot_dir, created_at, covered_until):
+    path = os.path.join(snapshot_dir, WATERMARK_FILE)
+    state = {"covered_until": covered_until.isoformat()}
+    if created_at is not None:
+        state["created_at"] = created_at.isoformat()
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(f"{path}.tmp", path)
+
+def _temp_path(path):
+    # Tên bắt đầu bằng "." nên pyarrow bỏ qua file đang ghi dở khi đọc snapshot
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+
+def _iter_batches(cursor, batch_size):
+    batch = []
+    for booking in cursor:
+        batch.append(booking)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _to_record_batch(bookings):
+    """Chuyển một lô đơn thành record batch, kèm biển số xe và email khách hàng tra cứu theo lô."""
+    vehicle_ids = list({booking.get("vehicle_id") for booking in bookings})
+    user_ids = list({booking.get("user_id") for booking in bookings})
+    plates = {v["_id"]: v.get("license_plate") for v in db.vehicles.find({"_id": {"$in": vehicle_ids}}, {"license_plate": 1})}
+    emails = {u["_id"]: u.get("email") for u in db.users.find({"_id": {"$in": user_ids}}, {"email": 1})}
+
+    def column(values):
+        return [str(value) if value is not None else None for value in values]
+
+    return pa.RecordBatch.from_pydict({
+        "booking_id": column(booking["_id"] for booking in bookings),
+        "user_id": column(booking.get("user_id") for booking in bookings),
+        "customer_email": [emails.get(booking.get("user_id")) for booking in bookings],
+        "vehicle_id": column(booking.get("vehicle_id") for booking in bookings),
+        "license_plate": [plates.get(booking.get("vehicle_id")) for booking in bookings],
+        "start_date": [booking.get("start_date") for booking in bookings],
+        "end_date": [booking.get("end_date") for booking in bookings],
+        "total_price": [float(booking.get("total_price") or 0) for booking in bookings],
+        "payment_status": [booking.get("payment_status") for booking in bookings],
+        "status": [booking.get("status") for booking in bookings],
+        "created_at": [booking["created_at"] for booking in bookings],
+    }, schema=SNAPSHOT_SCHEMA)
+
+def _swap_snapshot_dir(rebuilt_dir, snapshot_dir):
+    """Đưa snapshot vừa xuất lại vào snapshot_dir bằng os.replace rồi mới xóa snapshot cũ."""
+    previous_dir = None
+    if os.path.isdir(snapshot_dir):
+        # os.replace không ghi đè được thư mục khác rỗng nên đổi tên snapshot cũ sang một bên trước
+        previous_dir = f"{rebuilt_dir}.previous"
+        os.replace(snapshot_dir, previous_dir)
+    try:
+        os.replace(rebuilt_dir, snapshot_dir)
+    except OSError:
+        if previous_dir is not None:
+            os.replace(previous_dir, snapshot_dir)
+        raise
+    if previous_dir is not None:
+        shutil.rmtree(previous_dir, ignore_errors=True)
+
+def export_bookings_snapshot(snapshot_dir=BOOKING_SNAPSHOT_DIR, full=False, batch_size=SNAPSHOT_BATCH_SIZE, overlap=SNAPSHOT_OVERLAP):
+    """
+    Xuất bookings ra Parquet theo từng record batch (thứ tự created_at, _id), chia thư mục month=YYYY-MM theo created_at.
+    Lần chạy sau đọc các đơn có created_at từ mốc đã xuất trừ overlap trở đi và chỉ thêm các đơn chưa có trong snapshot
+    (full=True: xuất lại từ đầu).
+    Các file chỉ được đổi tên thành .parquet và mốc chỉ được cập nhật khi cả lần xuất thành công.
+    Đơn đã xuất mà bị sửa sau đó (ví dụ đã thanh toán) chỉ được cập nhật khi xuất lại toàn bộ.
+    Khi xuất lại toàn bộ, snapshot mới được ghi vào thư mục tạm cạnh snapshot_dir và chỉ thay snapshot cũ
+    sau khi đã ghi mốc, nên snapshot cũ vẫn đọc được trong lúc xuất và còn nguyên nếu xuất lỗi.
+    """
+    run_id = f"{datetime.datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    target_dir = f"{snapshot_dir.rstrip(os.sep)}.rebuild-{run_id}" if full else snapshot_dir
+    os.makedirs(target_dir, exist_ok=True)
+    watermark = read_watermark(target_dir)
+    # Đơn tạo trước thời điểm bắt đầu xuất nhưng ghi muộn hơn overlap có thể chưa có trong snapshot
+    covered_until = datetime.datetime.now() - overlap
+    if watermark:
+        since = watermark - overlap
+        query = {"created_at": {"$gte": since}}
+        exported = _exported_ids(target_dir, since)
+    else:
+        query = {"created_at": {"$type": "date"}}
+        exported = set()
+    cursor = db.bookings.find(query, SNAPSHOT_SOURCE_PROJECTION).sort([("created_at", 1), ("_id", 1)]).batch_size(batch_size)
+
+    written, writer, month = [], None, None
+    rows, last_created_at = 0, watermark
+    try:
+        for bookings in _iter_batches(cursor, batch_size):
+            bookings = [booking for booking in bookings if str(booking["_id"]) not in exported]
+            if not bookings:
+                continue
+            # Đơn đã sắp xếp theo created_at nên mỗi lúc chỉ mở một file của một tháng
+            start = 0
+            while start < len(bookings):
+                batch_month = _month(bookings[start]["created_at"])
+                end = start
+                while end < len(bookings) and _month(bookings[end]["created_at"]) == batch_month:
+                    end += 1
+                if batch_month != month:
+                    if writer is not None:
+                        writer.close()
+                    month = batch_month
+                    path = os.path.join(target_dir, f"month={month}", f"part-{run_id}.parquet")
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writer = pq.ParquetWriter(_temp_path(path), SNAPSHOT_SCHEMA)
+                    written.append(path)
+                writer.write_batch(_to_record_batch(bookings[start:end]))
+                start = end
+            rows += len(bookings)
+            last_created_at = max(last_created_at or bookings[-1]["created_at"], bookings[-1]["created_at"])
+        if writer is not None:
+            writer.close()
+            writer = None
+    except Exception:
+        if writer is not None:
+            writer.close()
+        if full:
+            shutil.rmtree(target_dir, ignore_errors=True)
+        else:
+            for path in written:
+                if os.path.exists(_temp_path(path)):
+                    os.remove(_temp_path(path))
+        raise
+
+    for path in written:
+        os.replace(_temp_path(path), path)
+    _write_state(target_dir, last_created_at, covered_until)
+    if full:
+        _swap_snapshot_dir(target_dir, snapshot_dir)
+        written = [os.path.join(snapshot_dir, os.path.relpath(path, target_dir)) for path in written]
+    logger.info(f"Đã xuất {rows} đơn đặt xe ra snapshot Parquet ({len(written)} file).")
+    return {"rows": rows, "files": written, "watermark": last_created_at}
+
+def load_bookings_snapshot(start_date, end_date, vehicle_ids=None, snapshot_dir=BOOKING_SNAPSHOT_DIR, columns=None):
+    """
+    Đọc các đơn tạo trong khoảng [start_date, end_date] từ snapshot thành DataFrame.
+    Chỉ các thư mục tháng nằm trong khoảng được đọc; bộ lọc được đẩy xuống lúc đọc Parquet.
+    """
+    dataset = _dataset(snapshot_dir)
+    condition = (
+        (ds.field("month") >= _month(start_date)) & (ds.field("month") <= _month(end_date))
+        & (ds.field("created_at") >= pa.scalar(start_date, pa.timestamp("us")))
+        & (ds.field("created_at") <= pa.scalar(end_date, pa.timestamp("us")))
+    )
+    if vehicle_ids:
+        condition &= ds.field("vehicle_id").isin([str(vehicle_id) for vehicle_id in vehicle_ids])
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+def snapshot_covers(end_date, snapshot_dir=BOOKING_SNAPSHOT_DIR):
+    """True nếu snapshot đã có mọi đơn tạo tới end_date."""
+    covered_until = _read_state(snapshot_dir).get("covered_until")
+    return covered_until is not None and end_date <= covered_until
+
+def snapshot_booking_statistics(start_date, end_date, vehicle_ids=None, snapshot_dir=BOOKING_SNAPSHOT_DIR, unit="month"):
+    """Số liệu thống kê đơn đặt xe tính bằng pandas từ snapshot, cùng dạng kết quả với booking_statistics."""
+    frame = load_bookings_snapshot(
+        start_date, end_date, vehicle_ids, snapshot_dir,
+        columns=["user_id", "license_plate", "total_price", "payment_status", "created_at"]
+    )
+    series = densify_frame(
+        pd.DataFrame({"bucket": frame["created_at"], "revenue": frame["total_price"], "count": 1}),
+        start_date, end_date, unit, SERIES_FIELDS
+    )
+    if frame.empty:
+        return {"total_bookings": 0, "revenue": 0, "total_customers": 0, "series": series, "payment_status": [], "vehicle_revenue": []}
+
+    vehicle_revenue = frame.dropna(subset=["license_plate"]).groupby("license_plate")["total_price"].sum().sort_values(ascending=False)
+    return {
+        "total_bookings": len(frame),
+        "revenue": float(frame["total_price"].sum()),
+        "total_customers": int(frame["user_id"].nunique()),
+        "series": series,
+        "payment_status": [{"_id": status, "count": int(count)} for status, count in frame["payment_status"].value_counts().items()],
+        "vehicle_revenue": [{"_id": plate, "total_revenue": float(total)} for plate, total in vehicle_revenue.items()]
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Xuất bookings ra snapshot Parquet chia theo tháng.")
+    parser.add_argument("--dir", default=BOOKING_SNAPSHOT_DIR, help="Thư mục snapshot")
+    parser.add_argument("--full", action="store_true", help="Xóa snapshot cũ và xuất lại toàn bộ")
+    parser.add_argument("--batch-size", type=int, default=SNAPSHOT_BATCH_SIZE, help="Số đơn mỗi record batch")
+    args = parser.parse_args()
+    result = export_bookings_snapshot(args.dir, full=args.full, batch_size=args.batch_size)
+    print(f"Đã xuất {result['rows']} đơn, mốc mới: {result['watermark']}")
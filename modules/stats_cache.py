@@ -0,0 +1,109 @@
+import streamlit as st
+from config import STATS_CACHE_TTL_SECONDS, STATS_CACHE_MAX_ENTRIES
+from collections import OrderedDict
+import datetime
+import logging
+import threading
+import time
+from modules.booking_stats import BOOKING_STATS_VERSION, FLEET_STATUS_VERSION, booking_statistics
+from modules.utilization import fleet_utilization
+from modules.vehicle_catalog import VEHICLE_VERSION
+from modules.versions import get_versions
+
+logger = logging.getLogger(__name__)
+
+# Các bộ đếm phiên bản mà số liệu đơn đặt xe phụ thuộc vào
+BOOKING_STATS_VERSIONS = (BOOKING_STATS_VERSION,)
+# Số liệu theo trạng thái đơn, ngày thuê và trạng thái xe (mức độ sử dụng xe, báo cáo Excel) còn phụ thuộc vào các bộ đếm này
+FLEET_VERSIONS = (BOOKING_STATS_VERSION, FLEET_STATUS_VERSION, VEHICLE_VERSION)
+
+class StatisticsCache:
+    """
+    Bộ nhớ đệm kết quả thống kê đơn đặt xe dùng chung cho mọi phiên trong một tiến trình, theo bộ lọc đã chuẩn hóa.
+    Mỗi kết quả được giữ tối đa ttl giây và chỉ dùng lại khi các bộ đếm phiên bản nó phụ thuộc (mặc định "booking_stats")
+    chưa đổi, nên đơn mới hoặc đơn vừa sửa ở bất kỳ tiến trình nào đều làm kết quả cũ hết hiệu lực.
+    Các kết quả trả về được dùng chung giữa các phiên nên không được sửa trực tiếp.
+    """
+
+    def __init__(self, ttl=STATS_CACHE_TTL_SECONDS, max_entries=STATS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # khóa -> (phiên bản, thời điểm tính, kết quả), theo thứ tự dùng gần nhất
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute, versions=BOOKING_STATS_VERSIONS):
+        """Kết quả đã lưu của key nếu còn hiệu lực, ngược lại gọi compute() và lưu lại."""
+        version = get_versions(versions)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, computed_at, value = entry
+                if entry_version == version and time.monotonic() - computed_at < self.ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+                if entry_version != version:
+                    self.invalidations += 1
+                else:
+                    self.expirations += 1
+            self.misses += 1
+
+        # Tính ngoài khóa để các bộ lọc khác không phải chờ
+        value = compute()
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Số liệu hoạt động của bộ nhớ đệm."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl
+            }
+
+@st.cache_resource
+def get_statistics_cache():
+    """Bộ nhớ đệm thống kê dùng chung cho mọi phiên trong tiến trình."""
+    return StatisticsCache()
+
+def statistics_cache_key(start_date, end_date, vehicle_ids=None, today=None):
+    """Khóa chuẩn hóa của một bộ lọc: khoảng ngày, danh sách xe không phân biệt thứ tự chọn, và ngày hiện tại."""
+    today = today or datetime.date.today()
+    vehicles = tuple(sorted(str(vehicle_id) for vehicle_id in vehicle_ids or ()))
+    return (start_date.date(), end_date.date(), vehicles, today)
+
+def cached_booking_statistics(start_date, end_date, vehicle_ids=None, today=None):
+    """booking_statistics qua bộ nhớ đệm dùng chung."""
+    key = statistics_cache_key(start_date, end_date, vehicle_ids, today)
+    return get_statistics_cache().get_or_compute(key, lambda: booking_statistics(start_date, end_date, vehicle_ids, today=today))
+
+def cached_fleet_utilization(start_date, end_date, vehicle_ids=None, today=None):
+    """
+    fleet_utilization qua bộ nhớ đệm dùng chung (khóa riêng, không trùng với khóa của booking_statistics).
+    Kết quả hết hiệu lực cả khi trạng thái đơn, ngày thuê hoặc danh sách xe thay đổi.
+    """
+    key = ("utilization",) + statistics_cache_key(start_date, end_date, vehicle_ids, today)
+    return get_statistics_cache().get_or_compute(key, lambda: fleet_utilization(start_date, end_date, vehicle_ids), FLEET_VERSIONS)
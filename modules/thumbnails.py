@@ -0,0 +1,263 @@
+from config import THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_BYTES
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+import base64
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Kích thước cố định (rộng, cao) của ảnh thu nhỏ
+THUMBNAIL_SIZE = (160, 120)
+# Ảnh gốc lớn hơn giới hạn này không được xử lý
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT_SECONDS = 5
+# Ảnh lỗi (link hỏng, không phải ảnh) chỉ được thử lại sau khoảng thời gian này
+FAILED_RETRY_SECONDS = 600
+# Số process tạo ảnh thu nhỏ ở nền cho các trang đang hiển thị
+BACKGROUND_WORKERS = 2
+
+def read_source(source):
+    """Đọc nội dung ảnh gốc từ URL http(s) hoặc đường dẫn trên máy."""
+    if source.startswith(("http://", "https://")):
+        response = requests.get(source, timeout=FETCH_TIMEOUT_SECONDS, stream=True)
+        response.raise_for_status()
+        content = response.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+    else:
+        with open(source, "rb") as file:
+            content = file.read(MAX_SOURCE_BYTES + 1)
+    if len(content) > MAX_SOURCE_BYTES:
+        raise ValueError(f"Ảnh lớn hơn {MAX_SOURCE_BYTES} byte")
+    return content
+
+def make_thumbnail(content, size=THUMBNAIL_SIZE):
+    """Tạo ảnh thu nhỏ JPEG đúng kích thước size (cắt giữa ảnh nếu khác tỉ lệ)."""
+    with Image.open(io.BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        thumbnail = ImageOps.fit(image, size, Image.LANCZOS)
+    output = io.BytesIO()
+    thumbnail.save(output, "JPEG", quality=85, optimize=True)
+    return output.getvalue()
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, path)
+
+class ThumbnailCache:
+    """
+    Bộ nhớ đệm ảnh thu nhỏ trên đĩa, đánh địa chỉ theo nội dung:
+    objects/<sha256 của ảnh gốc>.jpg chứa ảnh thu nhỏ, sources/<sha256 của link ảnh> trỏ tới ảnh đó,
+    nên nhiều xe dùng cùng một ảnh chỉ tốn một file. Vượt dung lượng thì xóa các ảnh lâu không dùng nhất
+    (thời điểm dùng gần nhất lưu trong mtime của file).
+    """
+
+    def __init__(self, cache_dir=THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_CACHE_MAX_BYTES, size=THUMBNAIL_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = size
+        self._lock = threading.Lock()
+        self._failed = {}  # link ảnh -> thời điểm lỗi gần nhất
+        self._total_bytes = None
+
+    def _size_tag(self):
+        return f"{self.size[0]}x{self.size[1]}"
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, "objects", digest[:2], f"{digest}.jpg")
+
+    def _pointer_path(self, source):
+        key = hashlib.sha256(f"{source}|{self._size_tag()}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "sources", key[:2], key)
+
+    def cached_path(self, source):
+        """Đường dẫn ảnh thu nhỏ đã có của source (đồng thời đánh dấu vừa được dùng), hoặc None; không tải ảnh."""
+        source = (source or "").strip()
+        if not source:
+            return None
+        try:
+            with open(self._pointer_path(source), encoding="utf-8") as file:
+                path = self._object_path(file.read().strip())
+            os.utime(path)
+            return path
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def mark_failed(self, source):
+        self._failed[source] = time.monotonic()
+
+    def recently_failed(self, source):
+        """True nếu source vừa lỗi và chưa tới lúc thử lại."""
+        failed_at = self._failed.get(source)
+        return failed_at is not None and time.monotonic() - failed_at < FAILED_RETRY_SECONDS
+
+    def path_for(self, source):
+        """Đường dẫn ảnh thu nhỏ của source, tạo mới ở lần đầu; None nếu không có ảnh hoặc ảnh lỗi."""
+        source = (source or "").strip()
+        if not source:
+            return None
+        path = self.cached_path(source)
+        if path:
+            return path
+        if self.recently_failed(source):
+            return None
+
+        try:
+            content = read_source(source)
+            digest = hashlib.sha256(content + self._size_tag().encode("utf-8")).hexdigest()
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                data = make_thumbnail(content, self.size)
+                _write_atomic(path, data)
+                self._track_write(len(data))
+            _write_atomic(self._pointer_path(source), digest.encode("utf-8"))
+            self._failed.pop(source, None)
+            return path
+        except Exception as e:
+            self.mark_failed(source)
+            logger.warning(f"Không tạo được ảnh thu nhỏ cho {source}: {e}")
+            return None
+
+    def _scan_objects(self, kind="objects"):
+        entries = []
+        for root, _, files in os.walk(os.path.join(self.cache_dir, kind)):
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        return entries
+
+    def _track_write(self, size):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(entry[1] for entry in self._scan_objects())
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Xóa ảnh dùng lâu nhất cho tới khi còn dưới 90% dung lượng cho phép (gọi khi đang giữ khóa)."""
+        entries = sorted(self._scan_objects())
+        total = sum(entry[1] for entry in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                pass
+        self._total_bytes = total
+        pointers = self._evict_pointers()
+        logger.info(f"Đã xóa {removed} ảnh thu nhỏ cũ và {pointers} file trỏ tới chúng, bộ nhớ đệm còn {total} byte.")
+
+    def _evict_pointers(self):
+        """Xóa các file trong sources/ trỏ tới ảnh không còn tồn tại (gọi khi đang giữ khóa)."""
+        removed = 0
+        for _, _, path in self._scan_objects("sources"):
+            try:
+                with open(path, encoding="utf-8") as file:
+                    target = self._object_path(file.read().strip())
+                if not os.path.exists(target):
+                    os.remove(path)
+                    removed += 1
+            except (FileNotFoundError, ValueError):
+                pass
+        return removed
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_thumbnail_cache():
+    """Bộ nhớ đệm ảnh thu nhỏ dùng chung trong tiến trình."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ThumbnailCache()
+        return _default_cache
+
+_background_pool = None
+_pending = set()
+_pending_lock = threading.Lock()
+
+def get_thumbnail_pool():
+    """Process pool dùng chung để tạo ảnh thu nhỏ ở nền, tạo ở lần dùng đầu tiên."""
+    global _background_pool
+    with _pending_lock:
+        if _background_pool is None:
+            _background_pool = ProcessPoolExecutor(max_workers=BACKGROUND_WORKERS)
+        return _background_pool
+
+def _finish_request(source, future):
+    with _pending_lock:
+        _pending.discard(source)
+    if future.exception() is not None or not future.result():
+        get_thumbnail_cache().mark_failed(source)
+
+def request_thumbnail(source):
+    """Xếp việc tạo ảnh thu nhỏ của source vào process pool nền (mỗi link chỉ xếp một lần cùng lúc)."""
+    source = (source or "").strip()
+    if not source or get_thumbnail_cache().recently_failed(source):
+        return
+    with _pending_lock:
+        if source in _pending:
+            return
+        _pending.add(source)
+    try:
+        future = get_thumbnail_pool().submit(_warm_one, source)
+    except Exception as e:
+        with _pending_lock:
+            _pending.discard(source)
+        logger.warning(f"Không xếp được việc tạo ảnh thu nhỏ cho {source}: {e}")
+        return
+    future.add_done_callback(lambda done: _finish_request(source, done))
+
+def thumbnail_path(source):
+    """
+    Đường dẫn ảnh thu nhỏ đã có của link ảnh xe, hoặc None.
+    Không tải ảnh trong lúc vẽ trang: ảnh chưa có được tạo ở nền và hiện ra ở lần tải trang sau.
+    """
+    path = get_thumbnail_cache().cached_path(source)
+    if path is None:
+        request_thumbnail(source)
+    return path
+
+def thumbnail_data_uri(source):
+    """Ảnh thu nhỏ dạng data URI để hiển thị trong cột ảnh của bảng, hoặc None nếu chưa có."""
+    path = thumbnail_path(source)
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as file:
+            return "data:image/jpeg;base64," + base64.b64encode(file.read()).decode("ascii")
+    except FileNotFoundError:
+        return None
+
+def _warm_one(source):
+    return get_thumbnail_cache().path_for(source) is not None
+
+def warm_thumbnails(sources, executor=None, max_workers=None):
+    """
+    Tạo sẵn ảnh thu nhỏ cho nhiều link ảnh song song trong một process pool (dùng khi nhập xe hàng loạt).
+    Trả về số ảnh đã sẵn sàng.
+    """
+    sources = sorted({source.strip() for source in sources if source and source.strip()})
+    if not sources:
+        return 0
+    if executor is not None:
+        return sum(executor.map(_warm_one, sources, chunksize=8))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return sum(pool.map(_warm_one, sources, chunksize=8))
@@ -0,0 +1,98 @@
+from pymongo.errors import PyMongoError
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Các chu kỳ gom nhóm được hỗ trợ và tần suất pandas tương ứng (tuần bắt đầu từ thứ Hai, giống $dateTrunc)
+TIME_UNITS = {"day": "D", "week": "W-SUN", "month": "M"}
+# $densify có từ MongoDB 5.1, $fill từ 5.3
+DENSIFY_MIN_VERSION = (5, 3)
+
+_densify_support = {}
+
+def supports_densify(database):
+    """True nếu máy chủ MongoDB hỗ trợ $densify và $fill (kết quả được nhớ theo từng client)."""
+    client = database.client
+    if id(client) not in _densify_support:
+        try:
+            version = tuple(client.server_info()["versionArray"][:2])
+        except (PyMongoError, KeyError) as e:
+            logger.warning(f"Không đọc được phiên bản MongoDB, dùng pandas để điền chu kỳ trống: {e}")
+            version = (0, 0)
+        _densify_support[id(client)] = version >= DENSIFY_MIN_VERSION
+    return _densify_support[id(client)]
+
+def bucket_start(value, unit):
+    """Thời điểm bắt đầu của chu kỳ chứa value."""
+    return pd.Timestamp(value).to_period(TIME_UNITS[unit]).start_time
+
+def densify_frame(frame, start, end, unit, value_fields):
+    """
+    Gom các dòng của frame (cột "bucket" là thời điểm) theo chu kỳ rồi reindex trên mọi chu kỳ trong [start, end],
+    chu kỳ không có dữ liệu nhận giá trị 0. Trả về DataFrame gồm cột "bucket" (đầu chu kỳ) và các cột value_fields.
+    """
+    freq = TIME_UNITS[unit]
+    periods = pd.period_range(pd.Timestamp(start).to_period(freq), pd.Timestamp(end).to_period(freq), freq=freq)
+    if frame.empty:
+        sums = pd.DataFrame(0, index=periods, columns=list(value_fields))
+    else:
+        sums = frame.groupby(pd.to_datetime(frame["bucket"]).dt.to_period(freq))[list(value_fields)].sum()
+    dense = sums.reindex(periods, fill_value=0)
+    dense.index = dense.index.start_time.rename("bucket")
+    return dense.reset_index()
+
+def _densify_stages(date_field, start, end, unit, sums):
+    """Gom nhóm bằng $dateTrunc rồi điền chu kỳ trống bằng $densify/$fill ngay trên MongoDB."""
+    truncate = {"date": f"${date_field}", "unit": unit}
+    if unit == "week":
+        truncate["startOfWeek"] = "monday"
+    # Cận trên của $densify không được tính nên lấy đầu chu kỳ ngay sau end
+    upper = (pd.Timestamp(end).to_period(TIME_UNITS[unit]) + 1).start_time
+    return [
+        {"$group": {"_id": {"$dateTrunc": truncate}, **{field: {"$sum": expression} for field, expression in sums.items()}}},
+        {"$project": {"_id": 0, "bucket": "$_id", **{field: 1 for field in sums}}},
+        {"$densify": {"field": "bucket", "range": {
+            "step": 1,
+            "unit": unit,
+            "bounds": [bucket_start(start, unit).to_pydatetime(), upper.to_pydatetime()]
+        }}},
+        {"$fill": {"output": {field: {"value": 0} for field in sums}}},
+        {"$sort": {"bucket": 1}}
+    ]
+
+def _daily_stages(date_field, sums):
+    """Gom nhóm theo ngày cho máy chủ cũ; việc gộp theo chu kỳ và điền chu kỳ trống do pandas làm."""
+    return [
+        {"$group": {
+            "_id": {"$dateFromParts": {
+                "year": {"$year": f"${date_field}"},
+                "month": {"$month": f"${date_field}"},
+                "day": {"$dayOfMonth": f"${date_field}"}
+            }},
+            **{field: {"$sum": expression} for field, expression in sums.items()}
+        }},
+        {"$project": {"_id": 0, "bucket": "$_id", **{field: 1 for field in sums}}}
+    ]
+
+def time_buckets(collection, match, date_field, start, end, unit="month", sums=None):
+    """
+    Chuỗi thời gian đầy đủ theo ngày, tuần hoặc tháng của các document khớp match (match cần giới hạn date_field
+    trong [start, end]). sums là {tên cột: biểu thức $sum}, mặc định đếm số document.
+    Trả về DataFrame gồm cột "bucket" và các cột của sums, có mặt mọi chu kỳ kể cả chu kỳ không có dữ liệu.
+    """
+    if unit not in TIME_UNITS:
+        raise ValueError(f"Chu kỳ không hợp lệ: {unit}")
+    sums = sums or {"count": 1}
+    if supports_densify(collection.database):
+        stages = _densify_stages(date_field, start, end, unit, sums)
+    else:
+        stages = _daily_stages(date_field, sums)
+    rows = list(collection.aggregate([{"$match": match}, *stages]))
+    return densify_frame(pd.DataFrame(rows, columns=["bucket", *sums]), start, end, unit, list(sums))
+
+def combine_series(frames, start, end, unit, value_fields):
+    """Cộng nhiều chuỗi thời gian (ví dụ từ nhiều nguồn dữ liệu) thành một chuỗi đầy đủ."""
+    frames = [frame for frame in frames if not frame.empty]
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["bucket", *value_fields])
+    return densify_frame(frame, start, end, unit, value_fields)
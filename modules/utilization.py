@@ -0,0 +1,102 @@
+from config import db
+import numpy as np
+import pandas as pd
+import datetime
+import logging
+from modules.availability import build_occupancy, load_booking_intervals
+from modules.vehicle import normalize_brand
+
+logger = logging.getLogger(__name__)
+
+# Số ngày cao điểm của cả đội xe được trả về
+PEAK_DAYS_LIMIT = 5
+
+def _to_date(value):
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+def idle_streaks(occupancy):
+    """
+    Chuỗi ngày trống dài nhất và chuỗi ngày trống tính tới cuối cửa sổ của từng xe.
+    Tìm điểm đầu/cuối của mọi chuỗi trống bằng np.diff trên ma trận đã đệm thêm cột, không lặp theo ngày.
+    """
+    num_vehicles, num_days = occupancy.shape
+    longest = np.zeros(num_vehicles, dtype=np.int64)
+    if num_days == 0:
+        return longest, longest.copy()
+
+    idle = np.zeros((num_vehicles, num_days + 2), dtype=np.int8)
+    idle[:, 1:-1] = ~occupancy
+    edges = np.diff(idle, axis=1)
+    # np.nonzero duyệt theo hàng nên điểm bắt đầu và kết thúc của cùng một chuỗi đứng cùng vị trí
+    start_rows, start_cols = np.nonzero(edges == 1)
+    _, end_cols = np.nonzero(edges == -1)
+    np.maximum.at(longest, start_rows, end_cols - start_cols)
+
+    # Ngày chiếm dụng cuối cùng của mỗi xe (-1 nếu trống cả cửa sổ)
+    last_busy = np.where(occupancy.any(axis=1), num_days - 1 - np.argmax(occupancy[:, ::-1], axis=1), -1)
+    trailing = num_days - 1 - last_busy
+    return longest, trailing
+
+def fleet_utilization(start_date, end_date, vehicle_ids=None):
+    """
+    Mức độ sử dụng đội xe trong [start_date, end_date], tính từ một ma trận chiếm dụng xe × ngày.
+    Các khoảng thuê được tải bằng một truy vấn; mọi số liệu sau đó là phép toán vector trên ma trận.
+    Trả về {"vehicles", "brands", "peak_days"} là các DataFrame:
+    - vehicles: license_plate, brand, busy_days, utilization (%), longest_idle, trailing_idle
+    - brands: brand, vehicles, busy_days, utilization (%), peak_day, peak_in_use
+    - peak_days: day, in_use, utilization (%) của các ngày có nhiều xe được thuê nhất
+    """
+    window_start, window_end = _to_date(start_date), _to_date(end_date)
+    num_days = max((window_end - window_start).days + 1, 0)
+
+    query = {"_id": {"$in": list(vehicle_ids)}} if vehicle_ids else {}
+    vehicles = list(db.vehicles.find(query, {"brand": 1, "license_plate": 1}))
+    ids = [vehicle["_id"] for vehicle in vehicles]
+
+    intervals = load_booking_intervals(window_start, window_end, ids)
+    occupancy = build_occupancy(ids, intervals, window_start, num_days)
+
+    busy_days = occupancy.sum(axis=1)
+    utilization = busy_days / num_days * 100 if num_days else np.zeros(len(ids))
+    longest_idle, trailing_idle = idle_streaks(occupancy)
+    vehicle_df = pd.DataFrame({
+        "license_plate": [vehicle.get("license_plate") for vehicle in vehicles],
+        "brand": [(vehicle.get("brand") or "").strip() for vehicle in vehicles],
+        "busy_days": busy_days,
+        "utilization": utilization,
+        "longest_idle": longest_idle,
+        "trailing_idle": trailing_idle
+    }).sort_values("utilization", ascending=False, ignore_index=True)
+
+    # Cộng các hàng của ma trận theo thương hiệu (không phân biệt hoa thường) để có số xe đang thuê mỗi ngày
+    brand_labels = {}
+    for vehicle in vehicles:
+        brand_labels.setdefault(normalize_brand(vehicle.get("brand")), (vehicle.get("brand") or "").strip())
+    brand_codes, brand_keys = pd.factorize(pd.Series([normalize_brand(vehicle.get("brand")) for vehicle in vehicles], dtype=object))
+    brand_daily = np.zeros((len(brand_keys), num_days), dtype=np.int64)
+    np.add.at(brand_daily, brand_codes, occupancy)
+    brand_sizes = np.bincount(brand_codes, minlength=len(brand_keys))
+    brand_busy = brand_daily.sum(axis=1)
+    has_days = num_days > 0
+    brand_peak = brand_daily.argmax(axis=1) if has_days else np.zeros(len(brand_keys), dtype=np.int64)
+    brand_df = pd.DataFrame({
+        "brand": [brand_labels[key] for key in brand_keys],
+        "vehicles": brand_sizes,
+        "busy_days": brand_busy,
+        "utilization": brand_busy / (brand_sizes * num_days) * 100 if has_days else np.zeros(len(brand_keys)),
+        "peak_day": [window_start + datetime.timedelta(days=int(offset)) if has_days else None for offset in brand_peak],
+        "peak_in_use": brand_daily.max(axis=1) if has_days else np.zeros(len(brand_keys), dtype=np.int64)
+    }).sort_values("utilization", ascending=False, ignore_index=True)
+
+    # Ngày cao điểm của cả đội xe
+    in_use = occupancy.sum(axis=0)
+    top = np.argsort(-in_use, kind="stable")[:PEAK_DAYS_LIMIT]
+    top = top[in_use[top] > 0]
+    peak_df = pd.DataFrame({
+        "day": [window_start + datetime.timedelta(days=int(offset)) for offset in top],
+        "in_use": in_use[top],
+        "utilization": in_use[top] / len(ids) * 100 if ids else np.zeros(len(top))
+    })
+
+    logger.info(f"Tính mức độ sử dụng của {len(ids)} xe trong {num_days} ngày từ {len(intervals)} khoảng thuê.")
+    return {"vehicles": vehicle_df, "brands": brand_df, "peak_days": peak_df}
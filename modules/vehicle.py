@@ -7,7 +7,15 @@ import os
 import json
 import logging
 import datetime
-from utils import sanitize_input
+import re
+from utils import sanitize_input, search_keys
+from indexes import ensure_collection_indexes
+from modules.availability import get_busy_vehicle_ids
+from modules.paginated_table import paginated_table
+from modules.search_index import get_search_index
+from modules.vehicle_catalog import get_vehicle_catalog, invalidate_vehicle_catalog
+from modules.thumbnails import thumbnail_data_uri, thumbnail_path
+from models.vehicle_model import LICENSE_TYPES
 
 logger = logging.getLogger(__name__)
 
@@ -82,19 +90,75 @@ def initialize_vehicle_data():
                     "required_license_type": "B2"
                 }
             ]
-            db.vehicles.insert_many(sample_vehicles)
+            db.vehicles.insert_many([with_search_fields(vehicle) for vehicle in sample_vehicles])
+            get_search_index.clear()
+            invalidate_vehicle_catalog()
             st.success("Khởi tạo dữ liệu xe thành công!")
         # else:
             # st.info("Dữ liệu xe đã tồn tại.")
 
-        # Tạo index duy nhất cho trường license_plate để đảm bảo không có biển số trùng
-        db.vehicles.create_index([("license_plate", pymongo.ASCENDING)], unique=True)
-        # Cũng nên tạo index cho các trường thường xuyên được query
-        db.vehicles.create_index([("brand", pymongo.ASCENDING)])
-        db.vehicles.create_index([("price_per_day", pymongo.ASCENDING)])
+        ensure_vehicle_indexes()
     except ServerSelectionTimeoutError:
         st.warning("Không thể kết nối tới MongoDB. Vui lòng kiểm tra kết nối mạng.")
 
+def normalize_brand(brand):
+    """Chuẩn hóa thương hiệu để tìm kiếm theo tiền tố không phân biệt chữ hoa chữ thường."""
+    return (brand or "").strip().lower()
+
+def vehicle_search_keys(vehicle):
+    """Khóa tìm kiếm theo tiền tố của một xe: biển số, thương hiệu và mẫu xe."""
+    return search_keys(vehicle.get("license_plate"), vehicle.get("brand"), vehicle.get("model"))
+
+def with_search_fields(vehicle):
+    """Bổ sung các trường phục vụ tìm kiếm (brand_normalized, search_keys) trước khi ghi xe vào MongoDB."""
+    vehicle["brand_normalized"] = normalize_brand(vehicle.get("brand"))
+    vehicle["search_keys"] = vehicle_search_keys(vehicle)
+    return vehicle
+
+def backfill_vehicle_search_fields():
+    """Điền brand_normalized và search_keys cho các xe cũ chưa có các trường này."""
+    missing = {"$or": [{"brand_normalized": {"$exists": False}}, {"search_keys": {"$exists": False}}]}
+    operations = [
+        pymongo.UpdateOne({"_id": vehicle["_id"]}, {"$set": {
+            "brand_normalized": normalize_brand(vehicle.get("brand")),
+            "search_keys": vehicle_search_keys(vehicle)
+        }})
+        for vehicle in db.vehicles.find(missing, {"brand": 1, "model": 1, "license_plate": 1})
+    ]
+    if operations:
+        db.vehicles.bulk_write(operations, ordered=False)
+        logger.info(f"Đã bổ sung trường tìm kiếm cho {len(operations)} xe.")
+    return len(operations)
+
+@st.cache_resource
+def ensure_vehicle_indexes():
+    """
+    Tạo index khai báo trong indexes.py cho vehicles và bổ sung trường tìm kiếm cho xe cũ
+    (chỉ chạy một lần mỗi tiến trình).
+    """
+    ensure_collection_indexes(db, "vehicles")
+    backfill_vehicle_search_fields()
+    return True
+
+def fetch_vehicle_page(after_id, limit):
+    """Lấy một trang xe sắp xếp theo _id giảm dần, bắt đầu sau after_id."""
+    query = {"_id": {"$lt": after_id}} if after_id is not None else {}
+    vehicles = list(db.vehicles.find(query).sort("_id", pymongo.DESCENDING).limit(limit))
+    return vehicles, db.vehicles.estimated_document_count()
+
+def _vehicle_table_row(vehicle):
+    """Chuyển một xe thành một dòng của bảng quản lý (ảnh thu nhỏ chỉ được tạo cho các dòng của trang đang xem)."""
+    return {
+        "Ảnh": thumbnail_data_uri(vehicle.get("image")),
+        "Thương Hiệu": vehicle["brand"],
+        "Mẫu Xe": vehicle["model"],
+        "Biển Số": vehicle["license_plate"],
+        "Năm Sản Xuất": vehicle["year"],
+        "Giá (USD/ngày)": vehicle["price_per_day"],
+        "Hạng Bằng Lái": vehicle.get("required_license_type", ""),
+        "Trạng Thái": vehicle.get("status", "")
+    }
+
 def manage_vehicles():
     st.subheader("Quản Lý Xe")
     
@@ -131,7 +195,8 @@ def manage_vehicles():
                 if existing_vehicle:
                     st.error(f"Xe với biển số {license_plate} đã tồn tại!")
                 else:
-                    db.vehicles.insert_one(vehicle_data)
+                    db.vehicles.insert_one(with_search_fields(vehicle_data))
+                    get_search_index().upsert(vehicle_data, version=invalidate_vehicle_catalog())
                     st.success("Xe đã được thêm thành công!")
                     st.rerun()  # Làm mới giao diện sau khi thêm xe
             except DuplicateKeyError:
@@ -139,24 +204,23 @@ def manage_vehicles():
             except ServerSelectionTimeoutError:
                 st.warning("Không thể kết nối đến MongoDB. Vui lòng thử lại sau!")
 
-    # Hiển thị danh sách xe và thêm nút xóa/chỉnh sửa trong một hàng
+    # Hiển thị danh sách xe theo trang, chọn một dòng để chỉnh sửa hoặc xóa
     st.subheader("Danh Sách Xe")
     try:
-        vehicles = db.vehicles.find({})
-        for vehicle in vehicles:
-            # Sử dụng các cột để hiển thị thông tin và các nút trên cùng một hàng
-            cols = st.columns([3, 1, 1, 1])  # Chia layout thành 4 cột với các kích thước khác nhau
+        vehicle = paginated_table(
+            "manage_vehicles", fetch_vehicle_page, _vehicle_table_row,
+            empty_message="Chưa có xe nào.",
+            column_config={"Ảnh": st.column_config.ImageColumn("Ảnh")}
+        )
+        if vehicle is not None:
+            st.write(f"Đã chọn: {vehicle['brand']} {vehicle['model']} (Biển số: {vehicle['license_plate']})")
+            cols = st.columns([1, 1, 2])
             with cols[0]:
-                # Thay thế bằng:
-                vehicle_data = vehicle
-                st.write(f"{vehicle_data['brand']} {vehicle_data['model']} (Biển số: {vehicle_data['license_plate']}), Năm sản xuất: {vehicle_data['year']}, Giá: {vehicle_data['price_per_day']} USD/ngày, Hạng Bằng Lái: {vehicle_data['required_license_type']}")
-
-            with cols[1]:
                 # Nút chỉnh sửa xe
                 if st.button(f"Chỉnh Sửa", key=f"edit_{vehicle['_id']}"):
                     st.session_state['editing_vehicle_id'] = str(vehicle["_id"])
 
-            with cols[2]:
+            with cols[1]:
                 # Nút xóa xe
                 if st.button(f"Xóa", key=f"delete_{vehicle['_id']}"):
                     try:
@@ -166,6 +230,7 @@ def manage_vehicles():
                             st.error("Không thể xóa xe đang được thuê hoặc đã được đặt.")
                         else:
                             db.vehicles.delete_one({"_id": vehicle["_id"]})
+                            get_search_index().remove(vehicle["_id"], version=invalidate_vehicle_catalog())
                             st.success(f"Xe {vehicle['brand']} {vehicle['model']} đã bị xóa.")
                             st.rerun()
                     except Exception as e:
@@ -181,6 +246,10 @@ def manage_vehicles():
                 st.error("Không tìm thấy xe để chỉnh sửa.")
                 st.session_state['editing_vehicle_id'] = None
 
+        # Số liệu bộ nhớ đệm danh mục xe dùng chung của tiến trình
+        with st.expander("Bộ nhớ đệm danh mục xe"):
+            st.json(get_vehicle_catalog().stats())
+
     except ServerSelectionTimeoutError:
         st.error("Không thể kết nối tới MongoDB!")
 
@@ -212,19 +281,20 @@ def edit_vehicle(vehicle):
                 st.error(f"Xe với biển số {new_license_plate} đã tồn tại!")
             else:
                 # Cập nhật thông tin xe trong cơ sở dữ liệu
-                result = db.vehicles.update_one(
-                    {"_id": vehicle["_id"]},
-                    {"$set": {
-                        "brand": new_brand,
-                        "model": new_model,
-                        "license_plate": new_license_plate.strip(),
-                        "price_per_day": new_price_per_day,
-                        "year": new_year,
-                        "image": new_image,
-                        "required_license_type": new_required_license_type
-                    }}
-                )
+                updates = {
+                    "brand": new_brand,
+                    "brand_normalized": normalize_brand(new_brand),
+                    "model": new_model,
+                    "license_plate": new_license_plate.strip(),
+                    "price_per_day": new_price_per_day,
+                    "year": new_year,
+                    "image": new_image,
+                    "required_license_type": new_required_license_type
+                }
+                updates["search_keys"] = vehicle_search_keys(updates)
+                result = db.vehicles.update_one({"_id": vehicle["_id"]}, {"$set": updates})
                 if result.modified_count > 0:
+                    get_search_index().upsert({**vehicle, **updates}, version=invalidate_vehicle_catalog())
                     st.success("Thông tin xe đã được cập nhật thành công!")
                 else:
                     st.info("Không có thay đổi nào được thực hiện.")
@@ -235,30 +305,231 @@ def edit_vehicle(vehicle):
         except ServerSelectionTimeoutError:
             st.warning("Không thể kết nối đến MongoDB. Vui lòng thử lại sau!")
 
+# Các trường hiển thị trong kết quả tìm kiếm
+VEHICLE_SEARCH_PROJECTION = {
+    "brand": 1,
+    "model": 1,
+    "license_plate": 1,
+    "year": 1,
+    "price_per_day": 1,
+    "required_license_type": 1,
+    "image": 1
+}
+
+# Số xe mỗi trang kết quả tìm kiếm
+SEARCH_PAGE_SIZE = 10
+# Số kết quả tối đa của tìm kiếm gần đúng
+FUZZY_SEARCH_LIMIT = 20
+
+# Các mốc chia nhóm giá (USD/ngày) và năm sản xuất cho phần đếm số xe theo bộ lọc
+PRICE_FACET_BOUNDARIES = [0, 50, 100, 200, 300, 500]
+YEAR_FACET_BOUNDARIES = [1900, 2010, 2015, 2020]
+MIN_SEARCH_YEAR = 1990
+# Số thương hiệu nhiều xe nhất được hiển thị kèm số lượng
+BRAND_FACET_LIMIT = 10
+# Thời gian (giây) giữ kết quả tìm kiếm theo bộ lọc
+FACET_CACHE_TTL_SECONDS = 30
+
+def build_vehicle_search_query(brand_prefix, min_price=None, max_price=None, exclude_ids=None):
+    """
+    Dựng điều kiện tìm xe theo tiền tố thương hiệu và khoảng giá.
+    Regex neo đầu chuỗi trên brand_normalized (đã viết thường) nên MongoDB quét theo khoảng trên index.
+    """
+    query = {}
+    if min_price is not None and max_price is not None:
+        query["price_per_day"] = {"$gte": min_price, "$lte": max_price}
+    prefix = normalize_brand(brand_prefix)
+    if prefix:
+        query["brand_normalized"] = {"$regex": "^" + re.escape(prefix)}
+    if exclude_ids:
+        query["_id"] = {"$nin": list(exclude_ids)}
+    return query
+
+def vehicle_search_cursor(brand_prefix, min_price, max_price, exclude_ids=None):
+    """Cursor tìm xe (chỉ lấy các trường hiển thị), sắp xếp theo đúng thứ tự của index tìm kiếm."""
+    query = build_vehicle_search_query(brand_prefix, min_price, max_price, exclude_ids)
+    return db.vehicles.find(query, VEHICLE_SEARCH_PROJECTION).sort([
+        ("brand_normalized", pymongo.ASCENDING),
+        ("price_per_day", pymongo.ASCENDING),
+        ("_id", pymongo.ASCENDING)
+    ])
+
+def find_vehicles(brand_prefix, min_price, max_price, exclude_ids=None, page=0, page_size=SEARCH_PAGE_SIZE):
+    """Trả về (danh sách xe của trang page, còn trang sau hay không)."""
+    cursor = vehicle_search_cursor(brand_prefix, min_price, max_price, exclude_ids)
+    vehicles = list(cursor.skip(page * page_size).limit(page_size + 1))
+    return vehicles[:page_size], len(vehicles) > page_size
+
+def _bucket_label(bucket_id, boundaries):
+    """Nhãn của một nhóm trong $bucket: "50-99", "500+" cho mốc cuối, "Khác" cho xe thiếu dữ liệu."""
+    if bucket_id == boundaries[-1]:
+        return f"{bucket_id}+"
+    if bucket_id in boundaries:
+        return f"{bucket_id}-{boundaries[boundaries.index(bucket_id) + 1] - 1}"
+    return "Khác"
+
+def faceted_vehicle_search(brand_prefix, price_range, license_types=(), year_range=None, exclude_ids=None, page=0, page_size=SEARCH_PAGE_SIZE):
+    """
+    Trả về trang kết quả và số xe theo từng thương hiệu, hạng bằng lái, nhóm giá, nhóm năm sản xuất
+    bằng một truy vấn $facet duy nhất.
+    Số đếm của mỗi bộ lọc tính theo các bộ lọc còn lại (bỏ qua chính nó) để người dùng thấy nếu đổi lựa chọn
+    ở bộ lọc đó thì còn bao nhiêu xe. Tiền tố thương hiệu và danh sách xe bận được lọc trước $facet để dùng index.
+    """
+    conditions = {"price": {"price_per_day": {"$gte": price_range[0], "$lte": price_range[1]}}}
+    if license_types:
+        conditions["license"] = {"required_license_type": {"$in": list(license_types)}}
+    if year_range is not None:
+        conditions["year"] = {"year": {"$gte": year_range[0], "$lte": year_range[1]}}
+
+    def match_except(skipped=None):
+        query = {}
+        for name, condition in conditions.items():
+            if name != skipped:
+                query.update(condition)
+        return {"$match": query}
+
+    # Mốc cuối là nhóm mở ("500+"); xe thiếu dữ liệu rơi vào nhóm "unknown"
+    def bucket(field, boundaries):
+        return {"$bucket": {"groupBy": f"${field}", "boundaries": boundaries + [10 ** 9], "default": "unknown"}}
+
+    pipeline = [
+        {"$match": build_vehicle_search_query(brand_prefix, exclude_ids=exclude_ids)},
+        {"$facet": {
+            "results": [
+                match_except(),
+                {"$sort": {"brand_normalized": 1, "price_per_day": 1, "_id": 1}},
+                {"$skip": page * page_size},
+                {"$limit": page_size + 1},
+                {"$project": VEHICLE_SEARCH_PROJECTION}
+            ],
+            "total": [match_except(), {"$count": "count"}],
+            "brand": [
+                match_except(),
+                {"$group": {"_id": "$brand_normalized", "brand": {"$first": "$brand"}, "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": BRAND_FACET_LIMIT}
+            ],
+            "license": [match_except("license"), {"$group": {"_id": "$required_license_type", "count": {"$sum": 1}}}],
+            "price": [match_except("price"), bucket("price_per_day", PRICE_FACET_BOUNDARIES)],
+            "year": [match_except("year"), bucket("year", YEAR_FACET_BOUNDARIES)]
+        }}
+    ]
+    facets = next(db.vehicles.aggregate(pipeline))
+
+    def bucket_counts(items, boundaries):
+        return [(_bucket_label(item["_id"], boundaries), item["count"]) for item in items]
+
+    vehicles = facets["results"]
+    return {
+        "vehicles": vehicles[:page_size],
+        "has_more": len(vehicles) > page_size,
+        "total": facets["total"][0]["count"] if facets["total"] else 0,
+        "brand": [(item["brand"], item["count"]) for item in facets["brand"]],
+        "license": {item["_id"]: item["count"] for item in facets["license"]},
+        "price": bucket_counts(facets["price"], PRICE_FACET_BOUNDARIES),
+        "year": bucket_counts(facets["year"], YEAR_FACET_BOUNDARIES)
+    }
+
+@st.cache_data(ttl=FACET_CACHE_TTL_SECONDS, max_entries=500, show_spinner=False)
+def cached_faceted_search(brand_prefix, price_range, license_types, year_range, start_date, end_date, page):
+    """faceted_vehicle_search cho một tổ hợp bộ lọc, giữ trong thời gian ngắn để các lần rerun không truy vấn lại."""
+    busy_vehicle_ids = get_busy_vehicle_ids(start_date, end_date)
+    return faceted_vehicle_search(brand_prefix, price_range, license_types, year_range, busy_vehicle_ids, page)
+
+def _format_counts(counts):
+    """Chuỗi "nhãn (số xe)" cho phần đếm bên dưới mỗi bộ lọc."""
+    return " · ".join(f"{label} ({count})" for label, count in counts) or "Không có xe phù hợp"
+
+def _render_search_result(vehicle_data):
+    """Hiển thị một xe trong kết quả tìm kiếm kèm ảnh thu nhỏ (nếu có)."""
+    col_image, col_text = st.columns([1, 4])
+    with col_image:
+        image_path = thumbnail_path(vehicle_data.get("image"))
+        if image_path:
+            st.image(image_path)
+    with col_text:
+        st.write(_format_search_result(vehicle_data))
+
+def _format_search_result(vehicle_data):
+    """Một dòng mô tả xe trong kết quả tìm kiếm."""
+    return f"{vehicle_data['brand']} {vehicle_data['model']} (Biển số: {vehicle_data['license_plate']}), Năm sản xuất: {vehicle_data['year']}, Giá: {vehicle_data['price_per_day']} USD/ngày, Hạng Bằng Lái: {vehicle_data.get('required_license_type', '')}"
+
 def search_vehicles():
     st.subheader("Tìm Kiếm Xe")
     try:
-        # Lọc theo thương hiệu và giá thuê xe
+        # Mỗi bộ lọc có một ô trống ngay bên dưới để hiển thị số xe sau khi truy vấn
         brand_filter = st.text_input("Tìm kiếm theo thương hiệu")
+        brand_counts = st.empty()
+        fuzzy_query = st.text_input("Tìm nhanh theo thương hiệu, mẫu xe, biển số hoặc năm (gõ sai chính tả vẫn tìm được)")
         price_filter = st.slider("Giá thuê mỗi ngày (USD)", 0, 500, (0, 500))
-        
-        # Truy vấn MongoDB với các bộ lọc
-        query = {}
-        if brand_filter:
-            query["brand"] = {"$regex": brand_filter, "$options": "i"}  # Tìm kiếm không phân biệt chữ hoa chữ thường
-        query["price_per_day"] = {"$gte": price_filter[0], "$lte": price_filter[1]}
-        
-        vehicles = db.vehicles.find(query)
-        
+        price_counts = st.empty()
+        license_filter = st.multiselect("Hạng bằng lái", LICENSE_TYPES)
+        license_counts = st.empty()
+        current_year = datetime.date.today().year
+        year_filter = st.slider("Năm sản xuất", MIN_SEARCH_YEAR, current_year, (MIN_SEARCH_YEAR, current_year))
+        year_counts = st.empty()
+        # Giữ nguyên khoảng năm mặc định thì không lọc, để không bỏ sót xe chưa có năm sản xuất
+        year_range = None if year_filter == (MIN_SEARCH_YEAR, current_year) else year_filter
+        col1, col2 = st.columns(2)
+        with col1:
+            start_date = st.date_input("Ngày nhận xe", datetime.date.today())
+        with col2:
+            end_date = st.date_input("Ngày trả xe", datetime.date.today())
+        if start_date > end_date:
+            st.error("Ngày trả xe không được trước ngày nhận xe.")
+            return
+
+        # Tìm gần đúng trên chỉ mục trong bộ nhớ, kết quả đã xếp hạng nên không phân trang
+        if fuzzy_query.strip():
+            busy = set(get_busy_vehicle_ids(start_date, end_date))
+            vehicles = [
+                vehicle for vehicle in get_search_index().search(fuzzy_query, limit=FUZZY_SEARCH_LIMIT + len(busy))
+                if vehicle["_id"] not in busy
+                and price_filter[0] <= (vehicle.get("price_per_day") or 0) <= price_filter[1]
+                and (not license_filter or vehicle.get("required_license_type") in license_filter)
+                and (year_range is None or year_range[0] <= (vehicle.get("year") or 0) <= year_range[1])
+            ][:FUZZY_SEARCH_LIMIT]
+            st.write(f"Kết quả gần đúng cho: {fuzzy_query}")
+            if not vehicles:
+                st.info("Không tìm thấy xe phù hợp.")
+            for vehicle_data in vehicles:
+                _render_search_result(vehicle_data)
+            return
+
+        # Đổi bộ lọc thì quay về trang đầu
+        filters = (normalize_brand(brand_filter), tuple(price_filter), tuple(license_filter), year_range, start_date, end_date)
+        if st.session_state.get("vehicle_search_filters") != filters:
+            st.session_state["vehicle_search_filters"] = filters
+            st.session_state["vehicle_search_page"] = 0
+        page = st.session_state.get("vehicle_search_page", 0)
+
+        # Một truy vấn $facet trả về cả trang kết quả lẫn số xe theo từng bộ lọc
+        result = cached_faceted_search(*filters, page)
+        brand_counts.caption(_format_counts(result["brand"]))
+        price_counts.caption(_format_counts(result["price"]))
+        license_counts.caption(_format_counts([(license_type, result["license"][license_type]) for license_type in LICENSE_TYPES if license_type in result["license"]]))
+        year_counts.caption(_format_counts(result["year"]))
+
         # Hiển thị kết quả
-        st.write(f"Hiển thị kết quả cho thương hiệu: {brand_filter}, giá từ {price_filter[0]} đến {price_filter[1]} USD/ngày")
-        for vehicle in vehicles:
-            # Thay thế bằng:
-            vehicle_data = db.vehicles.find_one({"_id": vehicle["_id"]})
-
-            # Chỉ hiển thị thông tin nếu có dữ liệu
-            if vehicle_data:
-                st.write(f"{vehicle_data['brand']} {vehicle_data['model']} (Biển số: {vehicle_data['license_plate']}), Năm sản xuất: {vehicle_data['year']}, Giá: {vehicle_data['price_per_day']} USD/ngày, Hạng Bằng Lái: {vehicle_data['required_license_type']}")
-    
+        vehicles = result["vehicles"]
+        st.write(f"Tìm thấy {result['total']} xe cho thương hiệu: {brand_filter}, giá từ {price_filter[0]} đến {price_filter[1]} USD/ngày")
+        if not vehicles:
+            st.info("Không tìm thấy xe phù hợp.")
+        for vehicle_data in vehicles:
+            _render_search_result(vehicle_data)
+
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            if st.button("Trang trước", key="vehicle_search_prev", disabled=page == 0):
+                st.session_state["vehicle_search_page"] = page - 1
+                st.rerun()
+        with col_page:
+            total_pages = max(1, (result["total"] + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE)
+            st.caption(f"Trang {page + 1}/{total_pages}")
+        with col_next:
+            if st.button("Trang sau", key="vehicle_search_next", disabled=not result["has_more"]):
+                st.session_state["vehicle_search_page"] = page + 1
+                st.rerun()
+
     except ServerSelectionTimeoutError:
         st.error("Không thể kết nối đến MongoDB. Vui lòng kiểm tra kết nối mạng.")
\ No newline at end of file
@@ -0,0 +1,202 @@
+import streamlit as st
+from config import db, VEHICLE_CATALOG_MAX_SIZE, VEHICLE_CATALOG_CHECK_SECONDS, VEHICLE_OPTION_LIMIT
+from collections import OrderedDict
+import logging
+import re
+import threading
+import time
+from modules.versions import bump_version, get_version
+from utils import normalize_search_term
+
+logger = logging.getLogger(__name__)
+
+# Tên bộ đếm phiên bản của danh mục xe
+VEHICLE_VERSION = "vehicles"
+
+# Các trường gọn của một xe được giữ trong danh mục (đủ cho ô chọn xe, tính giá và ảnh thu nhỏ)
+VEHICLE_CATALOG_PROJECTION = {
+    "brand": 1,
+    "model": 1,
+    "license_plate": 1,
+    "price_per_day": 1,
+    "year": 1,
+    "required_license_type": 1,
+    "image": 1
+}
+
+class VehicleCatalog:
+    """
+    Bộ nhớ đệm danh mục xe dùng chung cho mọi phiên trong một tiến trình.
+    Bị làm mới khi bộ đếm phiên bản "vehicles" thay đổi (kiểm tra tối đa mỗi check_interval giây),
+    hoặc ngay lập tức khi có change stream trên collection vehicles.
+    Các bản ghi trả về được dùng chung giữa các phiên nên không được sửa trực tiếp.
+    """
+
+    def __init__(self, max_size=VEHICLE_CATALOG_MAX_SIZE, check_interval=VEHICLE_CATALOG_CHECK_SECONDS):
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._records = OrderedDict()  # _id -> bản ghi, theo thứ tự dùng gần nhất
+        self._complete = False         # True khi _records chứa toàn bộ danh mục
+        self._oversized = False        # True khi danh mục đã biết là lớn hơn max_size (tới lần làm mới sau)
+        self._generation = 0           # Tăng mỗi lần xóa bộ nhớ đệm, để bỏ kết quả tải xong sau khi đã bị làm mới
+        self._version = None
+        self._checked_at = 0.0
+        self._watching = False
+        self.hits = 0
+        self.misses = 0
+        self.passthrough = 0
+        self.reloads = 0
+        self.invalidations = 0
+
+    def _clear(self):
+        self._records = OrderedDict()
+        self._complete = False
+        self._oversized = False
+        self._generation += 1
+        self.invalidations += 1
+
+    def _refresh_version(self):
+        """Xóa bộ nhớ đệm nếu phiên bản trên MongoDB đã đổi; truy vấn phiên bản chạy ngoài khóa."""
+        if self._watching:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+        version = get_version(VEHICLE_VERSION)
+        with self._lock:
+            # Phiên bản chỉ tăng: bỏ qua kết quả cũ hơn phiên bản đã biết (ví dụ vừa được invalidate đặt)
+            if self._version is None or version > self._version:
+                if self._version is not None:
+                    self._clear()
+                self._version = version
+
+    def invalidate(self, version=None):
+        """Bỏ toàn bộ dữ liệu đang giữ; lần đọc sau sẽ tải lại từ MongoDB."""
+        with self._lock:
+            self._clear()
+            if version is not None:
+                self._version = version
+                self._checked_at = time.monotonic()
+            else:
+                self._checked_at = 0.0
+
+    def all(self):
+        """
+        Toàn bộ danh mục xe (bản ghi gọn), hoặc None nếu danh mục lớn hơn max_size.
+        MongoDB được đọc ngoài khóa bằng một truy vấn giới hạn max_size + 1 xe rồi mới thay vào bộ nhớ đệm.
+        Khi danh mục quá lớn, cho tới lần làm mới sau không truy vấn lại: người gọi dùng search() hoặc get().
+        """
+        self._refresh_version()
+        with self._lock:
+            if self._complete:
+                self.hits += 1
+                return list(self._records.values())
+            if self._oversized:
+                self.passthrough += 1
+                return None
+            self.misses += 1
+            generation = self._generation
+
+        vehicles = list(db.vehicles.find({}, VEHICLE_CATALOG_PROJECTION).limit(self.max_size + 1))
+        with self._lock:
+            if len(vehicles) > self.max_size:
+                if generation == self._generation:
+                    logger.warning(f"Danh mục xe vượt quá {self.max_size} xe, không lưu vào bộ nhớ đệm.")
+                    self._oversized = True
+                return None
+            if generation != self._generation:
+                return vehicles  # Bộ nhớ đệm đã bị làm mới trong lúc tải: không giữ kết quả có thể đã cũ
+            self._records = OrderedDict((vehicle["_id"], vehicle) for vehicle in vehicles)
+            self._complete = True
+            self.reloads += 1
+        return vehicles
+
+    def search(self, search_term="", limit=VEHICLE_OPTION_LIMIT):
+        """
+        Tối đa limit xe (bản ghi gọn, theo _id) có biển số, hãng hoặc mẫu xe bắt đầu bằng search_term,
+        dùng cho ô chọn xe khi all() trả về None. Truy vấn theo trường search_keys có index.
+        """
+        term = normalize_search_term(search_term)
+        query = {"search_keys": {"$regex": f"^{re.escape(term)}"}} if term else {}
+        return list(db.vehicles.find(query, VEHICLE_CATALOG_PROJECTION).sort("_id", 1).limit(limit))
+
+    def get(self, vehicle_id):
+        """Bản ghi gọn của một xe, hoặc None nếu không tồn tại."""
+        if vehicle_id is None:
+            return None
+        self._refresh_version()
+        with self._lock:
+            vehicle = self._records.get(vehicle_id)
+            if vehicle is not None:
+                self.hits += 1
+                self._records.move_to_end(vehicle_id)
+                return vehicle
+            if self._complete:
+                self.hits += 1
+                return None
+            self.misses += 1
+            generation = self._generation
+
+        vehicle = db.vehicles.find_one({"_id": vehicle_id}, VEHICLE_CATALOG_PROJECTION)
+        with self._lock:
+            if vehicle is not None and generation == self._generation and not self._complete:
+                self._records[vehicle_id] = vehicle
+                if len(self._records) > self.max_size:
+                    self._records.popitem(last=False)
+        return vehicle
+
+    def stats(self):
+        """Số liệu hoạt động của bộ nhớ đệm."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "passthrough": self.passthrough,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "reloads": self.reloads,
+                "invalidations": self.invalidations,
+                "size": len(self._records),
+                "max_size": self.max_size,
+                "version": self._version,
+                "change_stream": self._watching
+            }
+
+    def watch_changes(self):
+        """
+        Theo dõi change stream của collection vehicles và làm mới danh mục ngay khi có thay đổi.
+        Chỉ chạy được trên replica set; nếu không được thì quay về kiểm tra bộ đếm phiên bản.
+        """
+        # Bỏ qua các cập nhật không chạm tới trường nào của danh mục (ví dụ đổi trạng thái thuê)
+        pipeline = [{"$match": {"$or": [{"operationType": {"$ne": "update"}}] + [
+            {f"updateDescription.updatedFields.{field}": {"$exists": True}}
+            for field in VEHICLE_CATALOG_PROJECTION
+        ]}}]
+        try:
+            with db.vehicles.watch(pipeline) as stream:
+                self._watching = True
+                self.invalidate()
+                logger.info("Danh mục xe đang theo dõi change stream của collection vehicles.")
+                for _ in stream:
+                    self.invalidate()
+        except Exception as e:
+            logger.info(f"Không dùng được change stream cho danh mục xe, chuyển sang kiểm tra phiên bản: {e}")
+        finally:
+            self._watching = False
+            self._checked_at = 0.0
+
+@st.cache_resource
+def get_vehicle_catalog():
+    """Danh mục xe dùng chung cho mọi phiên trong tiến trình."""
+    catalog = VehicleCatalog()
+    threading.Thread(target=catalog.watch_changes, name="vehicle-catalog-watch", daemon=True).start()
+    return catalog
+
+def invalidate_vehicle_catalog():
+    """Gọi sau khi thêm, sửa hoặc xóa xe: tăng phiên bản để mọi tiến trình làm mới danh mục. Trả về phiên bản mới."""
+    version = bump_version(VEHICLE_VERSION)
+    get_vehicle_catalog().invalidate(version)
+    return version
@@ -0,0 +1,222 @@
+import streamlit as st
+from config import db
+from pydantic import TypeAdapter, ValidationError
+from pymongo.errors import BulkWriteError
+from typing import List
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import datetime
+import io
+import itertools
+import logging
+import openpyxl
+from models.vehicle_model import VehicleModel
+from modules.search_index import get_search_index
+from modules.thumbnails import warm_thumbnails
+from modules.vehicle import ensure_vehicle_indexes, with_search_fields
+from modules.vehicle_catalog import invalidate_vehicle_catalog
+from utils import sanitize_input
+
+logger = logging.getLogger(__name__)
+
+# Số dòng được kiểm tra và ghi trong mỗi lô
+IMPORT_BATCH_SIZE = 1000
+# Số lỗi tối đa giữ lại để hiển thị (tổng số lỗi vẫn được đếm đủ)
+MAX_REPORTED_ERRORS = 1000
+
+# Tên cột được chấp nhận trong file, gồm cả tiêu đề tiếng Việt của bảng quản lý xe
+COLUMN_ALIASES = {
+    "brand": "brand",
+    "thương hiệu": "brand",
+    "model": "model",
+    "mẫu xe": "model",
+    "license_plate": "license_plate",
+    "biển số": "license_plate",
+    "biển số xe": "license_plate",
+    "price_per_day": "price_per_day",
+    "giá (usd/ngày)": "price_per_day",
+    "giá thuê mỗi ngày": "price_per_day",
+    "year": "year",
+    "năm sản xuất": "year",
+    "required_license_type": "required_license_type",
+    "hạng bằng lái": "required_license_type",
+    "image": "image",
+    "link ảnh xe": "image",
+}
+# Các trường chữ được làm sạch như form thêm xe (link ảnh giữ nguyên để không hỏng URL)
+TEXT_FIELDS = ("brand", "model", "license_plate")
+
+_vehicle_list_adapter = TypeAdapter(List[VehicleModel])
+
+def _normalize_header(header):
+    """Đổi tiêu đề cột trong file thành tên trường của VehicleModel (None nếu không dùng)."""
+    return COLUMN_ALIASES.get(str(header or "").strip().lower())
+
+def _iter_csv_rows(file):
+    """Đọc lần lượt từng dòng của file CSV mà không nạp cả file thành danh sách."""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        headers = [_normalize_header(header) for header in next(reader, [])]
+        for values in reader:
+            yield dict(zip(headers, values))
+    finally:
+        text.detach()
+
+def _iter_xlsx_rows(file):
+    """Đọc lần lượt từng dòng của sheet đầu tiên trong file Excel ở chế độ chỉ đọc."""
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [_normalize_header(header) for header in next(rows, [])]
+        for values in rows:
+            yield dict(zip(headers, values))
+    finally:
+        workbook.close()
+
+def _estimate_total_rows(file, filename):
+    """Ước lượng số dòng dữ liệu để hiển thị tiến độ (None nếu không biết)."""
+    if filename.lower().endswith(".xlsx"):
+        workbook = openpyxl.load_workbook(file, read_only=True)
+        try:
+            max_row = workbook.active.max_row
+        finally:
+            workbook.close()
+            file.seek(0)
+        return max_row - 1 if max_row else None
+    return None
+
+def _clean_row(row):
+    """Bỏ cột không dùng và ô trống, làm sạch các trường chữ."""
+    cleaned = {}
+    for field, value in row.items():
+        if field is None or value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if field in TEXT_FIELDS:
+            value = sanitize_input(str(value).strip())
+        elif field == "image":
+            value = str(value).strip()
+        elif isinstance(value, str):
+            value = value.strip()
+        cleaned[field] = value
+    return cleaned
+
+def validate_batch(rows, first_row_number):
+    """
+    Kiểm tra một lô dòng với VehicleModel trong một lần gọi.
+    Trả về (danh sách (số dòng, document), danh sách (số dòng, lỗi)).
+    """
+    cleaned = [_clean_row(row) for row in rows]
+    invalid = {}
+    try:
+        vehicles = _vehicle_list_adapter.validate_python(cleaned)
+        valid_positions = range(len(cleaned))
+    except ValidationError as e:
+        for error in e.errors():
+            position, *field = error["loc"]
+            invalid.setdefault(position, f"{'.'.join(map(str, field))}: {error['msg']}")
+        valid_positions = [position for position in range(len(cleaned)) if position not in invalid]
+        vehicles = _vehicle_list_adapter.validate_python([cleaned[position] for position in valid_positions])
+
+    now = datetime.datetime.now()
+    valid = [
+        (first_row_number + position, with_search_fields({**vehicle.model_dump(), "created_at": now}))
+        for position, vehicle in zip(valid_positions, vehicles)
+    ]
+    errors = [(first_row_number + position, message) for position, message in sorted(invalid.items())]
+    return valid, errors
+
+def insert_batch(valid):
+    """
+    Ghi một lô xe bằng insert_many(ordered=False); biển số trùng (kể cả trùng trong cùng file)
+    được lấy từ lỗi của lần ghi hàng loạt thay vì kiểm tra từng dòng trước.
+    Trả về (số xe đã ghi, danh sách (số dòng, biển số trùng), danh sách (số dòng, lỗi khác)).
+    """
+    if not valid:
+        return 0, [], []
+    row_numbers = [row_number for row_number, _ in valid]
+    try:
+        result = db.vehicles.insert_many([document for _, document in valid], ordered=False)
+        return len(result.inserted_ids), [], []
+    except BulkWriteError as e:
+        duplicates, failures = [], []
+        for error in e.details.get("writeErrors", []):
+            row_number = row_numbers[error["index"]]
+            if error.get("code") == 11000:
+                duplicates.append((row_number, error["op"].get("license_plate")))
+            else:
+                failures.append((row_number, error.get("errmsg", "Lỗi ghi dữ liệu")))
+        return e.details.get("nInserted", 0), duplicates, failures
+
+def import_vehicles(file, filename, batch_size=IMPORT_BATCH_SIZE, on_progress=None, thumbnail_executor=None):
+    """
+    Nhập xe từ file CSV hoặc XLSX theo từng lô: đọc dần từng dòng, kiểm tra cả lô với VehicleModel
+    rồi ghi cả lô một lần, nên bộ nhớ chỉ phụ thuộc batch_size chứ không phụ thuộc kích thước file.
+    on_progress(số dòng đã xử lý, tỉ lệ hoàn thành hoặc None) được gọi sau mỗi lô.
+    Nếu có thumbnail_executor (process pool), ảnh thu nhỏ của các xe trong lô được tạo sẵn song song.
+    """
+    total_rows = _estimate_total_rows(file, filename)
+    rows = _iter_xlsx_rows(file) if filename.lower().endswith(".xlsx") else _iter_csv_rows(file)
+    ensure_vehicle_indexes()  # Cần index duy nhất trên license_plate để phát hiện biển số trùng
+
+    report = {"processed": 0, "inserted": 0, "thumbnails": 0, "duplicate_count": 0, "invalid_count": 0, "duplicates": [], "invalid": []}
+    next_row_number = 2  # Dòng 1 là tiêu đề
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        valid, invalid = validate_batch(batch, next_row_number)
+        inserted, duplicates, failures = insert_batch(valid)
+        invalid += failures
+        if thumbnail_executor is not None:
+            report["thumbnails"] += warm_thumbnails([document.get("image") for _, document in valid], executor=thumbnail_executor)
+        next_row_number += len(batch)
+
+        report["processed"] += len(batch)
+        report["inserted"] += inserted
+        report["duplicate_count"] += len(duplicates)
+        report["invalid_count"] += len(invalid)
+        report["duplicates"].extend(duplicates[:MAX_REPORTED_ERRORS - len(report["duplicates"])])
+        report["invalid"].extend(invalid[:MAX_REPORTED_ERRORS - len(report["invalid"])])
+        if on_progress:
+            on_progress(report["processed"], report["processed"] / total_rows if total_rows else None)
+
+    if report["inserted"]:
+        invalidate_vehicle_catalog()
+        get_search_index.clear()
+    logger.info(f"Nhập xe từ {filename}: {report['inserted']}/{report['processed']} dòng, {report['duplicate_count']} biển số trùng, {report['invalid_count']} dòng lỗi.")
+    return report
+
+def vehicle_import_form():
+    st.subheader("Nhập Xe Hàng Loạt")
+    st.caption("File CSV hoặc Excel có dòng tiêu đề gồm các cột: brand, model, license_plate, price_per_day, year, required_license_type, image (hoặc tiêu đề tiếng Việt như bảng quản lý xe).")
+    uploaded_file = st.file_uploader("Chọn file CSV hoặc Excel", type=["csv", "xlsx"])
+    prepare_thumbnails = st.checkbox("Tạo sẵn ảnh thu nhỏ cho các xe có ảnh", value=False)
+
+    if uploaded_file is not None and st.button("Nhập Dữ Liệu"):
+        progress_bar = st.progress(0.0, text="Đang nhập dữ liệu...")
+
+        def show_progress(processed, fraction):
+            progress_bar.progress(min(fraction, 1.0) if fraction is not None else 0.0, text=f"Đã xử lý {processed} dòng")
+
+        try:
+            if prepare_thumbnails:
+                with ProcessPoolExecutor() as pool:
+                    report = import_vehicles(uploaded_file, uploaded_file.name, on_progress=show_progress, thumbnail_executor=pool)
+            else:
+                report = import_vehicles(uploaded_file, uploaded_file.name, on_progress=show_progress)
+        except Exception as e:
+            st.error(f"Không đọc được file: {e}")
+            logger.error(f"Lỗi khi nhập xe từ {uploaded_file.name}: {e}")
+            return
+
+        progress_bar.progress(1.0, text=f"Đã xử lý {report['processed']} dòng")
+        st.success(f"Đã thêm {report['inserted']} / {report['processed']} xe.")
+        if prepare_thumbnails:
+            st.info(f"Đã tạo sẵn {report['thumbnails']} ảnh thu nhỏ.")
+        if report["duplicate_count"]:
+            st.warning(f"{report['duplicate_count']} dòng bị bỏ qua vì biển số đã tồn tại.")
+            st.dataframe([{"Dòng": row, "Biển Số": plate} for row, plate in report["duplicates"]], hide_index=True)
+        if report["invalid_count"]:
+            st.warning(f"{report['invalid_count']} dòng không hợp lệ.")
+            st.dataframe([{"Dòng": row, "Lỗi": message} for row, message in report["invalid"]], hide_index=True)
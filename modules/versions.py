@@ -0,0 +1,23 @@
+from config import db
+from pymongo import ReturnDocument
+
+# Bộ đếm phiên bản của từng loại dữ liệu, dùng để các tiến trình biết khi nào cần làm mới bộ nhớ đệm
+def bump_version(name):
+    """Tăng phiên bản của name và trả về giá trị mới."""
+    document = db.versions.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"value": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return document["value"]
+
+def get_version(name):
+    """Phiên bản hiện tại của name (0 nếu chưa từng thay đổi)."""
+    document = db.versions.find_one({"_id": name})
+    return document["value"] if document else 0
+
+def get_versions(names):
+    """Phiên bản hiện tại của nhiều bộ đếm bằng một truy vấn, theo đúng thứ tự của names."""
+    values = {document["_id"]: document["value"] for document in db.versions.find({"_id": {"$in": list(names)}})}
+    return tuple(values.get(name, 0) for name in names)
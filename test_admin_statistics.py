@@ -0,0 +1,33 @@
+import datetime
+import pytest
+from modules.admin import compare_statistics_timing, vehicle_statistics
+
+
+pytestmark = pytest.mark.mock_db("modules.admin", "modules.booking_stats")
+
+
+def test_vehicle_statistics_come_from_one_facet(mock_db):
+    mock_db.vehicles.insert_many([
+        {"license_plate": "51A-1", "status": "available"},
+        {"license_plate": "51A-2", "status": "rented"},
+        {"license_plate": "51A-3", "status": "available"},
+    ])
+
+    vehicles = vehicle_statistics()
+
+    assert vehicles["total_vehicles"] == 3
+    assert {item["_id"]: item["count"] for item in vehicles["status"]} == {"available": 2, "rented": 1}
+
+
+def test_vehicle_statistics_without_vehicles(mock_db):
+    assert vehicle_statistics() == {"total_vehicles": 0, "status": []}
+
+
+def test_compare_statistics_timing_runs_legacy_and_current_queries(mock_db):
+    vehicle_id = mock_db.vehicles.insert_one({"license_plate": "51A-1", "status": "available"}).inserted_id
+    mock_db.bookings.insert_one({"vehicle_id": vehicle_id, "user_id": "u1", "total_price": 10, "payment_status": "paid",
+                                 "created_at": datetime.datetime(2024, 1, 5)})
+
+    timing = compare_statistics_timing(datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 31), [vehicle_id])
+
+    assert timing["legacy_ms"] >= 0 and timing["current_ms"] >= 0
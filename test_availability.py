@@ -0,0 +1,55 @@
+import pytest
+import datetime
+from bson import ObjectId
+from modules.availability import build_occupancy, find_conflicting_booking, get_busy_vehicle_ids, get_fleet_availability, match_string_dates
+
+
+pytestmark = pytest.mark.mock_db("modules.availability")
+
+
+def test_build_occupancy_clips_to_window():
+    vehicle_ids = ["a", "b"]
+    intervals = [
+        ("a", "2023-12-30", "2024-01-02"),  # Bắt đầu trước cửa sổ
+        ("b", "2024-01-04", "2024-01-20"),  # Kết thúc sau cửa sổ
+        ("c", "2024-01-01", "2024-01-05"),  # Xe không thuộc danh sách
+    ]
+    occupancy = build_occupancy(vehicle_ids, intervals, datetime.date(2024, 1, 1), 5)
+
+    assert occupancy.tolist() == [
+        [True, True, False, False, False],
+        [False, False, False, True, True],
+    ]
+
+
+def test_get_fleet_availability_free_vehicles_and_first_free_date(mock_db):
+    busy, partly_busy, free = ObjectId(), ObjectId(), ObjectId()
+    mock_db.vehicles.insert_many([{"_id": busy}, {"_id": partly_busy}, {"_id": free}])
+    mock_db.bookings.insert_many([
+        {"vehicle_id": busy, "status": "pending", "start_date": datetime.datetime(2024, 1, 1), "end_date": datetime.datetime(2024, 1, 10)},
+        {"vehicle_id": partly_busy, "status": "confirmed", "start_date": datetime.datetime(2024, 1, 1), "end_date": datetime.datetime(2024, 1, 2)},
+        {"vehicle_id": free, "status": "cancelled", "start_date": datetime.datetime(2024, 1, 1), "end_date": datetime.datetime(2024, 1, 10)},
+    ])
+
+    result = get_fleet_availability(datetime.date(2024, 1, 1), datetime.date(2024, 1, 5))
+
+    assert result["free_vehicle_ids"] == [free]
+    assert result["first_free_date"][busy] is None
+    assert result["first_free_date"][partly_busy] == datetime.date(2024, 1, 3)
+    assert result["first_free_date"][free] == datetime.date(2024, 1, 1)
+
+
+def test_string_dated_bookings_still_conflict(mock_db, monkeypatch):
+    monkeypatch.setattr("modules.availability._match_string_dates", True)
+    vehicle_id = ObjectId()
+    mock_db.bookings.insert_one({"vehicle_id": vehicle_id, "status": "confirmed", "start_date": "2024-01-05T00:00:00", "end_date": "2024-01-07"})
+
+    # Ngày cuối và ngày đầu của khoảng đều được tính, kể cả khi chuỗi có kèm giờ
+    assert find_conflicting_booking(vehicle_id, datetime.date(2024, 1, 1), datetime.date(2024, 1, 5)) is not None
+    assert find_conflicting_booking(vehicle_id, datetime.date(2024, 1, 7), datetime.date(2024, 1, 9)) is not None
+    assert find_conflicting_booking(vehicle_id, datetime.date(2024, 1, 8), datetime.date(2024, 1, 9)) is None
+    assert get_busy_vehicle_ids(datetime.date(2024, 1, 6), datetime.date(2024, 1, 6)) == [vehicle_id]
+
+    # Sau khi xác nhận không còn ngày dạng chuỗi thì chỉ so sánh ngày BSON
+    match_string_dates(False)
+    assert find_conflicting_booking(vehicle_id, datetime.date(2024, 1, 1), datetime.date(2024, 1, 5)) is None
@@ -0,0 +1,48 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import pytest
+from bson import ObjectId
+from modules.booking_export import EXPORT_COLUMNS, export_bookings
+
+
+pytestmark = pytest.mark.mock_db("modules.booking_export")
+
+
+@pytest.fixture
+def mock_db(mock_db):
+    """Cơ sở dữ liệu giả lập dùng chung, có sẵn một khách hàng, một xe và năm đơn đặt xe."""
+    test_db = mock_db
+    user_id, vehicle_id = ObjectId(), ObjectId()
+    test_db.users.insert_one({"_id": user_id, "full_name": "Nguyễn Văn A", "email": "a@example.com", "password": "x"})
+    test_db.vehicles.insert_one({"_id": vehicle_id, "brand": "Toyota", "model": "Camry", "license_plate": "51A-1"})
+    test_db.bookings.insert_many([
+        {"user_id": user_id, "vehicle_id": vehicle_id, "total_price": 10 * i, "payment_status": "paid", "status": "completed",
+         "start_date": datetime.datetime(2024, 1, i + 1), "end_date": datetime.datetime(2024, 1, i + 2), "created_at": datetime.datetime(2024, 1, i + 1, 9)}
+        for i in range(5)
+    ])
+    return test_db
+
+
+def test_csv_export_streams_joined_rows_in_batches(mock_db):
+    chunks = list(export_bookings("csv", batch_size=2))
+
+    # Tiêu đề + 3 lô (2, 2, 1 đơn)
+    assert len(chunks) == 4
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode("utf-8-sig"))))
+    assert list(rows[0]) == EXPORT_COLUMNS
+    assert len(rows) == 5
+    assert (rows[1]["customer_name"], rows[1]["license_plate"], rows[1]["start_date"], rows[1]["total_price"]) == ("Nguyễn Văn A", "51A-1", "2024-01-02", "10")
+
+
+def test_gzip_ndjson_export_with_filter(mock_db):
+    data = b"".join(export_bookings("ndjson", compress=True, query={"total_price": {"$gte": 30}}))
+
+    records = [json.loads(line) for line in gzip.decompress(data).decode("utf-8").splitlines()]
+    assert [record["total_price"] for record in records] == [30, 40]
+    assert records[0]["customer_email"] == "a@example.com"
+    assert records[0]["created_at"] == "2024-01-04T09:00:00"
+    with pytest.raises(ValueError):
+        export_bookings("xml")
@@ -0,0 +1,95 @@
+import datetime
+import pytest
+from bson import ObjectId
+from modules.booking import build_booking_search_filter, fetch_user_bookings, search_bookings
+from modules.vehicle import with_search_fields
+from utils import search_keys
+
+
+pytestmark = pytest.mark.mock_db("modules.booking")
+
+
+def make_bookings(db):
+    alice, bob = ObjectId(), ObjectId()
+    db.users.insert_many([
+        {"_id": alice, "full_name": "Nguyễn Văn An", "email": "an@example.com", "search_keys": search_keys("Nguyễn Văn An", "an@example.com")},
+        {"_id": bob, "full_name": "Trần Bình", "email": "binh@example.com", "search_keys": search_keys("Trần Bình", "binh@example.com")},
+    ])
+    camry, vios = ObjectId(), ObjectId()
+    db.vehicles.insert_many([
+        with_search_fields({"_id": camry, "brand": "Toyota", "model": "Camry", "license_plate": "51A-111"}),
+        with_search_fields({"_id": vios, "brand": "Honda", "model": "City", "license_plate": "30B-222"}),
+    ])
+    day = datetime.datetime(2024, 3, 1)
+    bookings = [
+        {"user_id": alice, "vehicle_id": camry, "status": "confirmed", "payment_status": "paid"},
+        {"user_id": alice, "vehicle_id": vios, "status": "cancelled", "payment_status": "refunded"},
+        {"user_id": bob, "vehicle_id": vios, "status": "pending", "payment_status": "pending"},
+    ]
+    ids = db.bookings.insert_many([
+        {**booking, "start_date": day, "end_date": day, "total_price": 10} for booking in bookings
+    ]).inserted_ids
+    return ids, alice, camry
+
+
+def matched(db, search_term, **kwargs):
+    search_filter, _ = build_booking_search_filter(search_term, **kwargs)
+    return sorted(booking["_id"] for booking in db.bookings.find(search_filter))
+
+
+def test_search_filter_matches_customers_vehicles_and_payment_status(mock_db):
+    ids, _, _ = make_bookings(mock_db)
+
+    assert build_booking_search_filter("   ") == ({}, False)
+    # Mọi trường khớp theo tiền tố của từ (không phân biệt hoa thường, gộp khoảng trắng)
+    assert matched(mock_db, "VĂN  an") == sorted(ids[:2])
+    assert matched(mock_db, "an") == sorted(ids[:2])
+    assert matched(mock_db, "camry") == [ids[0]]
+    assert matched(mock_db, "BINH@Ex") == [ids[2]]
+    assert matched(mock_db, "example.com") == []
+    assert matched(mock_db, "30b") == sorted(ids[1:])
+    assert matched(mock_db, "TOYO") == [ids[0]]
+    # Trạng thái thanh toán chỉ khớp khi đúng bằng một trạng thái
+    assert matched(mock_db, "Refunded") == [ids[1]]
+    assert matched(mock_db, "pend") == []
+    # Ký tự đặc biệt của regex được thoát
+    assert matched(mock_db, ".*") == []
+
+
+def test_search_filter_bounds_matched_users_and_vehicles(mock_db, caplog):
+    mock_db.users.insert_many([{"full_name": f"Khách {i}", "search_keys": search_keys(f"Khách {i}")} for i in range(5)])
+    user_ids = [user["_id"] for user in mock_db.users.find()]
+
+    search_filter, truncated = build_booking_search_filter("khách", match_limit=3)
+
+    assert truncated
+    assert search_filter["$or"][0]["user_id"]["$in"] == user_ids[:3]
+    assert build_booking_search_filter("khách", match_limit=5)[1] is False
+    assert "chỉ dùng 3 document" in caplog.text
+
+
+def test_search_bookings_pages_by_id_with_total(mock_db):
+    ids, _, _ = make_bookings(mock_db)
+
+    first, total = search_bookings({}, limit=2)
+    assert total == 3
+    assert [booking["_id"] for booking in first] == [ids[2], ids[1]]
+    assert first[0]["customer"]["email"] == "binh@example.com" and first[0]["vehicle"]["license_plate"] == "30B-222"
+    rest, total = search_bookings({}, after_id=first[-1]["_id"], limit=2)
+    assert total == 3
+    assert [booking["_id"] for booking in rest] == [ids[0]]
+
+    filtered, total = search_bookings(build_booking_search_filter("an@")[0], limit=2)
+    assert total == 2 and [booking["_id"] for booking in filtered] == [ids[1], ids[0]]
+
+
+def test_fetch_user_bookings_splits_active_and_history(mock_db):
+    ids, alice, camry = make_bookings(mock_db)
+
+    active = fetch_user_bookings(alice, active=True)
+    history = fetch_user_bookings(alice, active=False)
+
+    assert [booking["_id"] for booking in active] == [ids[0]]
+    assert active[0]["vehicle"]["_id"] == camry and active[0]["vehicle"]["license_plate"] == "51A-111"
+    assert [booking["_id"] for booking in history] == [ids[1]]
+    assert fetch_user_bookings(alice, active=True, after_id=ids[0]) == []
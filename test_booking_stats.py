@@ -0,0 +1,85 @@
+import os
+import datetime
+import pytest
+import pymongo
+from bson import ObjectId
+from modules.booking_stats import FLEET_STATUS_VERSION, booking_statistics, record_booking_change, refresh_booking_daily_stats, update_booking
+from modules.versions import get_version
+
+TODAY = datetime.date(2024, 3, 10)
+
+
+pytestmark = pytest.mark.mock_db("modules.booking_stats")
+
+
+def make_bookings(db):
+    camry, vios = ObjectId(), ObjectId()
+    db.vehicles.insert_many([{"_id": camry, "license_plate": "51A-1"}, {"_id": vios, "license_plate": "51A-2"}])
+    alice, bob = ObjectId(), ObjectId()
+    bookings = [
+        {"_id": ObjectId(), "user_id": alice, "vehicle_id": camry, "total_price": 100, "payment_status": "pending", "created_at": datetime.datetime(2024, 2, 5, 9)},
+        {"_id": ObjectId(), "user_id": alice, "vehicle_id": vios, "total_price": 50, "payment_status": "pending", "created_at": datetime.datetime(2024, 3, 1, 10)},
+        {"_id": ObjectId(), "user_id": bob, "vehicle_id": camry, "total_price": 30, "payment_status": "paid", "created_at": datetime.datetime(2024, 3, 9, 23)},
+        # Ngoài khoảng lọc
+        {"_id": ObjectId(), "user_id": bob, "vehicle_id": vios, "total_price": 999, "payment_status": "paid", "created_at": datetime.datetime(2023, 1, 1)},
+    ]
+    for booking in bookings:
+        db.bookings.insert_one(booking)
+        record_booking_change(None, booking)
+    return bookings, camry
+
+
+def test_rollup_follows_booking_changes_and_today_comes_from_bookings(mock_db):
+    bookings, camry = make_bookings(mock_db)
+    # Thanh toán rồi sửa giá: phần của bản cũ được trừ khỏi bảng tổng hợp
+    update_booking(bookings[0]["_id"], {"payment_status": "paid"})
+    update_booking(bookings[0]["_id"], {"total_price": 120})
+    # Đơn tạo hôm nay chỉ có trong bookings (chưa vào bảng tổng hợp)
+    mock_db.bookings.insert_one({"user_id": ObjectId(), "vehicle_id": camry, "total_price": 10, "payment_status": "pending", "created_at": datetime.datetime(2024, 3, 10, 8)})
+
+    stats = booking_statistics(datetime.datetime(2024, 2, 1), datetime.datetime(2024, 3, 10, 23, 59), today=TODAY)
+
+    assert (stats["total_bookings"], stats["revenue"], stats["total_customers"]) == (4, 210, 3)
+    # Chuỗi theo tháng gồm cả phần từ bảng tổng hợp và phần của hôm nay
+    assert stats["series"][["revenue", "count"]].values.tolist() == [[120, 1], [90, 3]]
+    assert {item["_id"]: item["count"] for item in stats["payment_status"]} == {"paid": 2, "pending": 2}
+    assert stats["vehicle_revenue"] == [{"_id": "51A-1", "total_revenue": 160}, {"_id": "51A-2", "total_revenue": 50}]
+    # Lọc theo xe
+    only_camry = booking_statistics(datetime.datetime(2024, 2, 1), datetime.datetime(2024, 3, 9, 23, 59), [camry], today=TODAY)
+    assert (only_camry["total_bookings"], only_camry["total_customers"]) == (2, 2)
+
+
+def test_status_and_date_changes_bump_fleet_status_version(mock_db):
+    bookings, _ = make_bookings(mock_db)
+    update_booking(bookings[0]["_id"], {"payment_status": "paid"})
+    assert get_version(FLEET_STATUS_VERSION) == 0
+
+    update_booking(bookings[0]["_id"], {"status": "cancelled"})
+    update_booking(bookings[1]["_id"], {"end_date": datetime.datetime(2024, 3, 5)})
+    assert get_version(FLEET_STATUS_VERSION) == 2
+    # Đơn không tồn tại thì không tăng phiên bản
+    update_booking(ObjectId(), {"status": "cancelled"})
+    assert get_version(FLEET_STATUS_VERSION) == 2
+
+
+@pytest.mark.skipif(not os.getenv("MONGODB_TEST_URI"), reason="Cần MongoDB thật (MONGODB_TEST_URI) để chạy $merge")
+def test_refresh_repairs_drift(monkeypatch):
+    client = pymongo.MongoClient(os.environ["MONGODB_TEST_URI"])
+    test_db = client["test_booking_stats"]
+    monkeypatch.setattr("modules.booking_stats.db", test_db)
+    monkeypatch.setattr("modules.versions.db", test_db)
+    try:
+        test_db.booking_daily_stats.create_index([("day", 1), ("vehicle_id", 1), ("payment_status", 1)], unique=True)
+        bookings, _ = make_bookings(test_db)
+        expected = booking_statistics(datetime.datetime(2023, 1, 1), datetime.datetime(2024, 3, 9), today=TODAY)
+        # Làm lệch bảng tổng hợp: một dòng sai số và một dòng không còn đơn tương ứng
+        test_db.booking_daily_stats.update_many({}, {"$inc": {"count": 5}})
+        test_db.booking_daily_stats.insert_one({"day": datetime.datetime(2024, 3, 2), "vehicle_id": ObjectId(), "payment_status": "paid", "count": 1, "revenue": 1, "customers": {}, "refreshed_at": datetime.datetime(2000, 1, 1)})
+
+        refresh_booking_daily_stats(days=None, today=TODAY)
+
+        assert booking_statistics(datetime.datetime(2023, 1, 1), datetime.datetime(2024, 3, 9), today=TODAY) == expected
+        assert test_db.booking_daily_stats.count_documents({}) == len(bookings)
+    finally:
+        client.drop_database("test_booking_stats")
+        client.close()
@@ -0,0 +1,39 @@
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+from modules.crypto import CryptoService, reencrypt_users
+
+OLD_KEY, NEW_KEY = Fernet.generate_key(), Fernet.generate_key()
+
+
+pytestmark = pytest.mark.mock_db("modules.crypto")
+
+
+def test_new_primary_key_still_reads_old_tokens():
+    old = CryptoService([OLD_KEY])
+    rotating = CryptoService([NEW_KEY, OLD_KEY])
+    token = old.encrypt("hash")
+
+    assert rotating.decrypt(token) == "hash"
+    assert not rotating.is_current(token)
+    assert rotating.is_current(rotating.encrypt("hash"))
+    with pytest.raises(InvalidToken):
+        CryptoService([NEW_KEY]).decrypt(token)
+    with pytest.raises(ValueError):
+        CryptoService([])
+
+
+def test_reencrypt_users_in_batches_is_idempotent(mock_db):
+    old = CryptoService([OLD_KEY])
+    mock_db.users.insert_many([{"email": f"u{i}@example.com", "password": old.encrypt(f"hash-{i}")} for i in range(5)])
+    mock_db.users.insert_one({"email": "2fa@example.com", "password": old.encrypt("hash-2fa"), "2fa_secret": old.encrypt("SECRET")})
+    # Giá trị mã hóa bằng khóa không còn cấu hình thì được bỏ qua và đếm là lỗi
+    mock_db.users.insert_one({"email": "lost@example.com", "password": CryptoService([Fernet.generate_key()]).encrypt("x")})
+    rotating = CryptoService([NEW_KEY, OLD_KEY])
+
+    report = reencrypt_users(service=rotating, batch_size=2)
+
+    assert report == {"scanned": 7, "updated": 6, "failed": 1}
+    only_new = CryptoService([NEW_KEY])
+    user = mock_db.users.find_one({"email": "2fa@example.com"})
+    assert (only_new.decrypt(user["password"]), only_new.decrypt(user["2fa_secret"])) == ("hash-2fa", "SECRET")
+    assert reencrypt_users(service=rotating, batch_size=2)["updated"] == 0
@@ -0,0 +1,35 @@
+import logging
+import pytest
+import indexes
+from indexes import INDEX_SPECS, diff_indexes, ensure_indexes
+
+
+@pytest.fixture(autouse=True)
+def reset_ensured(monkeypatch):
+    monkeypatch.setattr(indexes, "_ensured", False)
+
+
+def test_diff_reports_missing_changed_and_extra_indexes(mock_db):
+    mock_db.vehicles.create_index([("license_plate", 1)])  # Thiếu unique
+    mock_db.vehicles.create_index([("brand", 1)])  # Không có trong khai báo
+
+    report = diff_indexes(mock_db, collections=["vehicles", "sessions"])
+
+    assert report["vehicles"]["different"] == ["license_plate_1"]
+    assert report["vehicles"]["extra"] == ["brand_1"]
+    assert "price_per_day_1" in report["vehicles"]["missing"]
+    assert report["sessions"] == {"missing": ["token_1"], "different": [], "extra": []}
+
+
+def test_ensure_indexes_creates_everything_once(mock_db, caplog):
+    with caplog.at_level(logging.WARNING, logger="indexes"):
+        assert ensure_indexes(mock_db) is True
+    assert "thiếu index" in caplog.text
+
+    assert diff_indexes(mock_db) == {}
+    assert mock_db.users.index_information()["email_1"]["unique"] is True
+    # Lần gọi sau trong cùng tiến trình không làm gì thêm
+    mock_db.sessions.drop_indexes()
+    assert ensure_indexes(mock_db) is False
+    assert set(diff_indexes(mock_db)) == {"sessions"}
+    assert set(INDEX_SPECS) >= {"users", "vehicles", "bookings", "vehicle_slots", "payment_cards", "sessions"}
@@ -0,0 +1,63 @@
+import pytest
+import datetime
+from bson import ObjectId
+from modules.migrate_booking_dates import ensure_booking_dates, migrate_booking_dates, MIGRATION_ID
+
+
+pytestmark = pytest.mark.mock_db("modules.migrate_booking_dates", "modules.availability")
+
+
+def test_migrate_booking_dates_converts_in_batches(mock_db):
+    mock_db.bookings.insert_many([
+        {"start_date": f"2024-01-{day:02}", "end_date": f"2024-01-{day + 1:02}", "vehicle_id": ObjectId()}
+        for day in range(1, 8)
+    ])
+    # Đơn đã ở dạng ngày BSON và đơn có ngày lỗi
+    mock_db.bookings.insert_one({"start_date": datetime.datetime(2024, 2, 1), "end_date": datetime.datetime(2024, 2, 2)})
+    mock_db.bookings.insert_one({"start_date": "không hợp lệ", "end_date": "2024-02-02"})
+
+    result = migrate_booking_dates(batch_size=3)
+
+    assert result == {"converted": 7, "skipped": 1}
+    first = mock_db.bookings.find_one({"start_date": datetime.datetime(2024, 1, 1)})
+    assert first["end_date"] == datetime.datetime(2024, 1, 2)
+    assert mock_db.migrations.find_one({"_id": MIGRATION_ID})["completed_at"] is not None
+
+
+def test_migrate_booking_dates_resumes_from_checkpoint(mock_db):
+    ids = mock_db.bookings.insert_many([
+        {"start_date": "2024-01-01", "end_date": "2024-01-02"} for _ in range(4)
+    ]).inserted_ids
+    # Giả lập lần chạy trước bị ngắt sau khi xử lý 2 đơn đầu
+    mock_db.migrations.insert_one({"_id": MIGRATION_ID, "last_id": ids[1], "converted": 2, "skipped": 0})
+
+    result = migrate_booking_dates(batch_size=10)
+
+    assert result["converted"] == 2
+    assert mock_db.bookings.count_documents({"start_date": {"$type": "string"}}) == 2
+
+
+def test_finished_run_clears_checkpoint_so_later_runs_rescan(mock_db):
+    older = ObjectId()
+    mock_db.bookings.insert_many([{"start_date": "2024-01-01", "end_date": "2024-01-02"} for _ in range(3)])
+    migrate_booking_dates(batch_size=2)
+    assert "last_id" not in mock_db.migrations.find_one({"_id": MIGRATION_ID})
+
+    # Đơn có _id nhỏ hơn (ví dụ khôi phục từ bản sao lưu) vẫn được chuyển đổi ở lần chạy sau
+    mock_db.bookings.insert_one({"_id": older, "start_date": "2024-03-01", "end_date": "2024-03-02"})
+    assert migrate_booking_dates(batch_size=2)["converted"] == 1
+    assert mock_db.bookings.find_one({"_id": older})["start_date"] == datetime.datetime(2024, 3, 1)
+
+
+def test_ensure_booking_dates_only_drops_string_matching_when_clean(mock_db, monkeypatch):
+    from modules import availability
+    monkeypatch.setattr(availability, "_match_string_dates", True)
+    mock_db.bookings.insert_one({"start_date": "2024-01-01", "end_date": "2024-01-02"})
+    bad_id = mock_db.bookings.insert_one({"start_date": "không hợp lệ", "end_date": "2024-01-02"}).inserted_id
+
+    assert ensure_booking_dates() is False
+    assert availability._match_string_dates is True
+
+    mock_db.bookings.delete_one({"_id": bad_id})
+    assert ensure_booking_dates() is True
+    assert availability._match_string_dates is False
@@ -0,0 +1,69 @@
+import datetime
+import pytest
+import openpyxl
+import pandas as pd
+from bson import ObjectId
+from modules.admin import STATISTICS_REPORT_SHEETS, export_to_excel
+from modules.reports import ReportWorker, report_key
+
+
+pytestmark = pytest.mark.mock_db("modules.admin")
+
+
+def sample_frames():
+    revenue_df = pd.DataFrame({"Tháng": ["2024-01", "2024-02"], "Doanh Thu (USD)": [100, 80]})
+    status_df = pd.DataFrame({"Trạng Thái": ["paid"], "Số Lượng": [2]})
+    vehicle_df = pd.DataFrame({"Biển Số": ["51A-1"], "Doanh Thu (USD)": [180]})
+    booking_count_df = pd.DataFrame({"Tháng": ["2024-01"], "Số Lượng Đơn": [2]})
+    payment_df = pd.DataFrame({"payment_status": ["paid"], "count": [2], "percentage": ["100.00%"]})
+    vehicle_status_df = pd.DataFrame({"Trạng Thái": ["available"], "Số Lượng": [3]})
+    return revenue_df, status_df, vehicle_df, booking_count_df, payment_df, vehicle_status_df
+
+
+def test_report_has_declared_sheets_and_streams_booking_details(mock_db, tmp_path):
+    vehicle_id = ObjectId()
+    mock_db.bookings.insert_many([
+        {"user_id": ObjectId(), "vehicle_id": vehicle_id, "total_price": 10 * i, "payment_status": "paid", "status": "completed", "created_at": datetime.datetime(2024, 1, i + 1)}
+        for i in range(3)
+    ])
+    path = str(tmp_path / "report.xlsx")
+
+    utilization_df = pd.DataFrame({"Biển Số": ["51A-1"], "Tỷ Lệ Sử Dụng (%)": [50.0]})
+    brand_utilization_df = pd.DataFrame({"Thương Hiệu": ["Toyota"], "Ngày Cao Điểm": [datetime.date(2024, 1, 2)]})
+
+    export_to_excel(*sample_frames(), utilization_df=utilization_df, brand_utilization_df=brand_utilization_df,
+                    path=path, booking_filter={"created_at": {"$gte": datetime.datetime(2024, 1, 2)}})
+
+    workbook = openpyxl.load_workbook(path)
+    assert workbook.sheetnames == [title for title, _, _ in STATISTICS_REPORT_SHEETS] + ["Chi Tiết Đơn Hàng"]
+    revenue = workbook["Doanh Thu Theo Tháng"]
+    assert [cell.value for cell in revenue[1]] == [None, "Tháng", "Doanh Thu (USD)"]
+    assert [cell.value for cell in revenue[3]] == [1, "2024-02", 80]
+    assert revenue["B1"].font.bold and revenue["B2"].border.left.style == "thin"
+    assert [cell.value for cell in workbook["Tỷ Lệ Trạng Thái TT"][2]] == ["paid", 2, "100.00%"]
+    assert [cell.value for cell in workbook["Mức Sử Dụng Theo Xe"][2]] == ["51A-1", 50.0]
+    details = list(workbook["Chi Tiết Đơn Hàng"].values)
+    assert len(details) == 3
+    assert details[1][2] == str(vehicle_id) and details[1][6] == 10
+
+
+def test_worker_builds_each_report_once(tmp_path):
+    worker = ReportWorker(cache_dir=str(tmp_path), ttl=60)
+    builds = []
+
+    def build(path):
+        builds.append(path)
+        export_to_excel(*sample_frames(), path=path)
+
+    key = report_key("2024-01-01", "2024-01-31", [], 3)
+    worker.submit(key, build).result(timeout=10)
+    assert worker.status(key) == "ready"
+    assert worker.submit(key, build) is None
+    assert len(builds) == 1
+    assert report_key("2024-01-01", "2024-01-31", [], 4) != key
+
+    failing_key = report_key("lỗi")
+    job = worker.submit(failing_key, lambda path: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        job.result(timeout=10)
+    assert worker.status(failing_key) == "failed"
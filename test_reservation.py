@@ -0,0 +1,127 @@
+import pytest
+import datetime
+import threading
+from bson import ObjectId
+from modules.reservation import ensure_slot_indexes, held_slot_days, reserve_slots, resize_slots, release_slots, restore_slots
+
+
+# Thiết lập cơ sở dữ liệu giả lập cho module giữ chỗ
+pytestmark = pytest.mark.mock_db("modules.reservation", "modules.availability")
+
+
+@pytest.fixture(autouse=True)
+def reset_slot_indexes(mock_db):
+    ensure_slot_indexes.clear()
+    yield
+    ensure_slot_indexes.clear()
+
+
+def test_concurrent_reservations_same_vehicle_only_one_wins(mock_db):
+    vehicle_id = ObjectId()
+    start_date = datetime.date(2024, 3, 1)
+    end_date = datetime.date(2024, 3, 5)
+    ensure_slot_indexes()
+
+    results = {}
+    barrier = threading.Barrier(32)
+
+    def book():
+        booking_id = ObjectId()
+        barrier.wait()  # Cho tất cả các luồng bắt đầu cùng lúc
+        results[booking_id] = reserve_slots(vehicle_id, booking_id, start_date, end_date)
+
+    threads = [threading.Thread(target=book) for _ in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [booking_id for booking_id, conflict in results.items() if conflict is None]
+    assert len(winners) == 1
+    # Chỉ đơn thắng giữ đủ 5 ngày, các đơn thua không để lại slot nào
+    assert mock_db.vehicle_slots.count_documents({}) == 5
+    assert mock_db.vehicle_slots.count_documents({"booking_id": winners[0]}) == 5
+
+
+def test_overlapping_ranges_conflict_but_adjacent_ranges_do_not(mock_db):
+    vehicle_id = ObjectId()
+    assert reserve_slots(vehicle_id, ObjectId(), datetime.date(2024, 3, 1), datetime.date(2024, 3, 5)) is None
+    assert reserve_slots(vehicle_id, ObjectId(), datetime.date(2024, 3, 5), datetime.date(2024, 3, 8)) is not None
+    assert reserve_slots(vehicle_id, ObjectId(), datetime.date(2024, 3, 6), datetime.date(2024, 3, 8)) is None
+    # Xe khác không bị ảnh hưởng
+    assert reserve_slots(ObjectId(), ObjectId(), datetime.date(2024, 3, 1), datetime.date(2024, 3, 5)) is None
+
+
+def test_release_and_resize_reuse_slots(mock_db):
+    vehicle_id = ObjectId()
+    first, second = ObjectId(), ObjectId()
+    assert reserve_slots(vehicle_id, first, datetime.date(2024, 3, 1), datetime.date(2024, 3, 5)) is None
+
+    # Gia hạn đè lên đơn khác thì bị từ chối và giữ nguyên slot cũ
+    assert reserve_slots(vehicle_id, second, datetime.date(2024, 3, 8), datetime.date(2024, 3, 9)) is None
+    assert resize_slots(vehicle_id, first, datetime.date(2024, 3, 1), datetime.date(2024, 3, 8)) is not None
+    assert mock_db.vehicle_slots.count_documents({"booking_id": first}) == 5
+
+    # Thu hẹp khoảng thuê trả lại các ngày thừa cho đơn khác dùng
+    assert resize_slots(vehicle_id, first, datetime.date(2024, 3, 1), datetime.date(2024, 3, 2)) is None
+    assert mock_db.vehicle_slots.count_documents({"booking_id": first}) == 2
+    assert reserve_slots(vehicle_id, ObjectId(), datetime.date(2024, 3, 3), datetime.date(2024, 3, 7)) is None
+
+    # Hủy đơn trả lại toàn bộ slot
+    assert release_slots(first) == 2
+    assert reserve_slots(vehicle_id, ObjectId(), datetime.date(2024, 3, 1), datetime.date(2024, 3, 2)) is None
+
+
+def test_restore_slots_undoes_a_resize(mock_db):
+    vehicle_id, booking_id = ObjectId(), ObjectId()
+    assert reserve_slots(vehicle_id, booking_id, datetime.date(2024, 3, 1), datetime.date(2024, 3, 3)) is None
+    previous_days = held_slot_days(booking_id)
+
+    # Gia hạn rồi khôi phục: các ngày mới được trả lại
+    assert resize_slots(vehicle_id, booking_id, datetime.date(2024, 3, 1), datetime.date(2024, 3, 6)) is None
+    assert restore_slots(vehicle_id, booking_id, previous_days)
+    assert sorted(held_slot_days(booking_id)) == sorted(previous_days)
+
+    # Thu hẹp rồi khôi phục: các ngày đã trả được giữ lại, trừ ngày đơn khác vừa giữ
+    assert resize_slots(vehicle_id, booking_id, datetime.date(2024, 3, 1), datetime.date(2024, 3, 1)) is None
+    assert reserve_slots(vehicle_id, ObjectId(), datetime.date(2024, 3, 3), datetime.date(2024, 3, 3)) is None
+    assert not restore_slots(vehicle_id, booking_id, previous_days)
+    assert sorted(held_slot_days(booking_id)) == sorted(previous_days[:2])
+
+
+@pytest.mark.mock_db("modules.booking_stats")
+def test_failed_booking_update_restores_slots(mock_db, monkeypatch):
+    from modules import booking
+    vehicle_id, booking_id = ObjectId(), ObjectId()
+    assert reserve_slots(vehicle_id, booking_id, datetime.date(2024, 3, 1), datetime.date(2024, 3, 2)) is None
+    previous_days = held_slot_days(booking_id)
+    assert resize_slots(vehicle_id, booking_id, datetime.date(2024, 3, 1), datetime.date(2024, 3, 4)) is None
+
+    # Không có đơn để cập nhật: trả các ngày vừa giữ thêm
+    assert booking._update_booking_keeping_slots(vehicle_id, booking_id, previous_days, {"end_date": datetime.datetime(2024, 3, 4)}) is None
+    assert mock_db.vehicle_slots.count_documents({"booking_id": booking_id}) == 2
+
+    # Cập nhật lỗi: khôi phục rồi ném lại lỗi
+    def fail(*args):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(booking, "update_booking", fail)
+    assert resize_slots(vehicle_id, booking_id, datetime.date(2024, 3, 1), datetime.date(2024, 3, 4)) is None
+    with pytest.raises(RuntimeError):
+        booking._update_booking_keeping_slots(vehicle_id, booking_id, previous_days, {})
+    assert mock_db.vehicle_slots.count_documents({"booking_id": booking_id}) == 2
+
+
+def test_legacy_booking_without_slots_still_blocks(mock_db):
+    vehicle_id = ObjectId()
+    mock_db.bookings.insert_one({
+        "vehicle_id": vehicle_id,
+        "status": "pending",
+        "start_date": datetime.datetime(2024, 3, 1),
+        "end_date": datetime.datetime(2024, 3, 5)
+    })
+    booking_id = ObjectId()
+
+    conflict = reserve_slots(vehicle_id, booking_id, datetime.date(2024, 3, 4), datetime.date(2024, 3, 6))
+
+    assert conflict["start_date"] == datetime.datetime(2024, 3, 1)
+    assert mock_db.vehicle_slots.count_documents({"booking_id": booking_id}) == 0
@@ -0,0 +1,42 @@
+import pytest
+import datetime
+from bson import ObjectId
+from modules.scheduler import process_expired_bookings
+from modules.booking_stats import FLEET_STATUS_VERSION
+from modules.versions import get_version
+
+
+pytestmark = pytest.mark.mock_db("modules.scheduler")
+
+
+def test_process_expired_bookings_is_idempotent(mock_db):
+    returned, still_busy = ObjectId(), ObjectId()
+    mock_db.vehicles.insert_many([
+        {"_id": returned, "status": "rented"},
+        {"_id": still_busy, "status": "rented"},
+    ])
+    completed_id = ObjectId()
+    mock_db.bookings.insert_many([
+        # Đơn đã thanh toán và hết hạn: tự hoàn thành
+        {"_id": completed_id, "vehicle_id": returned, "status": "pending", "payment_status": "paid", "start_date": datetime.datetime(2024, 1, 1), "end_date": datetime.datetime(2024, 1, 3)},
+        {"vehicle_id": still_busy, "status": "pending", "payment_status": "paid", "start_date": datetime.datetime(2024, 1, 1), "end_date": datetime.datetime(2024, 1, 3)},
+        # Xe vẫn đang có đơn khác chạy hôm nay nên không được trả
+        {"vehicle_id": still_busy, "status": "confirmed", "payment_status": "paid", "start_date": datetime.datetime(2024, 1, 9), "end_date": datetime.datetime(2024, 1, 12)},
+        # Đơn chưa thanh toán và hết hạn: chỉ đánh dấu
+        {"vehicle_id": still_busy, "status": "pending", "payment_status": "pending", "start_date": datetime.datetime(2024, 1, 1), "end_date": datetime.datetime(2024, 1, 2)},
+    ])
+    mock_db.vehicle_slots.insert_one({"vehicle_id": returned, "day": datetime.datetime(2024, 1, 2), "booking_id": completed_id})
+
+    first = process_expired_bookings(datetime.date(2024, 1, 10))
+    second = process_expired_bookings(datetime.date(2024, 1, 10))
+
+    assert (first["completed_bookings"], first["flagged_bookings"], first["released_vehicles"]) == (2, 1, 1)
+    assert (second["completed_bookings"], second["flagged_bookings"], second["released_vehicles"]) == (0, 0, 0)
+    assert mock_db.vehicles.find_one({"_id": returned})["status"] == "available"
+    assert mock_db.vehicles.find_one({"_id": still_busy})["status"] == "rented"
+    assert mock_db.bookings.count_documents({"expired": True}) == 1
+    # Các ngày giữ xe của đơn đã hoàn thành được trả lại
+    assert mock_db.vehicle_slots.count_documents({"booking_id": completed_id}) == 0
+    assert mock_db.scheduler_runs.count_documents({}) == 2
+    # Chỉ lần chạy có thay đổi trạng thái mới tăng phiên bản trạng thái đội xe
+    assert get_version(FLEET_STATUS_VERSION) == 1
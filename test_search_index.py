@@ -0,0 +1,77 @@
+import mongomock
+from bson import ObjectId
+from modules.search_index import VehicleSearchIndex, normalize_text
+from modules.vehicle_catalog import VEHICLE_VERSION
+from modules.versions import bump_version, get_version
+
+
+def make_index():
+    collection = mongomock.MongoClient()["test_database"]["vehicles"]
+    collection.insert_many([
+        {"brand": "Toyota", "model": "Camry", "license_plate": "51A-12345", "year": 2020, "price_per_day": 50, "status": "rented"},
+        {"brand": "Toyota", "model": "Vios", "license_plate": "51A-67890", "year": 2021, "price_per_day": 40},
+        {"brand": "Honda", "model": "Civic", "license_plate": "30E-11111", "year": 2019, "price_per_day": 45},
+    ])
+    return VehicleSearchIndex.from_collection(collection)
+
+
+def test_normalize_text_strips_vietnamese_accents():
+    assert normalize_text("Xe Đạp Điện 2024") == ["xe", "dap", "dien", "2024"]
+
+
+def test_misspelled_query_ranks_best_match_first():
+    index = make_index()
+
+    results = index.search("Toyta Camri")
+
+    assert results[0]["model"] == "Camry"
+    assert "status" not in results[0]
+    assert index.search("hond")[0]["brand"] == "Honda"
+    assert index.search("51A 67890")[0]["model"] == "Vios"
+    assert index.search("zzzz") == []
+
+
+def test_incremental_upsert_and_remove():
+    index = make_index()
+    vehicle_id = ObjectId()
+
+    index.upsert({"_id": vehicle_id, "brand": "Mazda", "model": "CX5", "license_plate": "29A-1", "year": 2022})
+    assert index.search("mazda")[0]["_id"] == vehicle_id
+
+    # Sửa thương hiệu thì từ cũ không còn khớp
+    index.upsert({"_id": vehicle_id, "brand": "Kia", "model": "CX5", "license_plate": "29A-1", "year": 2022})
+    assert index.search("mazda") == []
+    assert index.search("kia")[0]["_id"] == vehicle_id
+
+    index.remove(vehicle_id)
+    assert index.search("kia") == []
+    assert len(index) == 3
+
+
+def test_rebuilds_when_another_process_changes_vehicles(monkeypatch):
+    test_db = mongomock.MongoClient()["test_database"]
+    monkeypatch.setattr("modules.versions.db", test_db)
+    test_db.vehicles.insert_one({"brand": "Toyota", "model": "Camry", "license_plate": "51A-1", "year": 2020})
+    index = VehicleSearchIndex.from_collection(test_db.vehicles, version=get_version(VEHICLE_VERSION))
+    index.check_interval = 0
+
+    # Thay đổi của tiến trình này được ghi nhận cùng phiên bản nên không phải dựng lại
+    local_id = ObjectId()
+    index.upsert({"_id": local_id, "brand": "Kia", "model": "Morning", "license_plate": "29A-2", "year": 2021}, version=bump_version(VEHICLE_VERSION))
+    assert index.search("kia")[0]["_id"] == local_id
+    # Tiến trình khác thêm xe: chỉ tăng phiên bản trên MongoDB
+    test_db.vehicles.insert_one({"brand": "Mazda", "model": "CX5", "license_plate": "30E-3", "year": 2022})
+    bump_version(VEHICLE_VERSION)
+
+    assert index.search("mazda")[0]["model"] == "CX5"
+    # Xe Kia chưa được ghi vào collection nên không còn sau khi dựng lại
+    assert index.search("kia") == []
+
+
+def test_long_queries_are_capped_and_rank_full_matches_first():
+    index = make_index()
+
+    results = index.search("t o y o t a c a m r y 2020 51a")
+
+    assert len(results) <= 20
+    assert index.search("toyota camry 2020 51a 12345 a b c d e f g")[0]["model"] == "Camry"
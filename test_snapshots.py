@@ -0,0 +1,97 @@
+import datetime
+import pytest
+from bson import ObjectId
+from modules.snapshots import export_bookings_snapshot, load_bookings_snapshot, read_watermark, snapshot_booking_statistics, snapshot_covers
+
+
+pytestmark = pytest.mark.mock_db("modules.snapshots")
+
+
+def add_bookings(db, vehicle_id, user_id, days):
+    db.bookings.insert_many([
+        {"user_id": user_id, "vehicle_id": vehicle_id, "total_price": 10 * (i + 1), "payment_status": "paid" if i % 2 else "pending",
+         "status": "confirmed", "start_date": day, "end_date": day, "created_at": day}
+        for i, day in enumerate(days)
+    ])
+
+
+def test_export_is_partitioned_by_month_and_incremental(mock_db, tmp_path):
+    vehicle_id, user_id = ObjectId(), ObjectId()
+    mock_db.vehicles.insert_one({"_id": vehicle_id, "license_plate": "51A-1"})
+    mock_db.users.insert_one({"_id": user_id, "email": "a@example.com"})
+    add_bookings(mock_db, vehicle_id, user_id, [datetime.datetime(2024, 1, 5), datetime.datetime(2024, 1, 20), datetime.datetime(2024, 2, 3)])
+
+    first = export_bookings_snapshot(str(tmp_path), batch_size=2)
+    assert first["rows"] == 3
+    assert sorted(path.name for path in tmp_path.iterdir() if path.is_dir()) == ["month=2024-01", "month=2024-02"]
+    assert read_watermark(str(tmp_path)) == datetime.datetime(2024, 2, 3)
+
+    # Lần sau chỉ thêm đơn mới hơn mốc đã xuất
+    add_bookings(mock_db, vehicle_id, user_id, [datetime.datetime(2024, 2, 10)])
+    assert export_bookings_snapshot(str(tmp_path))["rows"] == 1
+    assert export_bookings_snapshot(str(tmp_path))["rows"] == 0
+
+    frame = load_bookings_snapshot(datetime.datetime(2024, 1, 10), datetime.datetime(2024, 2, 28), snapshot_dir=str(tmp_path))
+    assert sorted(frame["total_price"]) == [10.0, 20.0, 30.0]
+    assert set(frame["license_plate"]) == {"51A-1"} and set(frame["customer_email"]) == {"a@example.com"}
+    assert snapshot_covers(datetime.datetime(2024, 3, 1), str(tmp_path))
+    assert not snapshot_covers(datetime.datetime.now() + datetime.timedelta(days=1), str(tmp_path))
+
+
+def test_incremental_export_rereads_overlap_without_duplicates(mock_db, tmp_path):
+    vehicle_id, user_id = ObjectId(), ObjectId()
+    watermark = datetime.datetime(2024, 1, 5, 12)
+    add_bookings(mock_db, vehicle_id, user_id, [datetime.datetime(2024, 1, 5), watermark])
+    export_bookings_snapshot(str(tmp_path))
+
+    # Đơn cùng created_at với mốc và đơn ghi muộn có created_at sớm hơn mốc (trong khoảng overlap) vẫn được xuất
+    add_bookings(mock_db, vehicle_id, user_id, [watermark, watermark - datetime.timedelta(minutes=5), watermark - datetime.timedelta(hours=1)])
+    assert export_bookings_snapshot(str(tmp_path))["rows"] == 2
+    assert export_bookings_snapshot(str(tmp_path))["rows"] == 0
+    assert read_watermark(str(tmp_path)) == watermark
+
+    frame = load_bookings_snapshot(datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 31), snapshot_dir=str(tmp_path))
+    assert len(frame) == 4 and frame["booking_id"].is_unique
+
+
+def test_full_export_replaces_snapshot_only_on_success(mock_db, tmp_path, monkeypatch):
+    vehicle_id, user_id = ObjectId(), ObjectId()
+    add_bookings(mock_db, vehicle_id, user_id, [datetime.datetime(2024, 1, 5), datetime.datetime(2024, 2, 3)])
+    snapshot_dir = str(tmp_path / "snapshot")
+    export_bookings_snapshot(snapshot_dir)
+    mock_db.bookings.update_many({}, {"$set": {"total_price": 99}})
+
+    # Xuất lại lỗi giữa chừng thì snapshot cũ còn nguyên và không để lại thư mục tạm
+    def fail(*args, **kwargs):
+        raise RuntimeError("boom")
+    with monkeypatch.context() as patch:
+        patch.setattr("modules.snapshots._to_record_batch", fail)
+        with pytest.raises(RuntimeError):
+            export_bookings_snapshot(snapshot_dir, full=True)
+    assert [path.name for path in tmp_path.iterdir()] == ["snapshot"]
+    frame = load_bookings_snapshot(datetime.datetime(2024, 1, 1), datetime.datetime(2024, 2, 28), snapshot_dir=snapshot_dir)
+    assert sorted(frame["total_price"]) == [10.0, 20.0]
+
+    result = export_bookings_snapshot(snapshot_dir, full=True)
+    assert result["rows"] == 2 and all(path.startswith(snapshot_dir + "/") for path in result["files"])
+    assert [path.name for path in tmp_path.iterdir()] == ["snapshot"]
+    frame = load_bookings_snapshot(datetime.datetime(2024, 1, 1), datetime.datetime(2024, 2, 28), snapshot_dir=snapshot_dir)
+    assert sorted(frame["total_price"]) == [99.0, 99.0]
+    assert read_watermark(snapshot_dir) == datetime.datetime(2024, 2, 3)
+
+
+def test_statistics_from_snapshot(mock_db, tmp_path):
+    vehicle_id, other_id = ObjectId(), ObjectId()
+    mock_db.vehicles.insert_many([{"_id": vehicle_id, "license_plate": "51A-1"}, {"_id": other_id, "license_plate": "51A-2"}])
+    add_bookings(mock_db, vehicle_id, ObjectId(), [datetime.datetime(2024, 1, 5), datetime.datetime(2024, 2, 3)])
+    add_bookings(mock_db, other_id, ObjectId(), [datetime.datetime(2024, 2, 4)])
+    export_bookings_snapshot(str(tmp_path))
+
+    stats = snapshot_booking_statistics(datetime.datetime(2024, 1, 1), datetime.datetime(2024, 2, 29), snapshot_dir=str(tmp_path))
+
+    assert (stats["total_bookings"], stats["revenue"], stats["total_customers"]) == (3, 40.0, 2)
+    assert stats["series"][["revenue", "count"]].values.tolist() == [[10.0, 1], [30.0, 2]]
+    assert {item["_id"]: item["count"] for item in stats["payment_status"]} == {"pending": 2, "paid": 1}
+    assert stats["vehicle_revenue"] == [{"_id": "51A-1", "total_revenue": 30.0}, {"_id": "51A-2", "total_revenue": 10.0}]
+    only_other = snapshot_booking_statistics(datetime.datetime(2024, 1, 1), datetime.datetime(2024, 2, 29), [other_id], snapshot_dir=str(tmp_path))
+    assert only_other["total_bookings"] == 1
@@ -0,0 +1,69 @@
+import datetime
+import pytest
+from bson import ObjectId
+from modules.booking_stats import record_booking_change, record_status_change
+from modules.stats_cache import FLEET_VERSIONS, StatisticsCache, statistics_cache_key
+from modules.vehicle_catalog import VEHICLE_VERSION
+from modules.versions import bump_version
+
+
+pytestmark = pytest.mark.mock_db("modules.booking_stats")
+
+
+def test_cache_hits_until_bookings_change(mock_db):
+    cache = StatisticsCache(ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"total_bookings": len(calls)}
+
+    a, b = ObjectId(), ObjectId()
+    start, end = datetime.datetime(2024, 3, 1), datetime.datetime(2024, 3, 31, 23, 59)
+    # Thứ tự chọn xe không làm đổi khóa
+    key = statistics_cache_key(start, end, [a, b])
+    assert key == statistics_cache_key(start, end, [b, a])
+
+    assert cache.get_or_compute(key, compute) == {"total_bookings": 1}
+    assert cache.get_or_compute(key, compute) == {"total_bookings": 1}
+    assert len(calls) == 1
+
+    # Đơn mới làm tăng phiên bản nên kết quả cũ hết hiệu lực
+    record_booking_change(None, {"user_id": a, "vehicle_id": b, "total_price": 10, "payment_status": "pending", "created_at": datetime.datetime(2024, 3, 2)})
+    assert cache.get_or_compute(key, compute) == {"total_bookings": 2}
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"], stats["hit_rate"]) == (1, 2, 1, 0.3333)
+
+
+def test_cache_expires_and_is_bounded(mock_db):
+    expired = StatisticsCache(ttl=0)
+    expired.get_or_compute("k", dict)
+    expired.get_or_compute("k", dict)
+    assert (expired.hits, expired.expirations) == (0, 1)
+
+    bounded = StatisticsCache(ttl=60, max_entries=2)
+    for key in ("a", "b", "c"):
+        bounded.get_or_compute(key, dict)
+    bounded.get_or_compute("a", dict)
+    assert bounded.stats()["size"] == 2
+    assert (bounded.evictions, bounded.misses) == (2, 4)
+
+
+def test_fleet_entries_follow_status_and_vehicle_versions(mock_db):
+    cache = StatisticsCache(ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    # Số liệu đơn đặt xe không phụ thuộc trạng thái đơn/xe, số liệu mức độ sử dụng xe thì có
+    assert cache.get_or_compute("stats", compute) == 1
+    assert cache.get_or_compute("fleet", compute, FLEET_VERSIONS) == 2
+    record_status_change()
+    assert cache.get_or_compute("stats", compute) == 1
+    assert cache.get_or_compute("fleet", compute, FLEET_VERSIONS) == 3
+    bump_version(VEHICLE_VERSION)
+    assert cache.get_or_compute("fleet", compute, FLEET_VERSIONS) == 4
+    assert cache.get_or_compute("fleet", compute, FLEET_VERSIONS) == 4
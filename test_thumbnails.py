@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import modules.thumbnails as thumbnails
+from modules.thumbnails import ThumbnailCache
+
+
+def make_image(path, color, size=(800, 400)):
+    Image.new("RGB", size, color).save(path)
+    return str(path)
+
+
+def test_thumbnails_are_fixed_size_and_content_addressed(tmp_path):
+    cache = ThumbnailCache(cache_dir=str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    first = make_image(tmp_path / "a.png", "red")
+    same_content = make_image(tmp_path / "b.png", "red")
+
+    path = cache.path_for(first)
+
+    with Image.open(path) as thumbnail:
+        assert thumbnail.size == (160, 120)
+    # Cùng nội dung ảnh dùng chung một file, lần sau lấy từ bộ nhớ đệm
+    assert cache.path_for(same_content) == path
+    os.remove(first)
+    assert cache.path_for(first) == path
+    assert cache.path_for("") is None
+    assert cache.path_for(str(tmp_path / "missing.png")) is None
+
+
+def test_least_recently_used_thumbnails_are_evicted(tmp_path):
+    cache = ThumbnailCache(cache_dir=str(tmp_path / "cache"))
+    paths = {}
+    for index, color in enumerate(["red", "green", "blue"]):
+        paths[color] = cache.path_for(make_image(tmp_path / f"{color}.png", color))
+        os.utime(paths[color], (index, index))
+    # Dùng lại ảnh đỏ nên ảnh xanh lá là ảnh lâu không dùng nhất
+    cache.path_for(str(tmp_path / "red.png"))
+
+    cache.max_bytes = sum(os.path.getsize(path) for path in paths.values()) - 1
+    cache.path_for(make_image(tmp_path / "white.png", "white"))
+
+    assert os.path.exists(paths["red"])
+    assert not os.path.exists(paths["green"])
+    # File trỏ tới ảnh đã bị xóa cũng được dọn
+    assert not os.path.exists(cache._pointer_path(str(tmp_path / "green.png")))
+    assert os.path.exists(cache._pointer_path(str(tmp_path / "red.png")))
+
+
+def test_thumbnail_path_never_fetches_during_render(tmp_path, monkeypatch):
+    cache = ThumbnailCache(cache_dir=str(tmp_path / "cache"))
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(thumbnails, "_default_cache", cache)
+    monkeypatch.setattr(thumbnails, "get_thumbnail_pool", lambda: pool)
+    source = make_image(tmp_path / "a.png", "red")
+    missing = str(tmp_path / "missing.png")
+
+    # Lần đầu chưa có ảnh: trả về None và xếp việc tạo ảnh vào pool
+    assert thumbnails.thumbnail_path(source) is None
+    assert thumbnails.thumbnail_data_uri(missing) is None
+    pool.shutdown(wait=True)
+
+    assert thumbnails.thumbnail_path(source) == cache.cached_path(source)
+    assert thumbnails.thumbnail_data_uri(source).startswith("data:image/jpeg;base64,")
+    # Link lỗi không bị xếp lại cho tới hết thời gian chờ thử lại
+    assert cache.recently_failed(missing)
+    assert thumbnails._pending == set()
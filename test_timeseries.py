@@ -0,0 +1,46 @@
+import datetime
+import pytest
+import mongomock
+import pandas as pd
+from modules.timeseries import _densify_stages, combine_series, densify_frame, time_buckets
+
+
+@pytest.fixture
+def bookings():
+    collection = mongomock.MongoClient()["test_database"]["bookings"]
+    collection.insert_many([
+        {"total_price": 10, "created_at": datetime.datetime(2024, 1, 5, 9)},
+        {"total_price": 20, "created_at": datetime.datetime(2024, 1, 5, 18)},
+        {"total_price": 30, "created_at": datetime.datetime(2024, 3, 2)},
+    ])
+    return collection
+
+
+def test_time_buckets_fill_empty_periods(bookings):
+    start, end = datetime.datetime(2023, 12, 15), datetime.datetime(2024, 4, 1)
+    match = {"created_at": {"$gte": start, "$lte": end}}
+
+    monthly = time_buckets(bookings, match, "created_at", start, end, "month", {"revenue": "$total_price", "count": 1})
+
+    assert monthly["bucket"].dt.strftime("%Y-%m").tolist() == ["2023-12", "2024-01", "2024-02", "2024-03", "2024-04"]
+    assert monthly[["revenue", "count"]].values.tolist() == [[0, 0], [30, 2], [0, 0], [30, 1], [0, 0]]
+    # Tuần bắt đầu từ thứ Hai
+    weekly = time_buckets(bookings, match, "created_at", datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 14), "week")
+    assert weekly["bucket"].tolist() == [pd.Timestamp(2024, 1, 1), pd.Timestamp(2024, 1, 8)]
+    assert weekly["count"].tolist() == [2, 0]
+    with pytest.raises(ValueError):
+        time_buckets(bookings, match, "created_at", start, end, "year")
+
+
+def test_server_stages_and_combined_series():
+    stages = _densify_stages("created_at", datetime.datetime(2024, 1, 20), datetime.datetime(2024, 3, 5), "month", {"count": 1})
+    # Cận trên của $densify là đầu tháng sau end vì cận trên không được tính
+    assert stages[2]["$densify"]["range"]["bounds"] == [datetime.datetime(2024, 1, 1), datetime.datetime(2024, 4, 1)]
+    assert stages[3]["$fill"] == {"output": {"count": {"value": 0}}}
+
+    day = datetime.datetime(2024, 1, 2)
+    first = densify_frame(pd.DataFrame({"bucket": [day], "count": [1]}), day, day + datetime.timedelta(days=2), "day", ["count"])
+    second = densify_frame(pd.DataFrame({"bucket": [day], "count": [2]}), day, day + datetime.timedelta(days=2), "day", ["count"])
+    combined = combine_series([first, second], day, day + datetime.timedelta(days=2), "day", ["count"])
+    assert combined["count"].tolist() == [3, 0, 0]
+    assert combine_series([], day, day, "day", ["count"])["count"].tolist() == [0]
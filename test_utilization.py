@@ -0,0 +1,54 @@
+import datetime
+import numpy as np
+import pytest
+from bson import ObjectId
+from modules.utilization import fleet_utilization, idle_streaks
+
+
+pytestmark = pytest.mark.mock_db("modules.utilization", "modules.availability")
+
+
+def test_idle_streaks_longest_and_trailing():
+    occupancy = np.array([
+        [True, False, False, True, False, False, False],
+        [False, False, False, False, False, False, False],
+        [True, True, True, True, True, True, True],
+    ])
+
+    longest, trailing = idle_streaks(occupancy)
+
+    assert longest.tolist() == [3, 7, 0]
+    assert trailing.tolist() == [3, 7, 0]
+
+
+def test_fleet_utilization_per_vehicle_brand_and_peak_days(mock_db):
+    camry, vios, civic = ObjectId(), ObjectId(), ObjectId()
+    mock_db.vehicles.insert_many([
+        {"_id": camry, "brand": "Toyota", "license_plate": "T1"},
+        {"_id": vios, "brand": "toyota ", "license_plate": "T2"},
+        {"_id": civic, "brand": "Honda", "license_plate": "H1"},
+    ])
+    mock_db.bookings.insert_many([
+        {"vehicle_id": camry, "status": "confirmed", "start_date": datetime.datetime(2024, 1, 1), "end_date": datetime.datetime(2024, 1, 5)},
+        {"vehicle_id": camry, "status": "pending", "start_date": datetime.datetime(2024, 1, 9), "end_date": datetime.datetime(2024, 1, 10)},
+        {"vehicle_id": vios, "status": "pending", "start_date": datetime.datetime(2024, 1, 4), "end_date": datetime.datetime(2024, 1, 4)},
+        # Đơn đã hủy không tính là chiếm dụng
+        {"vehicle_id": civic, "status": "cancelled", "start_date": datetime.datetime(2024, 1, 1), "end_date": datetime.datetime(2024, 1, 10)},
+    ])
+
+    result = fleet_utilization(datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 10, 23, 59))
+
+    vehicles = result["vehicles"].set_index("license_plate")
+    assert vehicles.loc["T1", "busy_days"] == 7 and vehicles.loc["T1", "utilization"] == pytest.approx(70.0)
+    assert vehicles.loc["T1", "longest_idle"] == 3 and vehicles.loc["T1", "trailing_idle"] == 0
+    assert vehicles.loc["T2", "longest_idle"] == 6 and vehicles.loc["T2", "trailing_idle"] == 6
+    assert vehicles.loc["H1", "utilization"] == 0
+
+    # Thương hiệu gộp không phân biệt hoa thường và khoảng trắng
+    brands = result["brands"].set_index("brand")
+    assert brands.loc["Toyota", "vehicles"] == 2
+    assert brands.loc["Toyota", "utilization"] == pytest.approx(40.0)
+    assert (brands.loc["Toyota", "peak_day"], brands.loc["Toyota", "peak_in_use"]) == (datetime.date(2024, 1, 4), 2)
+
+    assert result["peak_days"].iloc[0].tolist()[:2] == [datetime.date(2024, 1, 4), 2]
+    assert len(result["peak_days"]) == 5
@@ -0,0 +1,55 @@
+import pytest
+from modules.vehicle_catalog import VehicleCatalog, VEHICLE_VERSION
+from modules.versions import bump_version
+from modules.vehicle import with_search_fields
+
+
+pytestmark = pytest.mark.mock_db("modules.vehicle_catalog")
+
+
+def test_catalog_is_reused_until_version_changes(mock_db):
+    mock_db.vehicles.insert_many([
+        {"brand": "Toyota", "model": "Camry", "license_plate": "T1", "price_per_day": 50, "status": "rented"},
+        {"brand": "Honda", "model": "Civic", "license_plate": "H1", "price_per_day": 45},
+    ])
+    catalog = VehicleCatalog(check_interval=0)
+
+    first = catalog.all()
+    vehicle_id = first[0]["_id"]
+    assert "status" not in first[0]
+    assert catalog.get(vehicle_id)["license_plate"] == "T1"
+    assert len(catalog.all()) == 2
+    assert (catalog.hits, catalog.misses, catalog.reloads) == (2, 1, 1)
+
+    # Tiến trình khác sửa xe và tăng phiên bản: lần đọc sau tải lại
+    mock_db.vehicles.update_one({"_id": vehicle_id}, {"$set": {"price_per_day": 60}})
+    bump_version(VEHICLE_VERSION)
+    assert catalog.get(vehicle_id)["price_per_day"] == 60
+    assert catalog.stats()["invalidations"] == 1
+
+
+def test_catalog_respects_max_size(mock_db):
+    ids = mock_db.vehicles.insert_many([
+        with_search_fields({"brand": "Kia", "model": str(i), "license_plate": f"5{i}A"}) for i in range(3)
+    ]).inserted_ids
+    catalog = VehicleCatalog(max_size=2, check_interval=60)
+
+    # Danh mục lớn hơn giới hạn thì không được giữ và không bị đọc lại toàn bộ cho tới lần làm mới sau
+    assert catalog.all() is None
+    assert catalog.all() is None
+    assert catalog.reloads == 0
+    assert catalog.misses == 1
+    assert catalog.stats()["passthrough"] == 1
+
+    # Ô chọn xe dùng truy vấn giới hạn theo từ khóa
+    assert [v["_id"] for v in catalog.search(limit=2)] == ids[:2]
+    assert [v["_id"] for v in catalog.search("52a")] == [ids[2]]
+    assert [v["_id"] for v in catalog.search("  1")] == [ids[1]]
+    assert "search_keys" not in catalog.search("kia")[0]
+
+    # Tra từng xe vẫn được giữ lại, bỏ xe dùng lâu nhất khi vượt giới hạn
+    for vehicle_id in ids:
+        catalog.get(vehicle_id)
+    assert catalog.stats()["size"] == 2
+    catalog.get(ids[2])
+    assert catalog.hits == 1
@@ -0,0 +1,53 @@
+import io
+import pytest
+import openpyxl
+from modules.vehicle import ensure_vehicle_indexes
+from modules.vehicle_import import import_vehicles
+
+
+pytestmark = pytest.mark.mock_db("modules.vehicle_import", "modules.vehicle", "modules.vehicle_catalog", "modules.search_index")
+
+
+@pytest.fixture(autouse=True)
+def reset_vehicle_indexes():
+    ensure_vehicle_indexes.clear()
+    yield
+    ensure_vehicle_indexes.clear()
+
+
+def test_csv_import_reports_invalid_rows_and_duplicate_plates(mock_db):
+    mock_db.vehicles.insert_one({"brand": "Kia", "model": "Morning", "license_plate": "EXIST"})
+    csv_data = "\n".join([
+        "brand,model,license_plate,price_per_day,year,required_license_type,unused",
+        "Toyota,Camry,T1,50,2020,B1,x",
+        "Honda,Civic,H1,,2019,B1,x",        # Thiếu giá
+        "Mazda,CX5,EXIST,40,2021,B2,x",     # Trùng biển số đã có
+        "Ford,Ranger,T1,60,2018,Z9,x",      # Hạng bằng lái sai
+        "Ford,Ranger,F1,60,2018,c,x",
+        "VinFast,VF8,F1,70,2023,B2,x",      # Trùng biển số trong cùng file
+    ])
+    progress = []
+
+    report = import_vehicles(io.BytesIO(csv_data.encode("utf-8-sig")), "xe.csv", batch_size=2, on_progress=lambda rows, fraction: progress.append(rows))
+
+    assert (report["processed"], report["inserted"]) == (6, 2)
+    assert report["duplicates"] == [(4, "EXIST"), (7, "F1")]
+    assert [row for row, _ in report["invalid"]] == [3, 5]
+    assert progress == [2, 4, 6]
+    ranger = mock_db.vehicles.find_one({"license_plate": "F1"})
+    assert (ranger["required_license_type"], ranger["brand_normalized"], ranger["status"]) == ("C", "ford", "available")
+
+
+def test_xlsx_import_with_vietnamese_headers(mock_db):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Thương Hiệu", "Mẫu Xe", "Biển Số", "Giá (USD/ngày)", "Năm Sản Xuất", "Hạng Bằng Lái"])
+    sheet.append(["Toyota", "Vios", 12345, 40, 2021, "B1"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+
+    report = import_vehicles(buffer, "xe.xlsx")
+
+    assert report["inserted"] == 1
+    assert mock_db.vehicles.find_one({"model": "Vios"})["license_plate"] == "12345"
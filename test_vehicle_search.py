@@ -0,0 +1,75 @@
+import os
+import pytest
+import pymongo
+from modules.vehicle import ensure_vehicle_indexes, faceted_vehicle_search, find_vehicles, vehicle_search_cursor, with_search_fields
+
+SAMPLE_VEHICLES = [
+    {"brand": "Toyota", "model": "Camry", "license_plate": "T1", "price_per_day": 50, "year": 2020, "image": "a.jpg", "status": "available", "required_license_type": "B1"},
+    {"brand": "toyota", "model": "Vios", "license_plate": "T2", "price_per_day": 40, "year": 2021, "image": "b.jpg", "status": "available", "required_license_type": "B1"},
+    {"brand": "TOYOTA", "model": "Innova", "license_plate": "T3", "price_per_day": 300, "year": 2022, "image": "c.jpg", "status": "available", "required_license_type": "B2"},
+    {"brand": "Honda", "model": "Civic", "license_plate": "H1", "price_per_day": 45, "year": 2019, "image": "d.jpg", "status": "available", "required_license_type": "B1"},
+    {"brand": "Ford Toyota", "model": "Ranger", "license_plate": "F1", "price_per_day": 60, "year": 2018, "image": "e.jpg", "status": "available", "required_license_type": "B2"},
+]
+
+
+pytestmark = pytest.mark.mock_db("modules.vehicle")
+
+
+@pytest.fixture(autouse=True)
+def reset_vehicle_indexes():
+    ensure_vehicle_indexes.clear()
+    yield
+    ensure_vehicle_indexes.clear()
+
+
+def test_prefix_search_is_case_insensitive_projected_and_paginated(mock_db):
+    # Xe cũ chưa có brand_normalized được bổ sung khi tạo index
+    mock_db.vehicles.insert_many([dict(vehicle) for vehicle in SAMPLE_VEHICLES])
+    ensure_vehicle_indexes()
+
+    first_page, has_more = find_vehicles("toy", 0, 100, page_size=1)
+    second_page, last = find_vehicles("TOY", 0, 100, page=1, page_size=1)
+
+    assert [v["model"] for v in first_page + second_page] == ["Vios", "Camry"]
+    assert has_more and not last
+    # Chỉ lấy các trường hiển thị
+    assert "status" not in first_page[0]
+    # Loại trừ xe đã có đơn
+    busy = mock_db.vehicles.find_one({"license_plate": "T2"})["_id"]
+    vehicles, _ = find_vehicles("toy", 0, 500, exclude_ids=[busy])
+    assert [v["model"] for v in vehicles] == ["Camry", "Innova"]
+
+
+@pytest.mark.skipif(not os.getenv("MONGODB_TEST_URI"), reason="Cần MongoDB thật (MONGODB_TEST_URI) để chạy explain")
+def test_prefix_search_uses_index_scan(monkeypatch):
+    client = pymongo.MongoClient(os.environ["MONGODB_TEST_URI"])
+    test_db = client["test_vehicle_search"]
+    test_db.vehicles.drop()
+    monkeypatch.setattr("modules.vehicle.db", test_db)
+    ensure_vehicle_indexes.clear()
+    try:
+        ensure_vehicle_indexes()
+        test_db.vehicles.insert_many([with_search_fields(dict(vehicle)) for vehicle in SAMPLE_VEHICLES])
+
+        plan = vehicle_search_cursor("Toy", 0, 100).explain()["queryPlanner"]["winningPlan"]
+
+        assert "IXSCAN" in str(plan)
+        assert "COLLSCAN" not in str(plan)
+    finally:
+        ensure_vehicle_indexes.clear()
+        client.drop_database("test_vehicle_search")
+        client.close()
+
+
+def test_faceted_search_counts_ignore_their_own_filter(mock_db):
+    mock_db.vehicles.insert_many([with_search_fields(dict(vehicle)) for vehicle in SAMPLE_VEHICLES])
+
+    result = faceted_vehicle_search("", (0, 60), license_types=("B1",), year_range=(2018, 2022), page_size=2)
+
+    assert [v["model"] for v in result["vehicles"]] == ["Civic", "Vios"]
+    assert (result["total"], result["has_more"]) == (3, True)
+    # Số xe theo hạng bằng lái bỏ qua chính bộ lọc hạng bằng lái nên vẫn thấy xe hạng B2
+    assert result["license"] == {"B1": 3, "B2": 1}
+    assert dict(result["price"]) == {"0-49": 2, "50-99": 1}
+    assert dict(result["year"]) == {"2015-2019": 1, "2020+": 2}
+    assert [(brand.lower(), count) for brand, count in result["brand"]] == [("toyota", 2), ("honda", 1)]
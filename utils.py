@@ -1,5 +1,6 @@
 import re
 import html
+import datetime
 
 def sanitize_input(input_string):
     """Loại bỏ các ký tự đặc biệt và các thẻ HTML khỏi chuỗi đầu vào."""
@@ -7,4 +8,37 @@ def sanitize_input(input_string):
     sanitized_string = re.sub('<[^<]+?>', '', input_string)
     # Chuyển đổi các ký tự đặc biệt thành các thực thể HTML tương ứng
     sanitized_string = html.escape(sanitized_string)
-    return sanitized_string
\ No newline at end of file
+    return sanitized_string
+
+def normalize_search_term(value):
+    """Chuẩn hóa từ khóa tìm kiếm: viết thường và gộp các khoảng trắng."""
+    return " ".join(str(value or "").lower().split())
+
+def search_keys(*values):
+    """
+    Các khóa tìm kiếm theo tiền tố của một document (lưu trong trường search_keys có index multikey).
+    Mỗi giá trị được chuẩn hóa rồi lấy phần còn lại tính từ mỗi từ, ví dụ "Nguyễn Văn An" cho
+    "nguyễn văn an", "văn an" và "an", nên regex neo đầu chuỗi vẫn tìm được từ ở giữa.
+    """
+    keys = []
+    for value in values:
+        words = normalize_search_term(value).split(" ")
+        for start in range(len(words)):
+            key = " ".join(words[start:])
+            if key and key not in keys:
+                keys.append(key)
+    return keys
+
+def to_db_date(value):
+    """Chuyển date thành datetime lúc 0 giờ để lưu dạng ngày BSON trong MongoDB."""
+    if isinstance(value, datetime.datetime):
+        return datetime.datetime.combine(value.date(), datetime.time.min)
+    return datetime.datetime.combine(value, datetime.time.min)
+
+def from_db_date(value):
+    """Đọc ngày lưu trong MongoDB (ngày BSON hoặc chuỗi ISO của dữ liệu cũ) thành date."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(value[:10], "%Y-%m-%d").date()